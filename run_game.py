@@ -26,16 +26,28 @@ from __future__ import annotations
 
 import argparse
 import array
+import bisect
+import collections
+import contextlib
 import ctypes
+import functools
+import hashlib
+import heapq
+import itertools
+import json
 import logging
 import math
 import os
 import random
 import textwrap
 import time
+import tracemalloc
+import types
 
+import numpy as np
 import pygame
 from OpenGL.GL import *
+from OpenGL.GL import shaders
 from pygame.locals import *
 from pygame.math import Vector2
 from pygame.mixer import Sound
@@ -74,6 +86,102 @@ parser.add_argument(
     action="store_true",
     help="Disable OpenGL multi-sampling (for old GPUs)",
 )
+parser.add_argument(
+    "--shaders",
+    action="store_true",
+    help="Use GLSL shaders for drawing (needs OpenGL 3.3 or instancing extensions)",
+)
+parser.add_argument(
+    "--perf-hud",
+    action="store_true",
+    help="Show the performance HUD at startup (toggle with F3)",
+)
+parser.add_argument(
+    "--texture-cache",
+    action="store_true",
+    help="Cache decoded images and mipmaps on disk for faster startup",
+)
+parser.add_argument(
+    "--minimap-refresh",
+    type=int,
+    default=4,
+    metavar="FRAMES",
+    help="Re-render the minimap every FRAMES frames (default: %(default)s)",
+)
+parser.add_argument(
+    "--minimap-on-change",
+    action="store_true",
+    help="Re-render the minimap only when its content has visibly changed",
+)
+parser.add_argument(
+    "--lod-full-size",
+    type=float,
+    default=64,
+    metavar="PIXELS",
+    help="Draw plants at least PIXELS tall on screen when full-grown in full detail "
+    "(default: %(default)s)",
+)
+parser.add_argument(
+    "--lod-silhouette-size",
+    type=float,
+    default=12,
+    metavar="PIXELS",
+    help="Draw plants less than PIXELS tall on screen when full-grown as a silhouette "
+    "(default: %(default)s)",
+)
+parser.add_argument(
+    "--lod-max-depth",
+    type=int,
+    default=1,
+    metavar="DEPTH",
+    help="Merge branches deeper than DEPTH into their ancestor for plants "
+    "between the two LOD sizes (default: %(default)s)",
+)
+parser.add_argument(
+    "--plant-pool-size",
+    type=int,
+    default=3,
+    metavar="COUNT",
+    help="Keep COUNT pre-grown plants per fertility for replanting, 0 grows "
+    "them on demand (default: %(default)s)",
+)
+parser.add_argument(
+    "--max-fps",
+    type=int,
+    default=120,
+    help="Limit the frame rate (0 = unlimited), the simulation always runs "
+    "at 60 ticks per second (default: %(default)s)",
+)
+parser.add_argument(
+    "--no-culling",
+    action="store_true",
+    help="Draw the sectors, rocks, spaceship and flies that are out of view",
+)
+parser.add_argument(
+    "--render-backend",
+    choices=("gl", "null", "record"),
+    default="gl",
+    help="Draw with OpenGL, discard all geometry (null) or record the draw "
+    "commands of each frame (record) (default: %(default)s)",
+)
+parser.add_argument(
+    "--record-file",
+    metavar="FILENAME",
+    help="Write the commands recorded with --render-backend=record to FILENAME, "
+    "one JSON line per frame",
+)
+parser.add_argument(
+    "--headless",
+    type=int,
+    metavar="TICKS",
+    help="Simulate TICKS ticks as fast as possible without display, audio or "
+    "drawing, then report ticks per second and the final game state",
+)
+parser.add_argument(
+    "--benchmark",
+    action="store_true",
+    help="Run micro-benchmarks and exit",
+)
 CLIARGS = parser.parse_args()
 
 logging.basicConfig(
@@ -125,97 +233,77 @@ def multiply_3x3(a, b):
     )
 
 
-class Matrix3x3:
-    def __init__(self, initial=None):
-        self.m = array.array(
-            "f",
-            initial.m
-            if initial is not None
-            else (
-                1.0,
-                0.0,
-                0.0,
-                0.0,
-                1.0,
-                0.0,
-                0.0,
-                0.0,
-                1.0,
-            ),
-        )
+class AffineMatrix:
+    """
+    2D affine transform stored as six floats (a, b, c, d, e, f), the top two
+    rows of the 3x3 matrix; the bottom row is always (0, 0, 1).
+    """
 
-    def apply(self, v):
-        m = self.m
+    IDENTITY = (1.0, 0.0, 0.0, 0.0, 1.0, 0.0)
+
+    def __init__(self, initial=None):
+        self.m = list(initial.m if initial is not None else self.IDENTITY)
 
-        v = (v[0], v[1], 1.0)
+    def set(self, other):
+        self.m[:] = other.m
 
-        v = (
-            m[0] * v[0] + m[1] * v[1] + m[2] * v[2],
-            m[3] * v[0] + m[4] * v[1] + m[5] * v[2],
-            m[6] * v[0] + m[7] * v[1] + m[8] * v[2],
+    def identity(self):
+        self.m[:] = self.IDENTITY
+
+    def multiply(self, A, B, C, D, E, F):
+        a, b, c, d, e, f = self.m
+        self.m[:] = (
+            a * A + b * D,
+            a * B + b * E,
+            a * C + b * F + c,
+            d * A + e * D,
+            d * B + e * E,
+            d * C + e * F + f,
         )
 
-        return (v[0] / v[2], v[1] / v[2])
+    def multiplied(self, other):
+        result = AffineMatrix(self)
+        result.multiply(*other.m)
+        return result
+
+    def apply(self, v):
+        a, b, c, d, e, f = self.m
+        x, y = v[0], v[1]
+        return (a * x + b * y + c, d * x + e * y + f)
+
+    def apply_many(self, points):
+        """
+        Transform an (N, 2) array of points, returns an (N, 2) array.
+        """
+        a, b, c, d, e, f = self.m
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return points @ np.array(((a, d), (b, e))) + (c, f)
 
     def translate(self, x, y):
-        self.m = multiply_3x3(
-            self.m,
-            array.array(
-                "f",
-                (
-                    1.0,
-                    0.0,
-                    x,
-                    0.0,
-                    1.0,
-                    y,
-                    0.0,
-                    0.0,
-                    1.0,
-                ),
-            ),
-        )
+        m = self.m
+        m[2] += m[0] * x + m[1] * y
+        m[5] += m[3] * x + m[4] * y
 
     def scale(self, x, y):
-        self.m = multiply_3x3(
-            self.m,
-            array.array(
-                "f",
-                (
-                    x,
-                    0.0,
-                    0.0,
-                    0.0,
-                    y,
-                    0.0,
-                    0.0,
-                    0.0,
-                    1.0,
-                ),
-            ),
-        )
+        m = self.m
+        m[0] *= x
+        m[3] *= x
+        m[1] *= y
+        m[4] *= y
 
     def rotate(self, angle_radians):
-        s = math.sin(angle_radians)
-        c = math.cos(angle_radians)
+        self.rotate_sin_cos(math.sin(angle_radians), math.cos(angle_radians))
 
-        self.m = multiply_3x3(
-            self.m,
-            array.array(
-                "f",
-                (
-                    c,
-                    -s,
-                    0.0,
-                    s,
-                    c,
-                    0.0,
-                    0.0,
-                    0.0,
-                    1.0,
-                ),
-            ),
-        )
+    def rotate_sin_cos(self, s, c):
+        """
+        rotate() with the sine and cosine of the angle already known.
+        """
+        a, b, _, d, e, _ = self.m
+        m = self.m
+        m[0] = a * c + b * s
+        m[1] = b * c - a * s
+        m[3] = d * c + e * s
+        m[4] = e * c - d * s
 
     def ortho(self, left, right, bottom, top):
         w = right - left
@@ -223,23 +311,14 @@ class Matrix3x3:
         h = top - bottom
         ty = -(top + bottom) / h
 
-        self.m = multiply_3x3(
-            self.m,
-            array.array(
-                "f",
-                (
-                    2.0 / w,
-                    0.0,
-                    tx,
-                    0.0,
-                    2.0 / h,
-                    ty,
-                    0.0,
-                    0.0,
-                    1.0,
-                ),
-            ),
-        )
+        self.multiply(2.0 / w, 0.0, tx, 0.0, 2.0 / h, ty)
+
+    def gl_matrix(self):
+        """
+        Column-major 4x4 matrix for glLoadMatrixf().
+        """
+        a, b, c, d, e, f = self.m
+        return (a, d, 0.0, 0.0, b, e, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, c, f, 0.0, 1.0)
 
 
 def test_matrix3x3():
@@ -254,34 +333,247 @@ def test_matrix3x3():
     ]
 
     for method, *args in test_ops:
-        m = Matrix3x3()
+        m = AffineMatrix()
         for v in ((100, 200), (0, 0)):
             getattr(m, method)(*args)
             logging.debug(f"{v} -> {method}{tuple(args)} -> {m.apply(v)}")
 
 
+def benchmark_affine_matrix(num_points=1000, repeat=100):
+    """
+    Compare AffineMatrix against the array.array/multiply_3x3 path.
+    """
+
+    def legacy_matrix(angle_radians):
+        s = math.sin(angle_radians)
+        c = math.cos(angle_radians)
+        m = array.array("f", (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0))
+        for op in (
+            (1.0, 0.0, 30, 0.0, 1.0, 40, 0.0, 0.0, 1.0),
+            (0.5, 0.0, 0.0, 0.0, 2.0, 0.0, 0.0, 0.0, 1.0),
+            (c, -s, 0.0, s, c, 0.0, 0.0, 0.0, 1.0),
+        ):
+            m = multiply_3x3(m, array.array("f", op))
+        return m
+
+    def legacy_apply(m, v):
+        v = (
+            m[0] * v[0] + m[1] * v[1] + m[2],
+            m[3] * v[0] + m[4] * v[1] + m[5],
+            m[6] * v[0] + m[7] * v[1] + m[8],
+        )
+        return (v[0] / v[2], v[1] / v[2])
+
+    def affine_matrix(angle_radians):
+        m = AffineMatrix()
+        m.translate(30, 40)
+        m.scale(0.5, 2.0)
+        m.rotate(angle_radians)
+        return m
+
+    points = [
+        Vector2(random.uniform(-500, 500), random.uniform(-500, 500))
+        for _ in range(num_points)
+    ]
+    points_array = np.array([(p.x, p.y) for p in points])
+
+    started = time.perf_counter()
+    for i in range(repeat):
+        m = legacy_matrix(i * 0.01)
+        legacy_result = [Vector2(legacy_apply(m, p)) for p in points]
+    legacy_duration = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(repeat):
+        m = affine_matrix(i * 0.01)
+        affine_result = [Vector2(m.apply(p)) for p in points]
+    affine_duration = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in range(repeat):
+        batched_result = affine_matrix(i * 0.01).apply_many(points_array)
+    batched_duration = time.perf_counter() - started
+
+    max_error = max(
+        float(np.abs(np.array(legacy_result) - np.array(affine_result)).max()),
+        float(np.abs(np.array(legacy_result) - batched_result).max()),
+    )
+
+    print(f"AffineMatrix: {repeat} x {num_points} points")
+    print(f"  multiply_3x3 + per-point apply: {legacy_duration * 1000:8.2f} ms")
+    print(f"  AffineMatrix per-point apply:   {affine_duration * 1000:8.2f} ms")
+    print(f"  AffineMatrix apply_many:        {batched_duration * 1000:8.2f} ms")
+    print(f"  speedup: {legacy_duration / batched_duration:.1f}x")
+    print(f"  max error: {max_error:.4f}")
+
+
 class ImageSprite:
-    def __init__(self, img: pygame.surface.Surface, *, want_mipmap: bool):
+    # accumulated for the startup report
+    load_seconds = 0.0
+
+    def __init__(
+        self,
+        img: pygame.surface.Surface,
+        *,
+        want_mipmap: bool,
+        max_mipmap_level: int = None,
+    ):
         self.img = img
         self.width, self.height = self.img.get_size()
         self.want_mipmap = want_mipmap
+        self.max_mipmap_level = max_mipmap_level
         self._texture = None
 
+        # mipmap chain loaded from / to be stored in the MIPMAP_CACHE
+        self.mipmap_levels = None
+        self.mipmap_cache_filename = None
+
+        # sprite whose texture holds our pixels (an atlas page, or ourselves)
+        self.texture_sprite = self
+        self.set_uv_rect(0.0, 0.0, 1.0, 1.0)
+
     @classmethod
-    def load(cls, filename: str):
-        return cls(pygame.image.load(filename).convert_alpha(), want_mipmap=True)
+    def load(cls, filename: str, *, standalone: bool = False):
+        """
+        Only standalone sprites (drawn from their own texture rather than an
+        atlas page) are looked up in and added to the MIPMAP_CACHE.
+        """
+        started = time.perf_counter()
+
+        levels = None
+        cache_filename = None
+        if MIPMAP_CACHE is not None and standalone:
+            cache_filename = MIPMAP_CACHE.filename_for(filename)
+            levels = MIPMAP_CACHE.load(cache_filename)
+
+        if levels is not None:
+            height, width, _ = levels[0].shape
+            img = pygame.image.frombuffer(
+                levels[0][:, :, (2, 1, 0, 3)].tobytes(), (width, height), "RGBA"
+            ).convert_alpha()
+        else:
+            img = pygame.image.load(filename).convert_alpha()
+
+        sprite = cls(img, want_mipmap=True)
+        sprite.mipmap_levels = levels
+        if levels is None or len(levels) == 1:
+            # (re-)populate the cache once mipmaps are generated
+            sprite.mipmap_cache_filename = cache_filename
+
+        if cache_filename is not None and levels is None:
+            MIPMAP_CACHE.store(cache_filename, [surface_pixels(img)])
+
+        cls.load_seconds += time.perf_counter() - started
+        return sprite
 
     @property
     def size(self):
         return Vector2(self.width, self.height)
 
+    def set_uv_rect(self, u0: float, v0: float, u1: float, v1: float):
+        self.uv_rect = (u0, v0, u1, v1)
+        # texture coordinates of the two triangles (tl, tr, br) and (tl, br, bl)
+        self.quad_texcoords = (
+            (u0, v0),
+            (u1, v0),
+            (u1, v1),
+            (u0, v0),
+            (u1, v1),
+            (u0, v1),
+        )
+
+    def place_in_atlas(self, page: ImageSprite, rect: Rect):
+        self.texture_sprite = page
+        self.set_uv_rect(
+            rect.left / page.width,
+            rect.top / page.height,
+            rect.right / page.width,
+            rect.bottom / page.height,
+        )
+
     def _get_texture(self):
+        if self.texture_sprite is not self:
+            return self.texture_sprite._get_texture()
+
         if self._texture is None:
-            self._texture = Texture(self, generate_mipmaps=self.want_mipmap)
+            self._texture = Texture(
+                self,
+                generate_mipmaps=self.want_mipmap,
+                max_mipmap_level=self.max_mipmap_level,
+            )
 
         return self._texture
 
 
+class TextureAtlas:
+    """
+    Packs small sprites into a few shared textures ("pages") at load time,
+    so that all sprites of a page can be drawn in a single draw call.
+    """
+
+    PAGE_SIZE = 1024
+
+    # Transparent border around each sprite. Pages are mipmapped only down to
+    # the level where this border is one texel wide, so neighbours never bleed.
+    PADDING = 8
+    MAX_MIPMAP_LEVEL = 3
+
+    def __init__(self):
+        self.pages = []
+
+    def pack(self, sprites: [ImageSprite]):
+        def align(value):
+            return -(-value // self.PADDING) * self.PADDING
+
+        placements = []
+        x = y = shelf_height = 0
+
+        # shelf packing, tallest sprites first
+        for sprite in sorted(set(sprites), key=lambda sprite: -sprite.height):
+            w = align(sprite.width + 2 * self.PADDING)
+            h = align(sprite.height + 2 * self.PADDING)
+
+            if w > self.PAGE_SIZE or h > self.PAGE_SIZE:
+                logging.debug(f"Sprite of size {sprite.size} too big for atlas")
+                continue
+
+            if x + w > self.PAGE_SIZE:
+                x = 0
+                y += shelf_height
+                shelf_height = 0
+
+            if y + h > self.PAGE_SIZE:
+                self._make_page(placements, y)
+                placements = []
+                x = y = shelf_height = 0
+
+            placements.append((sprite, x + self.PADDING, y + self.PADDING))
+            x += w
+            shelf_height = max(shelf_height, h)
+
+        if placements:
+            self._make_page(placements, y + shelf_height)
+
+    def _make_page(self, placements, height: int):
+        img = pygame.Surface((self.PAGE_SIZE, height), SRCALPHA).convert_alpha()
+        img.fill((0, 0, 0, 0))
+
+        page = ImageSprite(
+            img, want_mipmap=True, max_mipmap_level=self.MAX_MIPMAP_LEVEL
+        )
+
+        for sprite, x, y in placements:
+            # adding to transparent black copies the pixels unchanged
+            img.blit(sprite.img, (x, y), special_flags=BLEND_RGBA_ADD)
+            sprite.place_in_atlas(page, Rect(x, y, sprite.width, sprite.height))
+
+        logging.debug(
+            f"Atlas page {len(self.pages)}: {len(placements)} sprites, "
+            f"{self.PAGE_SIZE}x{height} pixels"
+        )
+        self.pages.append(page)
+
+
 class AnimatedImageSprite:
     def __init__(self, frames: list[ImageSprite], *, delay_ms: int):
         self.frames = frames
@@ -292,44 +584,140 @@ class AnimatedImageSprite:
         return self.frames[pos % len(self.frames)]
 
 
+def surface_pixels(img: pygame.surface.Surface):
+    """
+    Copy of the pixels of a 32-bit surface as (height, width, 4) array.
+    """
+    pixels = np.frombuffer(img.get_buffer(), dtype=np.uint8)
+    pixels = pixels.reshape(img.get_height(), img.get_pitch())
+    return pixels[:, : img.get_width() * 4].reshape(img.get_height(), -1, 4).copy()
+
+
+class MipmapCache:
+    """
+    On-disk cache of decoded images and their mipmap chains, keyed by the hash
+    of the image file, so later launches skip PNG decoding and mipmap generation.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def filename_for(self, image_filename: str):
+        with open(image_filename, "rb") as fp:
+            digest = hashlib.sha1(fp.read()).hexdigest()
+
+        return os.path.join(self.directory, f"{digest}-v{self.VERSION}.npz")
+
+    def load(self, cache_filename: str):
+        """
+        Returns the list of mipmap levels as (height, width, 4) BGRA arrays,
+        or None if nothing is cached yet.
+        """
+        if not os.path.exists(cache_filename):
+            return None
+
+        try:
+            with np.load(cache_filename) as npz:
+                return [npz[f"level{i}"] for i in range(len(npz.files))]
+        except Exception as e:
+            logging.warning(f"Ignoring broken texture cache {cache_filename}: {e}")
+            return None
+
+    def store(self, cache_filename: str, levels):
+        np.savez(
+            cache_filename, **{f"level{i}": level for i, level in enumerate(levels)}
+        )
+
+
+MIPMAP_CACHE = (
+    MipmapCache(
+        os.path.join(
+            os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+            "redplanted",
+            "textures",
+        )
+    )
+    if CLIARGS.texture_cache
+    else None
+)
+
+
 class Texture:
-    def __init__(self, sprite: ImageSprite, *, generate_mipmaps: bool):
+    # accumulated for the startup report
+    count = 0
+    upload_seconds = 0.0
+
+    def __init__(
+        self,
+        sprite: ImageSprite,
+        *,
+        generate_mipmaps: bool,
+        max_mipmap_level: int = None,
+    ):
+        started = time.perf_counter()
+
         self.id = glGenTextures(1)
 
-        glBindTexture(GL_TEXTURE_2D, self.id)
-        glTexImage2D(
-            GL_TEXTURE_2D,
-            0,
-            GL_RGBA,
-            sprite.width,
-            sprite.height,
-            0,
-            GL_RGBA,
-            GL_UNSIGNED_BYTE,
-            None,
-        )
+        GL_STATE.bind_texture(self.id)
         glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
 
-        view = sprite.img.get_buffer()
-        for y in range(sprite.height):
-            start = y * sprite.img.get_pitch()
-            pixeldata = view.raw[
-                start : start + sprite.width * sprite.img.get_bytesize()
-            ]
-            glTexSubImage2D(
+        if max_mipmap_level is not None:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, max_mipmap_level)
+
+        levels = sprite.mipmap_levels
+        if levels is not None and (len(levels) > 1 or not generate_mipmaps):
+            # complete chain from the on-disk cache
+            for level, pixels in enumerate(levels):
+                height, width, _ = pixels.shape
+                glTexImage2D(
+                    GL_TEXTURE_2D,
+                    level,
+                    GL_RGBA,
+                    width,
+                    height,
+                    0,
+                    GL_BGRA,
+                    GL_UNSIGNED_BYTE,
+                    pixels,
+                )
+
+            if generate_mipmaps:
+                glTexParameteri(
+                    GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1
+                )
+        else:
+            # upload straight from the surface memory, rows are pitch bytes apart
+            glPixelStorei(
+                GL_UNPACK_ROW_LENGTH, sprite.img.get_pitch() // sprite.img.get_bytesize()
+            )
+            pixels = np.frombuffer(sprite.img.get_buffer(), dtype=np.uint8)
+            glTexImage2D(
                 GL_TEXTURE_2D,
                 0,
-                0,
-                y,
+                GL_RGBA,
                 sprite.width,
-                1,
+                sprite.height,
+                0,
                 GL_BGRA,
                 GL_UNSIGNED_BYTE,
-                pixeldata,
+                pixels,
             )
+            del pixels  # unlocks the surface
+            glPixelStorei(GL_UNPACK_ROW_LENGTH, 0)
+
+            if generate_mipmaps:
+                glGenerateMipmap(GL_TEXTURE_2D)
+
+                if sprite.mipmap_cache_filename is not None:
+                    MIPMAP_CACHE.store(
+                        sprite.mipmap_cache_filename,
+                        self._read_levels(sprite, max_mipmap_level),
+                    )
 
         if generate_mipmaps:
-            glGenerateMipmap(GL_TEXTURE_2D)
             glTexParameteri(
                 GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR
             )
@@ -338,10 +726,55 @@ class Texture:
 
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
 
-        glBindTexture(GL_TEXTURE_2D, 0)
+        Texture.count += 1
+        Texture.upload_seconds += time.perf_counter() - started
+
+    def update_rect(self, sprite: ImageSprite, rect: Rect):
+        """
+        Upload the pixels in rect of the sprite's surface to the same place in
+        the texture (level 0 only).
+        """
+        img = sprite.img
+        pitch, bytesize = img.get_pitch(), img.get_bytesize()
+
+        GL_STATE.bind_texture(self.id)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, pitch // bytesize)
+        pixels = np.frombuffer(img.get_buffer(), dtype=np.uint8)
+        glTexSubImage2D(
+            GL_TEXTURE_2D,
+            0,
+            rect.x,
+            rect.y,
+            rect.width,
+            rect.height,
+            GL_BGRA,
+            GL_UNSIGNED_BYTE,
+            pixels[rect.y * pitch + rect.x * bytesize :],
+        )
+        del pixels  # unlocks the surface
+        glPixelStorei(GL_UNPACK_ROW_LENGTH, 0)
+
+    def _read_levels(self, sprite: ImageSprite, max_mipmap_level: int):
+        num_levels = int(math.log2(max(sprite.width, sprite.height))) + 1
+        if max_mipmap_level is not None:
+            num_levels = min(num_levels, max_mipmap_level + 1)
+
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+
+        levels = []
+        for level in range(num_levels):
+            width = max(1, sprite.width >> level)
+            height = max(1, sprite.height >> level)
+            pixels = glGetTexImage(GL_TEXTURE_2D, level, GL_BGRA, GL_UNSIGNED_BYTE)
+            levels.append(
+                np.frombuffer(pixels, dtype=np.uint8).reshape(height, width, 4)
+            )
+
+        return levels
 
     def __del__(self):
-        glDeleteTextures([self.id])
+        GL_STATE.delete_texture(self.id)
 
 
 # class CustomCursor:
@@ -359,8 +792,10 @@ class ResourceManager:
     def filename(self, filename: str):
         return os.path.join(self.root, filename)
 
-    def sprite(self, filename: str):
-        return ImageSprite.load(self.dir("image").filename(filename))
+    def sprite(self, filename: str, *, standalone: bool = False):
+        return ImageSprite.load(
+            self.dir("image").filename(filename), standalone=standalone
+        )
 
     def font(self, filename: str, point_size: int):
         return pygame.font.Font(self.dir("font").filename(filename), point_size)
@@ -370,6 +805,9 @@ class ResourceManager:
 
 
 class Artwork:
+    # unripe and ripe tomato sprites per growth factor of the fruit's branch
+    TOMATO_STAGE_SCALE = 2.3
+
     def __init__(self, resources: ResourceManager):
         # images
         self.tomato = [
@@ -383,7 +821,7 @@ class Artwork:
         ]
         self.leaves = [resources.sprite(f"leafpx{num}.png") for num in (1, 2, 3)]
         self.rocks = [resources.sprite(f"rockpx{num}.png") for num in (1, 2, 3, 4)]
-        self.planet = resources.sprite("mars.png")
+        self.planet = resources.sprite("mars.png", standalone=True)
         self.spaceship = resources.sprite("spaceship.png")
         self.logo_text = resources.sprite("logo-text.png")
         self.logo_bg = resources.sprite("logo-bg.png")
@@ -413,15 +851,31 @@ class Artwork:
             delay_ms=200,
         )
 
+        # pack the small sprites (but not the planet) into shared textures
+        self.atlas = TextureAtlas()
+        self.atlas.pack(
+            [
+                *self.tomato,
+                *self.leaves,
+                *self.rocks,
+                self.spaceship,
+                self.logo_text,
+                self.logo_bg,
+                *(
+                    sprite
+                    for sprites in self.cursors.values()
+                    for sprite in sprites.values()
+                ),
+                *self.fly_animation.frames,
+            ]
+        )
+
         # sounds
         self.pick = [resources.sound(f"pick{num}.wav") for num in (1,)]
         self.mowing = [resources.sound(f"mowing{num}.wav") for num in (1, 2, 3)]
         self.slap = [resources.sound(f"slap{num}.wav") for num in (1, 2, 3)]
         self.ripe_sound = resources.sound("ripe.wav")
 
-    def is_tomato_ripe(self, tomato: ImageSprite):
-        return tomato == self.get_ripe_tomato()
-
     def get_ripe_tomato(self):
         return self.tomato[-2]
 
@@ -429,7 +883,20 @@ class Artwork:
         if rotten:
             return self.tomato[-1]
 
-        return self.tomato[max(0, min(2, int(factor * 2.3)))]
+        return self.tomato[max(0, min(2, int(factor * self.TOMATO_STAGE_SCALE)))]
+
+    def get_ripe_factor(self):
+        """
+        Smallest growth factor of a fruit's branch that shows the ripe tomato.
+        """
+        return (len(self.tomato) - 2) / self.TOMATO_STAGE_SCALE
+
+    def get_plant_sprite_reach(self):
+        """
+        Farthest a leaf or fruit sprite (at scale 1) extends from the end of
+        its branch.
+        """
+        return max(sprite.size.length() for sprite in self.tomato + self.leaves)
 
     def get_random_leaf(self):
         return random.choice(self.leaves)
@@ -462,762 +929,3102 @@ class Artwork:
         return self.ripe_sound
 
 
-def aabb_from_points(points: [Vector2]):
+def aabb_from_points(points):
     """
-    Compute axis-aligned bounding box from points.
+    Compute axis-aligned bounding box from points (sequence or (N, 2) array).
     """
-    x = min(point.x for point in points)
-    y = min(point.y for point in points)
-    w = max(point.x for point in points) - x
-    h = max(point.y for point in points) - y
-    return Rect(x, y, w, h)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    x, y = points.min(axis=0)
+    right, bottom = points.max(axis=0)
+    return Rect(x, y, right - x, bottom - y)
 
 
-class IDrawTask:
-    def draw(self):
-        raise NotImplementedError("Do not know how to draw this task")
+def unit_circle(radius: float):
+    """
+    Directions (cos, sin) around the unit circle as (N, 2) array, starting and
+    ending at angle 0. Small circles can affort 20 steps, for bigger circles,
+    add enough steps that the largest line segment is 30 world units.
+    """
+    steps = min(100, max(20, (radius * 2 * math.pi) / 30))
+    return unit_circle_table(int(360 / steps))
 
 
-class DrawSpriteTask(IDrawTask):
-    def __init__(self, sprite: ImageSprite):
-        self.sprite = sprite
-        self.data = array.array("f")
+@functools.lru_cache(maxsize=None)
+def unit_circle_table(step_degrees: int):
+    """
+    Read-only (cos, sin) table for unit_circle(), shared by all circles that
+    use the same angle step.
+    """
+    angles = np.radians(np.arange(0, 361, step_degrees))
+    table = np.column_stack((np.cos(angles), np.sin(angles)))
+    table.flags.writeable = False
+    return table
 
-    def append(self, position: Vector2, scale: Vector2, apply_modelview_matrix):
-        if scale is None:
-            scale = Vector2(1, 1)
 
-        right = Vector2(self.sprite.width * scale.x, 0)
-        bottom = Vector2(0, self.sprite.height * scale.y)
+class GLStateCache:
+    """
+    Shadow copy of the GL state that draw tasks change: enabled caps, client
+    arrays, blend function, current color, bound texture, array buffer and
+    program. Calls that would not change anything are skipped, each PyOpenGL
+    call being a Python-to-C round trip. All changes to the tracked state
+    have to go through here, so that the copy stays correct.
+    """
 
-        tl = Vector2(position)
-        tr = tl + right
-        bl = tl + bottom
-        br = bl + right
+    def __init__(self):
+        self.caps = {}
+        self.client_arrays = {}
+        self.blend_func = None
+        self.color = None
+        self.texture = None
+        self.array_buffer = None
+        self.program = None
+
+        self.calls = 0
+        self.skipped = 0
+        self.calls_last_frame = 0
+        self.skipped_last_frame = 0
+
+    def next_frame(self):
+        self.calls_last_frame = self.calls
+        self.skipped_last_frame = self.skipped
+        self.calls = 0
+        self.skipped = 0
+
+    def enable(self, cap: int, enabled: bool = True):
+        if self.caps.get(cap) == enabled:
+            self.skipped += 1
+            return
 
-        corners_in_modelview_space = [tl, tr, bl, br]
+        self.calls += 1
+        self.caps[cap] = enabled
+        if enabled:
+            glEnable(cap)
+        else:
+            glDisable(cap)
 
-        tl = apply_modelview_matrix(tl)
-        tr = apply_modelview_matrix(tr)
-        bl = apply_modelview_matrix(bl)
-        br = apply_modelview_matrix(br)
+    def use_client_arrays(self, vertex=False, texcoord=False, color=False):
+        self._client_array(GL_VERTEX_ARRAY, vertex)
+        self._client_array(GL_TEXTURE_COORD_ARRAY, texcoord)
+        self._client_array(GL_COLOR_ARRAY, color)
 
-        self.data.extend(
-            (
-                0.0,
-                0.0,
-                tl.x,
-                tl.y,
-                1.0,
-                0.0,
-                tr.x,
-                tr.y,
-                1.0,
-                1.0,
-                br.x,
-                br.y,
-                0.0,
-                0.0,
-                tl.x,
-                tl.y,
-                1.0,
-                1.0,
-                br.x,
-                br.y,
-                0.0,
-                1.0,
-                bl.x,
-                bl.y,
-            )
-        )
+    def _client_array(self, array: int, enabled: bool):
+        if self.client_arrays.get(array) == enabled:
+            self.skipped += 1
+            return
 
-        return corners_in_modelview_space
+        self.calls += 1
+        self.client_arrays[array] = enabled
+        if enabled:
+            glEnableClientState(array)
+        else:
+            glDisableClientState(array)
 
-    def draw(self):
-        texture = self.sprite._get_texture()
-        glBindTexture(GL_TEXTURE_2D, texture.id)
+        if array == GL_COLOR_ARRAY:
+            # drawing with a color array leaves the current color undefined
+            self.color = None
 
-        glEnable(GL_TEXTURE_2D)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    def set_blend_func(self, sfactor: int, dfactor: int):
+        if self.blend_func == (sfactor, dfactor):
+            self.skipped += 1
+            return
 
-        glColor4f(1, 1, 1, 1)
+        self.calls += 1
+        self.blend_func = (sfactor, dfactor)
+        glBlendFunc(sfactor, dfactor)
 
-        buf = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, buf)
-        glBufferData(GL_ARRAY_BUFFER, self.data.tobytes(), GL_STATIC_DRAW)
+    def set_color(self, r: float, g: float, b: float, a: float):
+        """
+        Current color, for drawing with the color array disabled.
+        """
+        if self.color == (r, g, b, a):
+            self.skipped += 1
+            return
 
-        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
-        glTexCoordPointer(
-            2, GL_FLOAT, 4 * ctypes.sizeof(ctypes.c_float), ctypes.c_void_p(0)
-        )
+        self.calls += 1
+        self.color = (r, g, b, a)
+        glColor4f(r, g, b, a)
 
-        glEnableClientState(GL_VERTEX_ARRAY)
-        glVertexPointer(
-            2,
-            GL_FLOAT,
-            4 * ctypes.sizeof(ctypes.c_float),
-            ctypes.c_void_p(2 * ctypes.sizeof(ctypes.c_float)),
-        )
+    def bind_texture(self, texture_id: int):
+        if self.texture == texture_id:
+            self.skipped += 1
+            return
 
-        glDrawArrays(GL_TRIANGLES, 0, int(len(self.data) / 4))
+        self.calls += 1
+        self.texture = texture_id
+        glBindTexture(GL_TEXTURE_2D, texture_id)
 
-        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
-        glDisableClientState(GL_VERTEX_ARRAY)
+    def bind_array_buffer(self, buffer_id: int):
+        if self.array_buffer == buffer_id:
+            self.skipped += 1
+            return
 
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.calls += 1
+        self.array_buffer = buffer_id
+        glBindBuffer(GL_ARRAY_BUFFER, buffer_id)
 
-        glDeleteBuffers(1, [buf])
+    def use_program(self, program: int):
+        if self.program == program:
+            self.skipped += 1
+            return
 
-        glDisable(GL_BLEND)
-        glDisable(GL_TEXTURE_2D)
+        self.calls += 1
+        self.program = program
+        glUseProgram(program)
 
-        glBindTexture(GL_TEXTURE_2D, 0)
+    def delete_texture(self, texture_id: int):
+        # deleting the bound texture binds 0
+        if self.texture == texture_id:
+            self.texture = 0
+        glDeleteTextures([texture_id])
 
+    def delete_buffer(self, buffer_id: int):
+        # deleting the bound buffer binds 0
+        if self.array_buffer == buffer_id:
+            self.array_buffer = 0
+        glDeleteBuffers(1, [buffer_id])
 
-class DrawColoredVerticesTask(IDrawTask):
-    def __init__(self, mode):
-        self.data = array.array("f")
-        self.mode = mode
 
-    def append(self, color: Color, vertices: [Vector2], apply_modelview_matrix):
-        r, g, b, a = color.normalize()
+GL_STATE = GLStateCache()
 
-        for v in vertices:
-            vertex = apply_modelview_matrix(v)
-            self.data.extend((vertex.x, vertex.y, r, g, b, a))
 
-    def append_separate(
-        self, colors: [Color], vertices: [Vector2], apply_modelview_matrix
-    ):
-        for color, vertex in zip(colors, vertices):
-            vertex = apply_modelview_matrix(vertex)
-            r, g, b, a = color.normalize()
+class StreamingVertexBuffer:
+    """
+    Persistent GL_ARRAY_BUFFER that draw tasks stream their vertex data into.
 
-            self.data.extend((vertex.x, vertex.y, r, g, b, a))
+    Uploads are appended at increasing offsets. When the buffer is full, its
+    storage is orphaned (glBufferData with no data), so the driver can hand
+    out fresh memory instead of waiting for pending draws, and writing
+    restarts at offset 0. The buffer grows if a single upload does not fit.
+    """
 
-    def draw(self):
-        buf = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, buf)
-        glBufferData(GL_ARRAY_BUFFER, self.data.tobytes(), GL_STATIC_DRAW)
+    INITIAL_SIZE = 1024 * 1024
 
-        glEnableClientState(GL_VERTEX_ARRAY)
-        glVertexPointer(
-            2, GL_FLOAT, 6 * ctypes.sizeof(ctypes.c_float), ctypes.c_void_p(0)
-        )
+    def __init__(self, size: int = INITIAL_SIZE):
+        self.id = glGenBuffers(1)
+        self.size = size
+        self.offset = 0
+        self.bytes_streamed = 0
+        self.bytes_streamed_last_frame = 0
 
-        glEnableClientState(GL_COLOR_ARRAY)
-        glColorPointer(
-            4,
-            GL_FLOAT,
-            6 * ctypes.sizeof(ctypes.c_float),
-            ctypes.c_void_p(2 * ctypes.sizeof(ctypes.c_float)),
-        )
+        GL_STATE.bind_array_buffer(self.id)
+        glBufferData(GL_ARRAY_BUFFER, self.size, None, GL_STREAM_DRAW)
 
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    def upload(self, data: bytes):
+        """
+        Upload data and leave the buffer bound, returns the byte offset of data.
+        """
+        GL_STATE.bind_array_buffer(self.id)
 
-        glDrawArrays(self.mode, 0, int(len(self.data) / 6))
+        if self.offset + len(data) > self.size:
+            while len(data) > self.size:
+                self.size *= 2
+                logging.debug(f"Growing vertex buffer to {self.size} bytes")
 
-        glDisable(GL_BLEND)
+            glBufferData(GL_ARRAY_BUFFER, self.size, None, GL_STREAM_DRAW)
+            self.offset = 0
 
-        glDisableClientState(GL_COLOR_ARRAY)
-        glDisableClientState(GL_VERTEX_ARRAY)
+        offset = self.offset
+        glBufferSubData(GL_ARRAY_BUFFER, offset, len(data), data)
 
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.offset += len(data)
+        self.bytes_streamed += len(data)
 
-        glDeleteBuffers(1, [buf])
+        return offset
 
+    def next_frame(self):
+        self.bytes_streamed_last_frame = self.bytes_streamed
+        self.bytes_streamed = 0
 
-class MatrixStack:
-    def __init__(self):
-        self.stack = [Matrix3x3()]
+    def __del__(self):
+        GL_STATE.delete_buffer(self.id)
 
-    def push(self):
-        self.stack.append(Matrix3x3(self.stack[-1]))
 
-    def pop(self):
-        self.stack.pop()
+class StaticMesh:
+    """
+    Geometry that never changes, uploaded into its own GL_ARRAY_BUFFER when it
+    is first drawn and drawn with the current modelview matrix. Each vertex is
+    stored as (x, y, u, v, r, g, b, a) in object space.
+    """
 
-    def identity(self):
-        self.stack[-1] = Matrix3x3()
+    FLOATS_PER_VERTEX = 8
 
-    def translate(self, x: float, y: float):
-        self.stack[-1].translate(x, y)
+    def __init__(self, mode: int, vertices, colors, texcoords=None):
+        data = np.zeros((len(vertices), self.FLOATS_PER_VERTEX), dtype=np.float32)
+        data[:, :2] = vertices
+        if texcoords is not None:
+            data[:, 2:4] = texcoords
+        data[:, 4:] = colors
 
-    def rotate(self, angle_radians: float):
-        self.stack[-1].rotate(angle_radians)
+        self.mode = mode
+        self.count = len(data)
+        self.textured = texcoords is not None
 
-    def scale(self, x: float, y: float):
-        self.stack[-1].scale(x, y)
+        # kept until the first draw, so that meshes can be built without GL
+        self.data = data
+        self.buffer = None
 
-    def ortho(self, left: float, right: float, bottom: float, top: float):
-        self.stack[-1].ortho(left, right, bottom, top)
+    def __del__(self):
+        if self.buffer is not None:
+            GL_STATE.delete_buffer(self.buffer)
 
-    def apply(self, v: Vector2):
-        return Vector2(self.stack[-1].apply(v))
+    def draw(self):
+        float_size = ctypes.sizeof(ctypes.c_float)
+        stride = self.FLOATS_PER_VERTEX * float_size
 
+        if self.buffer is None:
+            self.buffer = glGenBuffers(1)
+            GL_STATE.bind_array_buffer(self.buffer)
+            glBufferData(GL_ARRAY_BUFFER, self.data.tobytes(), GL_STATIC_DRAW)
+            self.data = None
 
-class FontCacheEntry:
-    def __init__(self, text: str, sprite: ImageSprite):
-        self.generation = -1
-        self.text = text
-        self.sprite = sprite
+        GL_STATE.bind_array_buffer(self.buffer)
+        GL_STATE.use_client_arrays(vertex=True, texcoord=self.textured, color=True)
 
+        glVertexPointer(2, GL_FLOAT, stride, None)
+        if self.textured:
+            glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(2 * float_size))
+        glColorPointer(4, GL_FLOAT, stride, ctypes.c_void_p(4 * float_size))
 
-class FontCache:
-    EXPIRE_GENERATIONS = 20
+        glDrawArrays(self.mode, 0, self.count)
 
-    def __init__(self, font):
-        self.font = font
-        self.generation = 0
-        self.cache = {}
 
-    def lookup(self, text: str, color: Color):
-        key = (text, tuple(color))
+class RenderTarget:
+    """
+    Offscreen framebuffer with a texture as color buffer. The texture has no
+    alpha channel, so it composites as an opaque image.
 
-        if key not in self.cache:
-            sprite = ImageSprite(self.font.render(text, True, color), want_mipmap=False)
-            self.cache[key] = FontCacheEntry(text, sprite)
+    With samples > 0, drawing goes into a multisampled renderbuffer instead,
+    which resolve() copies into the texture.
+    """
 
-        entry = self.cache[key]
-        entry.generation = self.generation
-        return entry.sprite
+    def __init__(self, width: int, height: int, samples: int = 0):
+        self.width = width
+        self.height = height
+        self.texture_id = glGenTextures(1)
+        self.texture_framebuffer = glGenFramebuffers(1)
+        self.renderbuffer = glGenRenderbuffers(1) if samples else None
+        self.framebuffer = (
+            glGenFramebuffers(1) if samples else self.texture_framebuffer
+        )
 
-    def gc(self):
-        self.generation += 1
+        GL_STATE.bind_texture(self.texture_id)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexImage2D(
+            GL_TEXTURE_2D, 0, GL_RGB8, width, height, 0, GL_RGB, GL_UNSIGNED_BYTE, None
+        )
 
-        keys_to_erase = set()
-        for key, value in self.cache.items():
-            if self.generation - value.generation > self.EXPIRE_GENERATIONS:
-                keys_to_erase.add(key)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.texture_framebuffer)
+        glFramebufferTexture2D(
+            GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.texture_id, 0
+        )
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
 
-        for key in keys_to_erase:
-            del self.cache[key]
+        if samples and status == GL_FRAMEBUFFER_COMPLETE:
+            glBindRenderbuffer(GL_RENDERBUFFER, self.renderbuffer)
+            glRenderbufferStorageMultisample(
+                GL_RENDERBUFFER, samples, GL_RGB8, width, height
+            )
+            glBindRenderbuffer(GL_RENDERBUFFER, 0)
 
+            glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+            glFramebufferRenderbuffer(
+                GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.renderbuffer
+            )
+            status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
 
-class RenderContext:
-    LAYER_BRANCHES = 60
-    LAYER_LEAVES = 70
-    LAYER_FRUIT = 80
-    LAYER_FLIES = 90
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
 
-    LAYER_BTN_BG = 100
-    LAYER_BTN_TEXT = 110
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self._release()
+            raise RuntimeError(f"Framebuffer incomplete: {status:#x}")
 
-    def __init__(self, width, height, resources: ResourceManager):
-        self.width = width
-        self.height = height
-        self.font_cache = FontCache(resources.font("RobotoMono-SemiBold.ttf", 16))
-        self.font_cache_big = FontCache(resources.font("RobotoMono-SemiBold.ttf", 24))
-        self.queue = {}
-        self.started = time.time()
-        self.paused_started = None
-        self.now = 0
-        self.clock = pygame.time.Clock()
-        self.fps = 0
-        self.projection_matrix_stack = MatrixStack()
-        self.modelview_matrix_stack = MatrixStack()
+    def _release(self):
+        """
+        Delete the GL objects, once: __del__ also runs after a failed
+        __init__.
+        """
+        if self.renderbuffer is not None:
+            glDeleteFramebuffers(1, [self.framebuffer])
+            glDeleteRenderbuffers(1, [self.renderbuffer])
+        if self.texture_framebuffer is not None:
+            glDeleteFramebuffers(1, [self.texture_framebuffer])
+        if self.texture_id is not None:
+            GL_STATE.delete_texture(self.texture_id)
+
+        self.renderbuffer = None
+        self.framebuffer = None
+        self.texture_framebuffer = None
+        self.texture_id = None
 
-    def __enter__(self):
-        self.now = time.time() - self.started
-        if self.paused_started:
-            self.now -= time.time() - self.paused_started
-        self.camera_mode_overlay()
-        return self
+    def __del__(self):
+        self._release()
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        pygame.display.flip()
-        self.font_cache.gc()
-        self.font_cache_big.gc()
-        self.clock.tick()
-        self.fps = self.clock.get_fps()
-        return False
+    @property
+    def id(self):
+        return self.texture_id
 
-    def transform_to_screenspace(self, p):
-        p = self.modelview_matrix_stack.apply(p)
-        p = self.projection_matrix_stack.apply(p)
+    def _get_texture(self):
+        # render targets can be drawn like an ImageSprite (see RenderContext.mesh())
+        return self
 
-        p.x = self.width * (p.x + 1) / 2
-        p.y = self.height * (1 - ((p.y + 1) / 2))
+    def resolve(self):
+        if self.renderbuffer is None:
+            return
 
-        return p
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, self.texture_framebuffer)
+        glBlitFramebuffer(
+            0,
+            0,
+            self.width,
+            self.height,
+            0,
+            0,
+            self.width,
+            self.height,
+            GL_COLOR_BUFFER_BIT,
+            GL_NEAREST,
+        )
 
-    def setup_matrices(self, left, right, bottom, top):
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        self.projection_matrix_stack.identity()
 
-        glOrtho(left, right, bottom, top, 0, 1)
-        self.projection_matrix_stack.ortho(left, right, bottom, top)
+class IDrawTask:
+    # array.array with the vertex or instance data, if the task can be merged
+    data = None
 
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
-        self.modelview_matrix_stack.identity()
+    def draw(self, ctx: RenderContext):
+        raise NotImplementedError("Do not know how to draw this task")
 
-    def camera_mode_overlay(self):
-        self.setup_matrices(0, self.width, self.height, 0)
+    def texture_id(self):
+        """
+        Texture bound for drawing, used to sort tasks (0 = no texture).
+        """
+        texture_sprite = getattr(self, "texture_sprite", None)
+        return 0 if texture_sprite is None else texture_sprite._get_texture().id
 
-    def camera_mode_world(self, planet, zoom, rotate):
-        left = -self.width / 2
-        right = self.width / 2
-        bottom = self.height / 2
-        top = -self.height / 2
+    def vertex_count(self):
+        """
+        Number of vertices drawn, counted before any expansion in a shader.
+        """
+        raise NotImplementedError("Do not know how to count vertices of this task")
 
-        self.setup_matrices(left, right, bottom, top)
+    def merge(self, other):
+        """
+        Append the data of other, a task with the same key that draws right
+        after this one. Returns False if this task cannot be merged.
+        """
+        if self.data is None:
+            return False
 
-        # Adjust minimum zoom factor (used for the minimap display, i.e. fully zoomed out)
-        min_zoom = min(self.width, self.height) / (
-            (planet.radius + planet.atmosphere_height) * 2.5
-        )
+        self.data.extend(other.data)
+        return True
 
-        factor = min_zoom + (1.0 - min_zoom) * (1 - (1 - zoom))
 
-        self.modelview_matrix_stack.translate(-planet.position.x, -planet.position.y)
-        self.modelview_matrix_stack.translate(
-            0, (zoom**0.8) * (planet.radius + self.height / 8)
-        )
-        self.modelview_matrix_stack.scale(factor, factor)
-        self.modelview_matrix_stack.rotate(rotate * 2 * math.pi)
+class DrawSpriteTask(IDrawTask):
+    # two triangles (tl, tr, br) and (tl, br, bl) made from the corners (tl, tr, bl, br)
+    QUAD_CORNERS = (0, 1, 3, 0, 3, 2)
 
-    def clear(self, color: Color):
-        glClearColor(*color.normalize())
-        glClear(GL_COLOR_BUFFER_BIT)
+    def __init__(self, texture_sprite: ImageSprite):
+        # all sprites in this task share the texture of texture_sprite
+        self.texture_sprite = texture_sprite
+        self.data = array.array("f")
 
-    def sprite(
+    def append(
         self,
         sprite: ImageSprite,
         position: Vector2,
-        scale: Vector2 = None,
-        z_layer: int = 0,
+        scale: Vector2,
+        modelview: AffineMatrix,
     ):
-        key = (z_layer, sprite)
-        if key not in self.queue:
-            self.queue[key] = DrawSpriteTask(sprite)
+        sx, sy = (1, 1) if scale is None else scale
+
+        x, y = position
+        right = x + sprite.width * sx
+        bottom = y + sprite.height * sy
+
+        corners_in_modelview_space = ((x, y), (right, y), (x, bottom), (right, bottom))
+
+        # plain Python is faster than NumPy for a single quad
+        a, b, c, d, e, f = modelview.m
+        corners = [
+            (a * px + b * py + c, d * px + e * py + f)
+            for px, py in corners_in_modelview_space
+        ]
+
+        for (u, v), corner in zip(sprite.quad_texcoords, self.QUAD_CORNERS):
+            self.data.extend((u, v, *corners[corner]))
+
+        return corners_in_modelview_space
+
+    def draw(self, ctx):
+        GL_STATE.bind_texture(self.texture_id())
+        GL_STATE.use_program(0)
+        GL_STATE.enable(GL_TEXTURE_2D)
+        GL_STATE.enable(GL_BLEND)
+        GL_STATE.set_blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        offset = ctx.vertex_buffer.upload(self.data.tobytes())
+        GL_STATE.use_client_arrays(vertex=True, texcoord=True)
+        GL_STATE.set_color(1, 1, 1, 1)
 
-        return self.queue[key].append(
-            position, scale, self.modelview_matrix_stack.apply
+        glTexCoordPointer(
+            2, GL_FLOAT, 4 * ctypes.sizeof(ctypes.c_float), ctypes.c_void_p(offset)
+        )
+        glVertexPointer(
+            2,
+            GL_FLOAT,
+            4 * ctypes.sizeof(ctypes.c_float),
+            ctypes.c_void_p(offset + 2 * ctypes.sizeof(ctypes.c_float)),
         )
 
-    def text(self, text: str, color: Color, position: Vector2, big=False):
-        if text:
-            self.sprite((self.font_cache if not big else self.font_cache_big).lookup(text, color), position)
+        glDrawArrays(GL_TRIANGLES, 0, self.vertex_count())
 
-    def text_centered(self, text: str, color: Color):
-        if text:
-            sprite = self.font_cache.lookup(text, color)
-            self.sprite(
-                sprite,
-                (
-                    Vector2(self.width, self.height)
-                    - Vector2(sprite.width, sprite.height)
-                )
-                / 2,
-            )
+    def vertex_count(self):
+        return len(self.data) // 4
 
-    def text_centered_rect(self, text: str, color: Color, rect: Rect, *, z_layer: int = 0):
-        if text:
-            sprite = self.font_cache_big.lookup(text, color)
-            self.sprite(sprite, rect.topleft + (rect.size - sprite.size) / 2, z_layer=z_layer)
 
-    def rect(self, color: Color, rectangle: Rect, *, z_layer: int = 0):
-        self._colored_vertices(
+class InstancedShader:
+    """
+    GLSL program that expands one instance record into a few vertices.
+
+    Subclasses provide the shader sources, the per-vertex "corner" attribute
+    (a static buffer shared by all instances) and the per-instance attributes,
+    which are read interleaved from the streaming vertex buffer.
+    """
+
+    VERTEX_SOURCE = ""
+    FRAGMENT_SOURCE = ""
+
+    # flattened per-vertex corner attribute, CORNER_SIZE floats per vertex
+    CORNERS = ()
+    CORNER_SIZE = 2
+
+    # (attribute name, number of floats) in the order of the instance record
+    INSTANCE_ATTRIBUTES = ()
+
+    def __init__(self):
+        if not (glDrawArraysInstanced and glVertexAttribDivisor):
+            raise RuntimeError("Instanced drawing not supported")
+
+        self.program = compile_shader_program(self.VERTEX_SOURCE, self.FRAGMENT_SOURCE)
+
+        self.corner = glGetAttribLocation(self.program, "corner")
+        self.instance_attributes = [
+            (glGetAttribLocation(self.program, name), size)
+            for name, size in self.INSTANCE_ATTRIBUTES
+        ]
+        self.floats_per_instance = sum(size for _, size in self.INSTANCE_ATTRIBUTES)
+        self.vertices_per_instance = len(self.CORNERS) // self.CORNER_SIZE
+
+        self.corner_buffer = glGenBuffers(1)
+        GL_STATE.bind_array_buffer(self.corner_buffer)
+        glBufferData(
+            GL_ARRAY_BUFFER,
+            array.array("f", self.CORNERS).tobytes(),
+            GL_STATIC_DRAW,
+        )
+
+    def __del__(self):
+        GL_STATE.delete_buffer(self.corner_buffer)
+        glDeleteProgram(self.program)
+
+    def draw(self, ctx, data: array.array):
+        """
+        Draw all instance records in data, with the program already in use.
+        """
+        # generic attributes only, conventional arrays could alias attribute 0
+        GL_STATE.use_client_arrays()
+
+        GL_STATE.bind_array_buffer(self.corner_buffer)
+        glEnableVertexAttribArray(self.corner)
+        glVertexAttribPointer(
+            self.corner, self.CORNER_SIZE, GL_FLOAT, GL_FALSE, 0, None
+        )
+
+        offset = ctx.vertex_buffer.upload(data.tobytes())
+        stride = self.floats_per_instance * ctypes.sizeof(ctypes.c_float)
+
+        for location, size in self.instance_attributes:
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(
+                location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset)
+            )
+            glVertexAttribDivisor(location, 1)
+            offset += size * ctypes.sizeof(ctypes.c_float)
+
+        glDrawArraysInstanced(
             GL_TRIANGLES,
-            color,
-            [
-                rectangle.topleft,
-                rectangle.topright,
-                rectangle.bottomright,
-                rectangle.topleft,
-                rectangle.bottomright,
-                rectangle.bottomleft,
-            ],
-            z_layer=z_layer,
+            0,
+            self.vertices_per_instance,
+            len(data) // self.floats_per_instance,
         )
 
-    def aabb(self, color: Color, rectangle: Rect):
-        self._colored_vertices(
-            GL_LINES,
-            color,
-            [
-                rectangle.topleft,
-                rectangle.topright,
-                rectangle.topright,
-                rectangle.bottomright,
-                rectangle.bottomright,
-                rectangle.bottomleft,
-                rectangle.bottomleft,
-                rectangle.topleft,
-            ],
+        for location, size in self.instance_attributes:
+            glVertexAttribDivisor(location, 0)
+            glDisableVertexAttribArray(location)
+
+        glDisableVertexAttribArray(self.corner)
+
+
+class SpriteShader(InstancedShader):
+    VERTEX_SOURCE = """
+    #version 120
+
+    // per vertex: corner of the unit quad
+    attribute vec2 corner;
+
+    // per instance: affine transform from the unit quad to world space
+    // (modelview with sprite position and size applied) and texture rect
+    attribute vec3 transform_row0;
+    attribute vec3 transform_row1;
+    attribute vec4 uv_rect;
+
+    varying vec2 texcoord;
+
+    void main() {
+        vec3 p = vec3(corner, 1.0);
+        vec2 position = vec2(dot(transform_row0, p), dot(transform_row1, p));
+        gl_Position = gl_ModelViewProjectionMatrix * vec4(position, 0.0, 1.0);
+        texcoord = mix(uv_rect.xy, uv_rect.zw, corner);
+    }
+    """
+
+    FRAGMENT_SOURCE = """
+    #version 120
+
+    uniform sampler2D sprite_texture;
+
+    varying vec2 texcoord;
+
+    void main() {
+        gl_FragColor = texture2D(sprite_texture, texcoord);
+    }
+    """
+
+    # two triangles (tl, tr, br) and (tl, br, bl) of the unit quad
+    CORNERS = (0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 0.0, 1.0, 1.0, 0.0, 1.0)
+
+    INSTANCE_ATTRIBUTES = (("transform_row0", 3), ("transform_row1", 3), ("uv_rect", 4))
+
+
+class LineShader(InstancedShader):
+    VERTEX_SOURCE = """
+    #version 120
+
+    // per vertex: x = 0 at the start / 1 at the end, y = side of the line (+1/-1)
+    attribute vec2 corner;
+
+    // per instance: segment end points and their neighbours in the polyline
+    // (neighbour == end point for an open end), width and color
+    attribute vec4 segment;
+    attribute vec4 neighbours;
+    attribute float width;
+    attribute vec4 color;
+
+    uniform bool round_joins;
+
+    varying vec4 line_color;
+    varying vec2 local;
+    varying float half_width;
+    varying float segment_length;
+
+    // offset at "at" of the +1 side for the join between before-at-after
+    vec2 join_offset(vec2 before, vec2 at, vec2 after, vec2 normal, float hw) {
+        vec2 d0 = at - before;
+        vec2 d1 = after - at;
+        if (length(d0) < 0.0001 || length(d1) < 0.0001) {
+            return normal * hw;
+        }
+        vec2 tangent = normalize(d0) + normalize(d1);
+        if (length(tangent) < 0.0001) {
+            return normal * hw;
+        }
+        tangent = normalize(tangent);
+        vec2 miter = vec2(-tangent.y, tangent.x);
+        return miter * hw / max(dot(miter, normal), MITER_LIMIT_COS);
+    }
+
+    void main() {
+        vec2 p0 = segment.xy;
+        vec2 p1 = segment.zw;
+
+        segment_length = length(p1 - p0);
+        vec2 direction = vec2(1.0, 0.0);
+        if (segment_length > 0.0) {
+            direction = (p1 - p0) / segment_length;
+        }
+        vec2 normal = vec2(-direction.y, direction.x);
+
+        half_width = width / 2.0;
+        line_color = color;
+
+        vec2 position;
+        if (round_joins) {
+            // extend by the half width, the fragment shader cuts off round caps
+            float along = mix(-half_width, segment_length + half_width, corner.x);
+            position = p0 + direction * along + normal * corner.y * half_width;
+            local = vec2(along, corner.y * half_width);
+        } else {
+            vec2 offset;
+            if (corner.x < 0.5) {
+                offset = join_offset(neighbours.xy, p0, p1, normal, half_width);
+            } else {
+                offset = join_offset(p0, p1, neighbours.zw, normal, half_width);
+            }
+            position = mix(p0, p1, corner.x) + offset * corner.y;
+            local = vec2(0.0);
+        }
+
+        gl_Position = gl_ModelViewProjectionMatrix * vec4(position, 0.0, 1.0);
+    }
+    """
+
+    FRAGMENT_SOURCE = """
+    #version 120
+
+    uniform bool round_joins;
+
+    varying vec4 line_color;
+    varying vec2 local;
+    varying float half_width;
+    varying float segment_length;
+
+    void main() {
+        if (round_joins) {
+            float outside = local.x - clamp(local.x, 0.0, segment_length);
+            if (length(vec2(outside, local.y)) > half_width) {
+                discard;
+            }
+        }
+        gl_FragColor = line_color;
+    }
+    """
+
+    # same vertex order as RenderContext.line() used to emit on the CPU
+    CORNERS = (0.0, 1.0, 0.0, -1.0, 1.0, 1.0, 0.0, -1.0, 1.0, 1.0, 1.0, -1.0)
+
+    INSTANCE_ATTRIBUTES = (
+        ("segment", 4),
+        ("neighbours", 4),
+        ("width", 1),
+        ("color", 4),
+    )
+
+    def __init__(self):
+        self.VERTEX_SOURCE = self.VERTEX_SOURCE.replace(
+            "MITER_LIMIT_COS", repr(1 / DrawLinesTask.MITER_LIMIT)
         )
+        super().__init__()
+        self.round_joins = glGetUniformLocation(self.program, "round_joins")
 
-    def circle(self, color: Color, center: Vector2, radius: float):
-        # Small circles can affort 20 steps, for bigger circles,
-        # add enough steps that the largest line segment is 30 world units
-        steps = min(100, max(20, (radius * 2 * math.pi) / 30))
 
-        vertices = []
-        for angle in range(0, 361, int(360 / steps)):
-            vertices.append(center)
-            vertices.append(center + Vector2(radius, 0).rotate(angle))
+def compile_shader_program(vertex_source: str, fragment_source: str):
+    program = glCreateProgram()
 
-        # break triangle strip (duplicate first and last vertex -> degenerate triangle)
-        vertices.append(vertices[-1])
-        vertices.insert(0, vertices[0])
+    for shader_type, source in (
+        (GL_VERTEX_SHADER, vertex_source),
+        (GL_FRAGMENT_SHADER, fragment_source),
+    ):
+        shader = shaders.compileShader(textwrap.dedent(source).strip(), shader_type)
+        glAttachShader(program, shader)
+        glDeleteShader(shader)
 
-        self._colored_vertices(GL_TRIANGLE_STRIP, color, vertices)
+    glLinkProgram(program)
+    if glGetProgramiv(program, GL_LINK_STATUS) != GL_TRUE:
+        raise RuntimeError(f"Shader link failed: {glGetProgramInfoLog(program)}")
 
-    def donut(
+    return program
+
+
+class DrawInstancedSpriteTask(IDrawTask):
+    """
+    Like DrawSpriteTask, but with one instance record per sprite, expanded to
+    a quad by the SpriteShader. Produces the same output.
+    """
+
+    def __init__(self, texture_sprite: ImageSprite):
+        self.texture_sprite = texture_sprite
+        self.data = array.array("f")
+
+    def append(
         self,
-        color_inner: Color,
-        color_outer: Color,
-        center: Vector2,
-        radius_outer: float,
-        radius_inner: float,
+        sprite: ImageSprite,
+        position: Vector2,
+        scale: Vector2,
+        modelview: AffineMatrix,
     ):
-        # Small circles can affort 20 steps, for bigger circles,
-        # add enough steps that the largest line segment is 30 world units
-        steps = min(100, max(20, (radius_outer * 2 * math.pi) / 30))
+        sx, sy = (1, 1) if scale is None else scale
 
-        vertices = []
-        colors = []
-        for angle in range(0, 361, int(360 / steps)):
-            colors.append(color_inner)
-            vertices.append(center + Vector2(radius_inner, 0).rotate(angle))
-            colors.append(color_outer)
-            vertices.append(center + Vector2(radius_outer, 0).rotate(angle))
+        x, y = position
+        w = sprite.width * sx
+        h = sprite.height * sy
 
-        # Close the triangle strip by connecting to the starting point)
-        colors.append(colors[0])
-        vertices.append(vertices[0])
+        # modelview * translate(x, y) * scale(w, h)
+        a, b, c, d, e, f = modelview.m
+        self.data.extend(
+            (
+                a * w,
+                b * h,
+                a * x + b * y + c,
+                d * w,
+                e * h,
+                d * x + e * y + f,
+            )
+        )
+        self.data.extend(sprite.uv_rect)
 
-        # break triangle strip (duplicate first and last vertex -> degenerate triangle)
-        vertices.append(vertices[-1])
-        vertices.insert(0, vertices[0])
+        return ((x, y), (x + w, y), (x, y + h), (x + w, y + h))
 
-        self._separately_colored_vertices(GL_TRIANGLE_STRIP, colors, vertices)
+    def draw(self, ctx):
+        GL_STATE.bind_texture(self.texture_id())
+        GL_STATE.enable(GL_BLEND)
+        GL_STATE.set_blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        GL_STATE.use_program(ctx.sprite_shader.program)
+
+        ctx.sprite_shader.draw(ctx, self.data)
+
+    def vertex_count(self):
+        # same as DrawSpriteTask: two triangles per sprite
+        return len(self.data) // 10 * 6
+
+
+class DrawLinesTask(IDrawTask):
+    """
+    Batch of thick line segments, stored as one record per segment: end points
+    and their polyline neighbours (in world space), width and color.
+
+    With the LineShader the records are expanded to quads on the GPU,
+    otherwise all segments are expanded at once with NumPy.
+    """
+
+    FLOATS_PER_SEGMENT = 13
+
+    # longer miters are cut short (relative to the half width)
+    MITER_LIMIT = 4
+
+    # number of triangles per round cap in the fixed-function fallback
+    ROUND_CAP_STEPS = 12
+
+    def __init__(self, round_joins: bool):
+        self.round_joins = round_joins
+        self.data = array.array("f")
+
+    def append(self, color: Color, points, width: float, modelview: AffineMatrix):
+        a, b, c, d, e, f = modelview.m
+        points = [(a * x + b * y + c, d * x + e * y + f) for x, y in points]
+        width *= math.sqrt(abs(a * e - b * d))
+        rgba = color.normalize()
+
+        last = len(points) - 1
+        for i in range(last):
+            self.data.extend(points[i])
+            self.data.extend(points[i + 1])
+            self.data.extend(points[max(0, i - 1)])
+            self.data.extend(points[min(last, i + 2)])
+            self.data.append(width)
+            self.data.extend(rgba)
+
+    def append_segments(self, colors, from_points, to_points, widths, matrices):
+        """
+        Append unconnected segments, given as arrays with one row per segment.
+        matrices holds the six values of the modelview matrix of each segment
+        (or a single row for all of them).
+        """
+        a, b, c, d, e, f = np.transpose(matrices)
+        x0, y0 = np.transpose(from_points)
+        x1, y1 = np.transpose(to_points)
+
+        segments = np.empty((len(x0), self.FLOATS_PER_SEGMENT), dtype=np.float32)
+        segments[:, 0] = segments[:, 4] = a * x0 + b * y0 + c
+        segments[:, 1] = segments[:, 5] = d * x0 + e * y0 + f
+        segments[:, 2] = segments[:, 6] = a * x1 + b * y1 + c
+        segments[:, 3] = segments[:, 7] = d * x1 + e * y1 + f
+        segments[:, 8] = widths * np.sqrt(np.abs(a * e - b * d))
+        segments[:, 9:] = colors
+
+        self.data.frombytes(segments.tobytes())
+
+    def draw(self, ctx):
+        if ctx.line_shader is None:
+            self._draw_fixed_function(ctx)
+            return
+
+        GL_STATE.enable(GL_BLEND)
+        GL_STATE.set_blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        GL_STATE.use_program(ctx.line_shader.program)
+
+        glUniform1i(ctx.line_shader.round_joins, self.round_joins)
+        ctx.line_shader.draw(ctx, self.data)
+
+    def vertex_count(self):
+        # two triangles per segment, not counting round caps
+        return len(self.data) // self.FLOATS_PER_SEGMENT * 6
+
+    def _draw_fixed_function(self, ctx):
+        segments = np.frombuffer(self.data, dtype=np.float32).reshape(
+            -1, self.FLOATS_PER_SEGMENT
+        )
+        p0, p1, before, after = (segments[:, i : i + 2] for i in range(0, 8, 2))
+        half_width = segments[:, 8:9] / 2
+        colors = segments[:, 9:]
+
+        direction = p1 - p0
+        length = np.linalg.norm(direction, axis=1, keepdims=True)
+        direction = np.where(length > 0, direction / np.maximum(length, 1e-6), (1, 0))
+        normal = direction[:, ::-1] * (-1, 1)
+
+        if self.round_joins:
+            offset0 = offset1 = normal * half_width
+        else:
+            offset0 = self._join_offsets(before, p0, p1, normal, half_width)
+            offset1 = self._join_offsets(p0, p1, after, normal, half_width)
+
+        # a, b, c, b, c, d with a/b at the start and c/d at the end
+        a = p0 + offset0
+        b = p0 - offset0
+        c = p1 + offset1
+        d = p1 - offset1
+        vertices = np.stack((a, b, c, b, c, d), axis=1).reshape(-1, 2)
+        vertex_colors = np.repeat(colors, 6, axis=0)
+
+        if self.round_joins:
+            # triangle fans around both end points of every segment
+            angles = np.linspace(0, 2 * math.pi, self.ROUND_CAP_STEPS + 1)
+            rim = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+            centers = np.concatenate((p0, p1))
+            radii = np.concatenate((half_width, half_width))[:, :, np.newaxis]
+            rims = centers[:, np.newaxis] + radii * rim
+            caps = np.empty((len(centers), self.ROUND_CAP_STEPS, 3, 2))
+            caps[:, :, 0] = centers[:, np.newaxis]
+            caps[:, :, 1] = rims[:, :-1]
+            caps[:, :, 2] = rims[:, 1:]
+            cap_colors = np.repeat(
+                np.concatenate((colors, colors)), self.ROUND_CAP_STEPS * 3, axis=0
+            )
+            vertices = np.concatenate((vertices, caps.reshape(-1, 2)))
+            vertex_colors = np.concatenate((vertex_colors, cap_colors))
+
+        task = DrawColoredVerticesTask(GL_TRIANGLES)
+        task.append_separate(vertex_colors, vertices, lambda vertices: vertices)
+        task.draw(ctx)
+
+    @classmethod
+    def _join_offsets(cls, before, at, after, normal, half_width):
+        """
+        Offsets at "at" of the +1 side for the joins between before-at-after,
+        butt ends where the neighbour coincides with the end point.
+        """
+        d0 = at - before
+        d1 = after - at
+        l0 = np.linalg.norm(d0, axis=1, keepdims=True)
+        l1 = np.linalg.norm(d1, axis=1, keepdims=True)
+        tangent = d0 / np.maximum(l0, 1e-6) + d1 / np.maximum(l1, 1e-6)
+        lt = np.linalg.norm(tangent, axis=1, keepdims=True)
+        tangent /= np.maximum(lt, 1e-6)
+        miter = tangent[:, ::-1] * (-1, 1)
+        cos = np.sum(miter * normal, axis=1, keepdims=True)
+        cos = np.maximum(cos, 1 / cls.MITER_LIMIT)
+
+        butt = (l0 < 1e-4) | (l1 < 1e-4) | (lt < 1e-4)
+        return np.where(butt, normal * half_width, miter * half_width / cos)
+
+
+class DrawTextTask(IDrawTask):
+    def __init__(self, texture_sprite: ImageSprite):
+        self.texture_sprite = texture_sprite
+        self.data = array.array("f")
+
+    def append(self, vertices, position: Vector2, color: Color, apply_modelview_matrix):
+        """
+        Append glyph quads, vertices is an (N, 4) array of (u, v, x, y).
+        """
+        data = np.empty((len(vertices), 8), dtype=np.float32)
+        data[:, :2] = vertices[:, :2]
+        data[:, 2:4] = apply_modelview_matrix(vertices[:, 2:] + tuple(position))
+        data[:, 4:] = color.normalize()
+
+        self.data.frombytes(data.tobytes())
+
+    def draw(self, ctx):
+        GL_STATE.bind_texture(self.texture_id())
+        GL_STATE.use_program(0)
+        GL_STATE.enable(GL_TEXTURE_2D)
+        GL_STATE.enable(GL_BLEND)
+        GL_STATE.set_blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        offset = ctx.vertex_buffer.upload(self.data.tobytes())
+        stride = 8 * ctypes.sizeof(ctypes.c_float)
+        GL_STATE.use_client_arrays(vertex=True, texcoord=True, color=True)
+
+        glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(offset))
+        glVertexPointer(
+            2,
+            GL_FLOAT,
+            stride,
+            ctypes.c_void_p(offset + 2 * ctypes.sizeof(ctypes.c_float)),
+        )
+        glColorPointer(
+            4,
+            GL_FLOAT,
+            stride,
+            ctypes.c_void_p(offset + 4 * ctypes.sizeof(ctypes.c_float)),
+        )
+
+        glDrawArrays(GL_TRIANGLES, 0, self.vertex_count())
+
+    def vertex_count(self):
+        return len(self.data) // 8
+
+
+class DrawColoredVerticesTask(IDrawTask):
+    def __init__(self, mode):
+        self.data = array.array("f")
+        self.mode = mode
+
+    def append(self, color: Color, vertices, apply_modelview_matrix):
+        vertices = apply_modelview_matrix(vertices)
+
+        data = np.empty((len(vertices), 6), dtype=np.float32)
+        data[:, :2] = vertices
+        data[:, 2:] = color.normalize()
+
+        self.data.frombytes(data.tobytes())
+
+    def append_separate(self, colors, vertices, apply_modelview_matrix):
+        """
+        Like append(), but with an (N, 4) array of normalized colors, one per vertex.
+        """
+        vertices = apply_modelview_matrix(vertices)
+
+        data = np.empty((len(vertices), 6), dtype=np.float32)
+        data[:, :2] = vertices
+        data[:, 2:] = colors
+
+        self.data.frombytes(data.tobytes())
+
+    def draw(self, ctx):
+        GL_STATE.use_program(0)
+        GL_STATE.enable(GL_TEXTURE_2D, False)
+        GL_STATE.enable(GL_BLEND)
+        GL_STATE.set_blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        offset = ctx.vertex_buffer.upload(self.data.tobytes())
+        GL_STATE.use_client_arrays(vertex=True, color=True)
+
+        glVertexPointer(
+            2, GL_FLOAT, 6 * ctypes.sizeof(ctypes.c_float), ctypes.c_void_p(offset)
+        )
+        glColorPointer(
+            4,
+            GL_FLOAT,
+            6 * ctypes.sizeof(ctypes.c_float),
+            ctypes.c_void_p(offset + 2 * ctypes.sizeof(ctypes.c_float)),
+        )
+
+        glDrawArrays(self.mode, 0, self.vertex_count())
+
+    def vertex_count(self):
+        return len(self.data) // 6
+
+
+class DrawStaticMeshTask(IDrawTask):
+    def __init__(self, mesh: StaticMesh, matrix: AffineMatrix, texture_sprite):
+        # texture_sprite is an ImageSprite, a RenderTarget or None
+        self.mesh = mesh
+        self.matrix = matrix
+        self.texture_sprite = texture_sprite
+
+    def draw(self, ctx):
+        # everything else is transformed on the CPU, with identity modelview
+        glLoadMatrixf(self.matrix.gl_matrix())
+
+        GL_STATE.use_program(0)
+        if self.texture_sprite is not None:
+            GL_STATE.bind_texture(self.texture_id())
+        GL_STATE.enable(GL_TEXTURE_2D, self.texture_sprite is not None)
+        GL_STATE.enable(GL_BLEND)
+        GL_STATE.set_blend_func(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+        self.mesh.draw()
+
+        glLoadIdentity()
+
+    def vertex_count(self):
+        return self.mesh.count
+
+
+class MatrixStack:
+    def __init__(self):
+        # levels are allocated once and reused, push() copies into the next one
+        self.levels = [AffineMatrix()]
+        self.depth = 0
+        self.top = self.levels[0]
+
+        # bumped on every change to the top matrix, used for caching
+        self.generation = 0
+
+    def push(self):
+        self.depth += 1
+        if self.depth == len(self.levels):
+            self.levels.append(AffineMatrix())
+
+        self.levels[self.depth].set(self.top)
+        self.top = self.levels[self.depth]
+
+    def pop(self):
+        self.depth -= 1
+        self.top = self.levels[self.depth]
+        self.generation += 1
+
+    def identity(self):
+        self.top.identity()
+        self.generation += 1
+
+    def translate(self, x: float, y: float):
+        self.top.translate(x, y)
+        self.generation += 1
+
+    def rotate(self, angle_radians: float):
+        self.top.rotate(angle_radians)
+        self.generation += 1
+
+    def rotate_sin_cos(self, s: float, c: float):
+        self.top.rotate_sin_cos(s, c)
+        self.generation += 1
+
+    def scale(self, x: float, y: float):
+        self.top.scale(x, y)
+        self.generation += 1
+
+    def ortho(self, left: float, right: float, bottom: float, top: float):
+        self.top.ortho(left, right, bottom, top)
+        self.generation += 1
+
+    def apply(self, v: Vector2):
+        return Vector2(self.top.apply(v))
+
+    def apply_many(self, points):
+        return self.top.apply_many(points)
+
+
+class GlyphAtlas:
+    """
+    Rasterizes each glyph of a font once (in white) into a shared texture.
+    Text is drawn as textured quads, the color comes from a vertex attribute.
+    """
+
+    PAGE_SIZE = 512
+    PADDING = 2
+    PRELOAD = "".join(chr(c) for c in range(32, 127))
+    MAX_LAYOUTS = 512
+
+    def __init__(self, font):
+        self.font = font
+        self.height = font.get_height()
+        self.page = ImageSprite(
+            pygame.Surface((self.PAGE_SIZE, self.PAGE_SIZE), SRCALPHA).convert_alpha(),
+            want_mipmap=False,
+        )
+        self.page.img.fill((0, 0, 0, 0))
+
+        # char -> (quad of (u, v, x, y) vertices, advance)
+        self.glyphs = {}
+        self.layouts = {}
+
+        # area of the page with glyphs added after the texture was uploaded
+        self.dirty_rect = None
+
+        self.next_position = Vector2(0, 0)
+        for char in self.PRELOAD:
+            self.glyph(char)
+
+    def glyph(self, char: str):
+        if char not in self.glyphs:
+            self.glyphs[char] = self._rasterize(char)
+
+        return self.glyphs[char]
+
+    def _rasterize(self, char: str):
+        img = self.font.render(char, True, Color(255, 255, 255))
+        width, height = img.get_size()
+
+        metrics = self.font.metrics(char)[0]
+        advance = metrics[4] if metrics is not None else width
+
+        if self.next_position.x + width + self.PADDING > self.PAGE_SIZE:
+            self.next_position.x = 0
+            self.next_position.y += self.height + self.PADDING
+
+        if self.next_position.y + height > self.PAGE_SIZE:
+            logging.warning(f"Glyph atlas is full, cannot add {char!r}")
+            return np.empty((0, 4), dtype=np.float32), advance
+
+        x, y = self.next_position
+        self.page.img.blit(img, (x, y), special_flags=BLEND_RGBA_ADD)
+        self.next_position.x += width + self.PADDING
+
+        if self.page._texture is not None:
+            # a new glyph after the first upload, see flush()
+            rect = Rect(x, y, width, height)
+            if self.dirty_rect is not None:
+                rect = rect.union(self.dirty_rect)
+            self.dirty_rect = rect
+
+        u0, v0 = x / self.PAGE_SIZE, y / self.PAGE_SIZE
+        u1, v1 = (x + width) / self.PAGE_SIZE, (y + height) / self.PAGE_SIZE
+        quad = np.array(
+            (
+                (u0, v0, 0, 0),
+                (u1, v0, width, 0),
+                (u1, v1, width, height),
+                (u0, v0, 0, 0),
+                (u1, v1, width, height),
+                (u0, v1, 0, height),
+            ),
+            dtype=np.float32,
+        )
+
+        return quad, advance
+
+    def flush(self):
+        """
+        Upload the glyphs added since the texture was uploaded, once per frame.
+        """
+        if self.dirty_rect is not None:
+            self.page._texture.update_rect(self.page, self.dirty_rect)
+            self.dirty_rect = None
+
+    def layout(self, text: str):
+        """
+        Returns (vertices, size) of the text with its top left corner at (0, 0),
+        vertices is an (N, 4) array of (u, v, x, y).
+        """
+        if text not in self.layouts:
+            if len(self.layouts) > self.MAX_LAYOUTS:
+                self.layouts = {}
+
+            quads = []
+            pen = 0
+            for char in text:
+                quad, advance = self.glyph(char)
+                quads.append(quad + (0, 0, pen, 0))
+                pen += advance
+
+            vertices = (
+                np.concatenate(quads) if quads else np.empty((0, 4), dtype=np.float32)
+            )
+            self.layouts[text] = (vertices, Vector2(pen, self.height))
+
+        return self.layouts[text]
+
+    def size(self, text: str):
+        return Vector2(self.layout(text)[1])
+
+
+class RenderPass:
+    """
+    Draw tasks recorded between two RenderContext.flush() calls, in one bucket
+    per layer (a dict of tasks by key), and the GL state they are drawn with.
+    Passes are reused from frame to frame, including their buckets.
+    """
+
+    def __init__(self, layer_count: int):
+        self.buckets = [{} for _ in range(layer_count)]
+        self.state = None
+        self.clear_color = None
+
+    def reset(self, state, clear_color):
+        self.state = state
+        self.clear_color = clear_color
+        for bucket in self.buckets:
+            if bucket:
+                bucket.clear()
+
+    def layer_range(self):
+        """
+        Indices of the first and last non-empty bucket, None if empty.
+        """
+        used = [i for i, bucket in enumerate(self.buckets) if bucket]
+        return (used[0], used[-1]) if used else None
+
+    def can_merge(self, other):
+        """
+        True if other can be drawn as part of this pass without changing the
+        result, i.e. it does not clear, uses the same state and has no tasks
+        below the top layer of this pass.
+        """
+        if other.clear_color is not None or other.state != self.state:
+            return False
+
+        own_range = self.layer_range()
+        other_range = other.layer_range()
+
+        return (
+            own_range is None or other_range is None or other_range[0] >= own_range[1]
+        )
+
+    def merge(self, other):
+        for bucket, other_bucket in zip(self.buckets, other.buckets):
+            for key, task in other_bucket.items():
+                if bucket and next(reversed(bucket)) == key and bucket[key].merge(task):
+                    continue
+
+                # same key earlier in the bucket, keep both in their order
+                bucket[key if key not in bucket else (key, object())] = task
+
+            other_bucket.clear()
+
+    def tasks(self, ctx, texture_key=IDrawTask.texture_id):
+        """
+        Yields (layer, task) in drawing order, tasks in layers that allow it
+        are sorted by texture_key(task).
+        """
+        for layer, bucket in zip(ctx.layers, self.buckets):
+            tasks = bucket.values()
+            if len(bucket) > 1 and layer in ctx.TEXTURE_SORTED_LAYERS:
+                tasks = sorted(tasks, key=texture_key)
+
+            for task in tasks:
+                yield layer, task
+
+    def draw(self, ctx):
+        if self.clear_color is not None:
+            glClearColor(*self.clear_color.normalize())
+            glClear(GL_COLOR_BUFFER_BIT)
+
+        draw_calls = 0
+        for _, task in self.tasks(ctx):
+            task.draw(ctx)
+            draw_calls += 1
+
+        return draw_calls
+
+
+class IRenderBackend:
+    """
+    Executes the render passes that RenderContext records each frame.
+    Draw tasks use vertex_buffer and the shaders of the backend (via the
+    RenderContext), backends that never draw leave them as None.
+    """
+
+    vertex_buffer = None
+    sprite_shader = None
+    line_shader = None
+
+    def create_render_target(self, width: int, height: int, samples: int = 0):
+        raise NotImplementedError("Render targets are not supported")
+
+    def draw_passes(self, ctx: RenderContext, passes):
+        """
+        Draw the (merged) passes, returns the number of draw calls.
+        """
+        raise NotImplementedError("Do not know how to draw render passes")
+
+    def present(self):
+        ...
+
+    def next_frame(self):
+        ...
+
+
+class GLRenderBackend(IRenderBackend):
+    def __init__(self):
+        self.vertex_buffer = StreamingVertexBuffer()
+
+        if CLIARGS.shaders:
+            try:
+                self.sprite_shader = SpriteShader()
+                self.line_shader = LineShader()
+            except Exception as e:
+                self.sprite_shader = self.line_shader = None
+                logging.warning(f"Using fixed-function drawing, no shaders: {e}")
+
+    def create_render_target(self, width: int, height: int, samples: int = 0):
+        return RenderTarget(width, height, samples)
+
+    def draw_passes(self, ctx, passes):
+        state = None
+        draw_calls = 0
+        for render_pass in passes:
+            if render_pass.state != state:
+                self._apply_pass_state(render_pass.state, state)
+                state = render_pass.state
+
+            draw_calls += render_pass.draw(ctx)
+
+        if state is not None:
+            self._apply_pass_state(ctx.pass_state, state)
+
+        return draw_calls
+
+    def _apply_pass_state(self, state, previous_state):
+        target, viewport, scissor, projection_gl_matrix = state
+
+        if previous_state is not None:
+            previous_target = previous_state[0]
+            if previous_target is not None and previous_target is not target:
+                previous_target.resolve()
+
+        glBindFramebuffer(GL_FRAMEBUFFER, target.framebuffer if target else 0)
+
+        glViewport(*viewport)
+        if scissor:
+            glScissor(*viewport)
+        GL_STATE.enable(GL_SCISSOR_TEST, scissor)
+
+        glMatrixMode(GL_PROJECTION)
+        glLoadMatrixf(projection_gl_matrix)
+        glMatrixMode(GL_MODELVIEW)
+        glLoadIdentity()
+
+    def present(self):
+        pygame.display.flip()
+
+    def next_frame(self):
+        self.vertex_buffer.next_frame()
+        GL_STATE.next_frame()
+
+
+class NullRenderTarget:
+    """
+    Stand-in for a RenderTarget in backends that do not draw.
+    """
+
+    id = 0
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+
+    def _get_texture(self):
+        return self
+
+    def resolve(self):
+        ...
+
+
+class NullRenderBackend(IRenderBackend):
+    """
+    Discards all geometry, for measuring the CPU cost of recording a frame.
+    """
+
+    def create_render_target(self, width: int, height: int, samples: int = 0):
+        return NullRenderTarget(width, height)
+
+    def draw_passes(self, ctx, passes):
+        return sum(
+            len(bucket) for render_pass in passes for bucket in render_pass.buckets
+        )
+
+
+class RecordingRenderBackend(NullRenderBackend):
+    """
+    Captures the command stream instead of drawing it: per frame a list of
+    commands (one per clear and per draw task, in drawing order), kept for
+    the last MAX_FRAMES frames or written to a file as one JSON line per frame.
+
+    Textures are numbered in order of first appearance, so that recordings
+    from different runs can be compared.
+    """
+
+    MAX_FRAMES = 600
+
+    def __init__(self, filename: str = None):
+        self.frames = collections.deque(maxlen=self.MAX_FRAMES)
+        self.frame_count = 0
+        self.commands = []
+        self.textures = {}
+        self.file = open(filename, "w") if filename else None
+
+    def texture_index(self, task: IDrawTask):
+        texture_sprite = getattr(task, "texture_sprite", None)
+        if texture_sprite is None:
+            return None
+
+        # atlas sprites share the texture of their page
+        texture_sprite = getattr(texture_sprite, "texture_sprite", texture_sprite)
+        return self.textures.setdefault(texture_sprite, len(self.textures))
+
+    def draw_passes(self, ctx, passes):
+        def texture_key(task):
+            index = self.texture_index(task)
+            return -1 if index is None else index
+
+        for index, render_pass in enumerate(passes):
+            if render_pass.clear_color is not None:
+                self.commands.append(
+                    {"pass": index, "clear": list(render_pass.clear_color)}
+                )
+
+            for layer, task in render_pass.tasks(ctx, texture_key):
+                self.commands.append(
+                    {
+                        "pass": index,
+                        "layer": layer,
+                        "task": type(task).__name__,
+                        "vertices": task.vertex_count(),
+                        "texture": self.texture_index(task),
+                    }
+                )
+
+        return super().draw_passes(ctx, passes)
+
+    def next_frame(self):
+        frame = {"frame": self.frame_count, "commands": self.commands}
+        if self.file is not None:
+            self.file.write(json.dumps(frame) + "\n")
+        else:
+            self.frames.append(frame)
+
+        self.frame_count += 1
+        self.commands = []
+
+    def __del__(self):
+        if self.file is not None:
+            self.file.close()
+
+
+def get_render_backend_name():
+    # nothing is drawn in headless mode
+    return "null" if CLIARGS.headless is not None else CLIARGS.render_backend
+
+
+def create_render_backend(name: str) -> IRenderBackend:
+    if name == "null":
+        return NullRenderBackend()
+    elif name == "record":
+        return RecordingRenderBackend(CLIARGS.record_file)
+
+    return GLRenderBackend()
+
+
+class FrameProfiler:
+    """
+    Time spent per phase of the last HISTORY frames, shown in the performance
+    HUD. Phases can nest, the time of a nested phase is not counted in the
+    outer one. Measures nothing while disabled.
+    """
+
+    HISTORY = 120
+
+    # phase name -> color in the graph
+    PHASE_COLORS = {
+        "events": (120, 120, 255),
+        "update": (80, 220, 80),
+        "scene": (255, 180, 60),
+        "minimap": (255, 240, 120),
+        "draw": (255, 90, 90),
+        "present": (200, 120, 255),
+    }
+    PHASES = tuple(PHASE_COLORS)
+
+    def __init__(self):
+        self.enabled = False
+        self.frame_times = collections.deque(maxlen=self.HISTORY)
+        self.phase_times = {
+            name: collections.deque(maxlen=self.HISTORY) for name in self.PHASES
+        }
+
+        # seconds per phase in the current frame
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        # [name, time the phase was entered or resumed] of the running phases
+        self.running = []
+        self.frame_started = None
+
+        self.null_context = contextlib.nullcontext()
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.frame_times.clear()
+        for times in self.phase_times.values():
+            times.clear()
+        self.current = dict.fromkeys(self.PHASES, 0.0)
+        self.running = []
+        self.frame_started = None
+
+    def phase(self, name: str):
+        """
+        Context manager that adds the time spent in the with block to name.
+        """
+        if not self.enabled:
+            return self.null_context
+
+        return self._measure(name)
+
+    @contextlib.contextmanager
+    def _measure(self, name: str):
+        now = time.perf_counter()
+        if self.running:
+            outer = self.running[-1]
+            self.current[outer[0]] += now - outer[1]
+        self.running.append([name, now])
+
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, resumed = self.running.pop()
+            self.current[name] += now - resumed
+            if self.running:
+                self.running[-1][1] = now
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+
+        now = time.perf_counter()
+        if self.frame_started is not None:
+            self.frame_times.append(now - self.frame_started)
+            for name, seconds in self.current.items():
+                self.phase_times[name].append(seconds)
+        self.frame_started = now
+
+        for name in self.current:
+            self.current[name] = 0.0
+
+
+class RenderContext:
+    LAYER_PLANET = -10
+
+    LAYER_BRANCHES = 60
+    LAYER_LEAVES = 70
+    LAYER_FRUIT = 80
+    LAYER_FLIES = 90
+
+    LAYER_BTN_BG = 100
+    LAYER_BTN_TEXT = 110
+
+    LAYER_HUD = 120
+
+    # layers whose tasks can be reordered by texture (to save binds), because
+    # overlapping between their tasks' sprites does not matter
+    TEXTURE_SORTED_LAYERS = {LAYER_LEAVES, LAYER_FRUIT, LAYER_FLIES}
+
+    def __init__(
+        self, width, height, resources: ResourceManager, backend: IRenderBackend
+    ):
+        self.width = width
+        self.height = height
+        self.glyph_atlas = GlyphAtlas(resources.font("RobotoMono-SemiBold.ttf", 16))
+        self.glyph_atlas_big = GlyphAtlas(
+            resources.font("RobotoMono-SemiBold.ttf", 24)
+        )
+        self.started = time.time()
+        self.paused_started = None
+        self.now = 0
+        self.clock = pygame.time.Clock()
+        self.fps = 0
+        self.projection_matrix_stack = MatrixStack()
+        self.modelview_matrix_stack = MatrixStack()
+
+        # maps normalized device coordinates to pixels (origin = top left)
+        w, h = width, height
+        self.viewport_matrix = AffineMatrix()
+        self.viewport_matrix.m[:] = (w / 2, 0, w / 2, 0, -h / 2, h / 2)
+        self.screenspace_matrix = None
+        self.screenspace_matrix_generations = None
+
+        self.backend = backend
+        self.vertex_buffer = backend.vertex_buffer
+        self.sprite_shader = backend.sprite_shader
+        self.line_shader = backend.line_shader
+
+        # static meshes by everything their geometry depends on (see cached_mesh())
+        self.meshes = {}
+
+        # sorted z layers and their bucket index in every RenderPass
+        self.layers = sorted(
+            {0}
+            | {
+                value
+                for name, value in vars(RenderContext).items()
+                if name.startswith("LAYER_")
+            }
+        )
+        self.layer_slots = {layer: i for i, layer in enumerate(self.layers)}
+
+        # passes recorded this frame, drawn in __exit__
+        self.passes = []
+        self.pass_count = 0
+        self.current_pass = None
+
+        # state that recorded draw tasks depend on, see _update_pass_state()
+        self.target = None
+        self.clip_rect = None
+        self.projection_gl_matrix = None
+        self.pass_state = None
+
+        self.passes_last_frame = 0
+        self.merged_passes_last_frame = 0
+        self.draw_calls_last_frame = 0
+
+        # {z layer: [draw calls, vertices]}, only collected while profiling
+        self.layer_stats_last_frame = {}
+        self.profiler = FrameProfiler()
+
+    def __enter__(self):
+        self.now = time.time() - self.started
+        if self.paused_started:
+            self.now -= time.time() - self.paused_started
+        self.camera_mode_overlay()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self.profiler.phase("draw"):
+            self._draw_passes()
+        with self.profiler.phase("present"):
+            self.backend.present()
+        self.clock.tick(CLIARGS.max_fps)
+        self.fps = self.clock.get_fps()
+        self.backend.next_frame()
+        self.profiler.end_frame()
+        return False
+
+    def get_screenspace_matrix(self):
+        """
+        Composed viewport * projection * modelview matrix, cached until
+        one of the matrix stacks changes.
+        """
+        generations = (
+            self.modelview_matrix_stack.generation,
+            self.projection_matrix_stack.generation,
+        )
+
+        if generations != self.screenspace_matrix_generations:
+            self.screenspace_matrix = self.viewport_matrix.multiplied(
+                self.projection_matrix_stack.top
+            )
+            self.screenspace_matrix.multiply(*self.modelview_matrix_stack.top.m)
+            self.screenspace_matrix_generations = generations
+
+        return self.screenspace_matrix
+
+    def transform_to_screenspace(self, p):
+        return Vector2(self.get_screenspace_matrix().apply(p))
+
+    def transform_many_to_screenspace(self, points):
+        return self.get_screenspace_matrix().apply_many(points)
+
+    def setup_matrices(self, left, right, bottom, top):
+        self.projection_matrix_stack.identity()
+        self.projection_matrix_stack.ortho(left, right, bottom, top)
+        self.projection_gl_matrix = self.projection_matrix_stack.top.gl_matrix()
+        self._update_pass_state()
+
+        self.modelview_matrix_stack.identity()
+
+    def camera_mode_overlay(self):
+        self.setup_matrices(0, self.width, self.height, 0)
+
+    def get_pixels_per_unit(self):
+        """
+        Size in actual pixels of one unit of the current modelview space, also
+        when drawing into a smaller render target or clip rect.
+        """
+        a, b, _, d, e, _ = self.get_screenspace_matrix().m
+        if self.clip_rect is not None:
+            viewport_width = self.clip_rect[2]
+        elif self.target is not None:
+            viewport_width = self.target.width
+        else:
+            viewport_width = self.width
+
+        return math.sqrt(abs(a * e - b * d)) * viewport_width / self.width
+
+    def camera_mode_world(self, planet, zoom, rotate):
+        left = -self.width / 2
+        right = self.width / 2
+        bottom = self.height / 2
+        top = -self.height / 2
+
+        self.setup_matrices(left, right, bottom, top)
+
+        # Adjust minimum zoom factor (used for the minimap display, i.e. fully zoomed out)
+        min_zoom = min(self.width, self.height) / (
+            (planet.radius + planet.atmosphere_height) * 2.5
+        )
+
+        factor = min_zoom + (1.0 - min_zoom) * (1 - (1 - zoom))
+
+        self.modelview_matrix_stack.translate(-planet.position.x, -planet.position.y)
+        self.modelview_matrix_stack.translate(
+            0, (zoom**0.8) * (planet.radius + self.height / 8)
+        )
+        self.modelview_matrix_stack.scale(factor, factor)
+        self.modelview_matrix_stack.rotate(rotate * 2 * math.pi)
+
+    def clear(self, color: Color):
+        self._begin_pass(clear_color=Color(color))
+
+    def sprite(
+        self,
+        sprite: ImageSprite,
+        position: Vector2,
+        scale: Vector2 = None,
+        z_layer: int = 0,
+    ):
+        bucket = self._bucket(z_layer)
+        task = bucket.get(sprite.texture_sprite)
+        if task is None:
+            if self.sprite_shader is not None:
+                task = DrawInstancedSpriteTask(sprite.texture_sprite)
+            else:
+                task = DrawSpriteTask(sprite.texture_sprite)
+            bucket[sprite.texture_sprite] = task
+
+        return task.append(sprite, position, scale, self.modelview_matrix_stack.top)
+
+    def text(
+        self,
+        text: str,
+        color: Color,
+        position: Vector2,
+        big=False,
+        *,
+        z_layer: int = 0,
+    ):
+        if text:
+            glyph_atlas = self.glyph_atlas_big if big else self.glyph_atlas
+            vertices, _ = glyph_atlas.layout(text)
+
+            bucket = self._bucket(z_layer)
+            key = (DrawTextTask, glyph_atlas.page)
+            task = bucket.get(key)
+            if task is None:
+                task = bucket[key] = DrawTextTask(glyph_atlas.page)
+
+            task.append(
+                vertices, position, color, self.modelview_matrix_stack.apply_many
+            )
+
+    def text_size(self, text: str, big=False):
+        return (self.glyph_atlas_big if big else self.glyph_atlas).size(text)
+
+    def text_centered(self, text: str, color: Color):
+        if text:
+            self.text(
+                text,
+                color,
+                (Vector2(self.width, self.height) - self.text_size(text)) / 2,
+            )
+
+    def text_centered_rect(self, text: str, color: Color, rect: Rect, *, z_layer: int = 0):
+        if text:
+            size = self.text_size(text, big=True)
+            self.text(
+                text, color, rect.topleft + (rect.size - size) / 2, big=True, z_layer=z_layer
+            )
+
+    def rect(self, color: Color, rectangle: Rect, *, z_layer: int = 0):
+        self._colored_vertices(
+            GL_TRIANGLES,
+            color,
+            [
+                rectangle.topleft,
+                rectangle.topright,
+                rectangle.bottomright,
+                rectangle.topleft,
+                rectangle.bottomright,
+                rectangle.bottomleft,
+            ],
+            z_layer=z_layer,
+        )
+
+    def aabb(self, color: Color, rectangle: Rect):
+        self._colored_vertices(
+            GL_LINES,
+            color,
+            [
+                rectangle.topleft,
+                rectangle.topright,
+                rectangle.topright,
+                rectangle.bottomright,
+                rectangle.bottomright,
+                rectangle.bottomleft,
+                rectangle.bottomleft,
+                rectangle.topleft,
+            ],
+        )
+
+    def circle(self, color: Color, center: Vector2, radius: float):
+        def build():
+            rim = radius * unit_circle(radius)
+
+            # triangle fan around the center
+            vertices = np.vstack(((0, 0), rim))
+
+            return StaticMesh(GL_TRIANGLE_FAN, vertices, color.normalize())
+
+        self.mesh(
+            self.cached_mesh(("circle", radius, tuple(color)), build), center
+        )
+
+    def donut(
+        self,
+        color_inner: Color,
+        color_outer: Color,
+        center: Vector2,
+        radius_outer: float,
+        radius_inner: float,
+    ):
+        def build():
+            directions = unit_circle(radius_outer)
+
+            # triangle strip alternating between inner and outer ring,
+            # closed by connecting to the starting point
+            vertices = np.empty((len(directions) * 2 + 1, 2))
+            vertices[0:-1:2] = radius_inner * directions
+            vertices[1:-1:2] = radius_outer * directions
+            vertices[-1] = vertices[0]
+
+            colors = np.empty((len(vertices), 4))
+            colors[0:-1:2] = color_inner.normalize()
+            colors[1:-1:2] = color_outer.normalize()
+            colors[-1] = colors[0]
+
+            return StaticMesh(GL_TRIANGLE_STRIP, vertices, colors)
+
+        key = (
+            "donut",
+            radius_outer,
+            radius_inner,
+            tuple(color_inner),
+            tuple(color_outer),
+        )
+        self.mesh(self.cached_mesh(key, build), center)
 
     def textured_circle(self, sprite: ImageSprite, center: Vector2, radius: float):
-        texture = sprite._get_texture()
+        def build():
+            u0, v0, u1, v1 = sprite.uv_rect
+            directions = np.vstack(((0, 0), unit_circle(radius)))
+
+            # triangle fan around the center
+            vertices = radius * directions
+            texcoords = (0.5 + 0.5 * directions) * (u1 - u0, v1 - v0) + (u0, v0)
+
+            return StaticMesh(GL_TRIANGLE_FAN, vertices, (1, 1, 1, 1), texcoords)
+
+        key = ("textured_circle", radius, sprite.uv_rect)
+        self.mesh(
+            self.cached_mesh(key, build),
+            center,
+            texture_sprite=sprite,
+            z_layer=self.LAYER_PLANET,
+        )
+
+    def cached_mesh(self, key, build):
+        """
+        Static mesh for key, built by calling build() on first use. The key must
+        contain everything the geometry depends on (radius, colors, ...), so that
+        a change builds a new mesh instead of reusing a stale one.
+        """
+        mesh = self.meshes.get(key)
+        if mesh is None:
+            if len(self.meshes) >= 64:
+                self.meshes.clear()
+            mesh = self.meshes[key] = build()
+        return mesh
+
+    def mesh(
+        self,
+        mesh: StaticMesh,
+        position: Vector2 = None,
+        *,
+        texture_sprite=None,
+        z_layer: int = 0,
+    ):
+        matrix = AffineMatrix(self.modelview_matrix_stack.top)
+        if position is not None:
+            matrix.translate(*position)
+
+        task = DrawStaticMeshTask(mesh, matrix, texture_sprite)
+        self._bucket(z_layer)[task] = task
+
+    def render_target(self, target: RenderTarget, rectangle: Rect, *, z_layer: int = 0):
+        """
+        Draw the contents of target stretched over rectangle.
+        """
+
+        def build():
+            # render target rows are stored bottom-up
+            return StaticMesh(
+                GL_TRIANGLE_STRIP,
+                ((0, 0), (1, 0), (0, 1), (1, 1)),
+                (1, 1, 1, 1),
+                ((0, 1), (1, 1), (0, 0), (1, 0)),
+            )
+
+        self.modelview_matrix_stack.push()
+        self.modelview_matrix_stack.translate(*rectangle.topleft)
+        self.modelview_matrix_stack.scale(*rectangle.size)
+        self.mesh(
+            self.cached_mesh("render_target", build),
+            texture_sprite=target,
+            z_layer=z_layer,
+        )
+        self.modelview_matrix_stack.pop()
+
+    @contextlib.contextmanager
+    def rendering_to(self, target: RenderTarget):
+        """
+        Redirect drawing into target until the end of the with block.
+        """
+        previous_target = self.target
+        self.target = target
+        self._update_pass_state()
+        try:
+            yield
+        finally:
+            self.target = previous_target
+            self._update_pass_state()
+
+    @contextlib.contextmanager
+    def clipped_to(self, gl_rect):
+        """
+        Map the camera to gl_rect (x, y, w, h with the origin at the bottom
+        left) and clip drawing to it until the end of the with block.
+        """
+        previous_clip_rect = self.clip_rect
+        self.clip_rect = tuple(gl_rect)
+        self._update_pass_state()
+        try:
+            yield
+        finally:
+            self.clip_rect = previous_clip_rect
+            self._update_pass_state()
+
+    def line(
+        self,
+        color: Color,
+        from_point: Vector2,
+        to_point: Vector2,
+        width: float,
+        *,
+        z_layer: int = 0,
+    ):
+        self.polyline(color, (from_point, to_point), width, z_layer=z_layer)
+
+    def lines(
+        self,
+        colors,
+        from_points,
+        to_points,
+        widths,
+        *,
+        matrices=None,
+        z_layer: int = 0,
+    ):
+        """
+        Like line(), for arrays of normalized RGBA colors, end points and widths.
+        Each line can have its own modelview matrix, given as (N, 6) array.
+        """
+        if matrices is None:
+            matrices = np.array(self.modelview_matrix_stack.top.m)[np.newaxis]
+
+        bucket = self._bucket(z_layer)
+        key = (DrawLinesTask, False)
+        task = bucket.get(key)
+        if task is None:
+            task = bucket[key] = DrawLinesTask(False)
+
+        task.append_segments(
+            colors, from_points, to_points, np.maximum(1, widths), matrices
+        )
+
+    def polyline(
+        self,
+        color: Color,
+        points,
+        width: float,
+        *,
+        round_joins: bool = False,
+        z_layer: int = 0,
+    ):
+        """
+        Thick line through points, with miter joins (open ends cut off square)
+        or round joins and caps.
+        """
+        bucket = self._bucket(z_layer)
+        key = (DrawLinesTask, round_joins)
+        task = bucket.get(key)
+        if task is None:
+            task = bucket[key] = DrawLinesTask(round_joins)
+
+        task.append(color, points, max(1, width), self.modelview_matrix_stack.top)
+
+    def _colored_vertices(self, mode: int, color: Color, vertices, *, z_layer: int = 0):
+        task = self._colored_vertices_task(mode, z_layer)
+        task.append(color, vertices, self.modelview_matrix_stack.apply_many)
+
+    def _colored_vertices_task(self, mode: int, z_layer: int):
+        bucket = self._bucket(z_layer)
+        key = (DrawColoredVerticesTask, mode)
+        task = bucket.get(key)
+        if task is None:
+            task = bucket[key] = DrawColoredVerticesTask(mode)
+
+        return task
+
+    def flush(self):
+        """
+        End the current render pass: everything drawn afterwards goes on top.
+        Passes are drawn at the end of the frame.
+        """
+        self.current_pass = None
+
+    def _update_pass_state(self):
+        if self.target is not None:
+            viewport = (0, 0, self.target.width, self.target.height)
+        else:
+            viewport = (0, 0, self.width, self.height)
+
+        self.pass_state = (
+            self.target,
+            self.clip_rect or viewport,
+            self.clip_rect is not None,
+            self.projection_gl_matrix,
+        )
+
+    def _begin_pass(self, clear_color: Color = None):
+        if self.pass_count == len(self.passes):
+            self.passes.append(RenderPass(len(self.layers)))
+
+        render_pass = self.passes[self.pass_count]
+        render_pass.reset(self.pass_state, clear_color)
+        self.pass_count += 1
+
+        self.current_pass = render_pass
+        return render_pass
+
+    def _bucket(self, z_layer: int):
+        """
+        Tasks by key for z_layer in the current pass, a new pass is started if
+        the state changed since the last draw call.
+        """
+        render_pass = self.current_pass
+        if render_pass is None or render_pass.state is not self.pass_state:
+            render_pass = self._begin_pass()
+
+        slot = self.layer_slots.get(z_layer)
+        if slot is None:
+            bisect.insort(self.layers, z_layer)
+            self.layer_slots = {layer: i for i, layer in enumerate(self.layers)}
+            slot = self.layer_slots[z_layer]
+            for other_pass in self.passes:
+                other_pass.buckets.insert(slot, {})
+
+        return render_pass.buckets[slot]
+
+    def _draw_passes(self):
+        """
+        Merge adjacent compatible passes and let the backend draw them.
+        """
+        passes = self.passes[: self.pass_count]
+
+        merged = []
+        for render_pass in passes:
+            if merged and merged[-1].can_merge(render_pass):
+                merged[-1].merge(render_pass)
+            else:
+                merged.append(render_pass)
+
+        if self.profiler.enabled:
+            self.layer_stats_last_frame = self._layer_stats(merged)
+
+        self.glyph_atlas.flush()
+        self.glyph_atlas_big.flush()
+        draw_calls = self.backend.draw_passes(self, merged)
+
+        for render_pass in passes:
+            render_pass.reset(None, None)
+
+        self.passes_last_frame = len(passes)
+        self.merged_passes_last_frame = len(merged)
+        self.draw_calls_last_frame = draw_calls
+
+        self.pass_count = 0
+        self.current_pass = None
+
+    def _layer_stats(self, passes):
+        stats = {}
+        for render_pass in passes:
+            for layer, bucket in zip(self.layers, render_pass.buckets):
+                if bucket:
+                    layer_stats = stats.setdefault(layer, [0, 0])
+                    layer_stats[0] += len(bucket)
+                    layer_stats[1] += sum(
+                        task.vertex_count() for task in bucket.values()
+                    )
+
+        return stats
+
+    def perf_hud(self, lines):
+        """
+        Draw the profiler's frame times and the stats of the last frame, with
+        some more lines of text below, in the top left corner.
+        """
+        profiler = self.profiler
+        z_layer = self.LAYER_HUD
+
+        # pixels per millisecond and per frame in the graph
+        ms_height = 3
+        frame_width = 2
+
+        graph_height = 100
+        line_height = self.glyph_atlas.height
+
+        frame_times = [1000 * seconds for seconds in profiler.frame_times]
+        phase_averages = {
+            name: 1000 * sum(times) / max(1, len(times))
+            for name, times in profiler.phase_times.items()
+        }
+
+        text = [
+            f"frame {sum(frame_times) / max(1, len(frame_times)):.1f} ms avg, "
+            f"{max(frame_times, default=0):.1f} ms max, {self.fps:.0f} FPS",
+        ]
+        text.extend(f"{name:>8} {ms:5.2f} ms" for name, ms in phase_averages.items())
+        text.extend(
+            f"layer {layer:4} {draw_calls:3} draws {vertices:6} vertices"
+            for layer, (draw_calls, vertices) in sorted(
+                self.layer_stats_last_frame.items()
+            )
+        )
+        text.append(
+            f"glyph cache: {len(self.glyph_atlas.glyphs)}+"
+            f"{len(self.glyph_atlas_big.glyphs)} glyphs, "
+            f"{len(self.glyph_atlas.layouts)}+"
+            f"{len(self.glyph_atlas_big.layouts)} layouts"
+        )
+        text.extend(lines)
+
+        left, top = 10, 10
+        width = max(
+            frame_width * profiler.HISTORY, *(self.text_size(line).x for line in text)
+        )
+        height = graph_height + line_height * len(text)
+
+        self.rect(
+            Color(0, 0, 0, 180),
+            Rect(left - 5, top - 5, width + 10, height + 10),
+            z_layer=z_layer,
+        )
+
+        # phases of each frame as stacked bars, growing upwards from the bottom
+        bottom = top + graph_height
+        if frame_times:
+            phase_times = np.array(
+                [list(times) for times in profiler.phase_times.values()]
+            )
+            edges = bottom - 1000 * ms_height * np.cumsum(phase_times, axis=0)
+            edges = np.vstack((np.full(len(frame_times), bottom), edges))
+            edges = np.maximum(top, edges)
+
+            y0, y1 = edges[:-1], edges[1:]
+            x0 = left + frame_width * np.arange(len(frame_times)) + np.zeros_like(y0)
+            x1 = x0 + frame_width
+
+            # two triangles per phase and frame
+            vertices = np.stack(
+                (x0, y0, x1, y0, x1, y1, x0, y0, x1, y1, x0, y1), axis=-1
+            ).reshape(-1, 2)
+            colors = np.repeat(
+                [Color(color).normalize() for color in profiler.PHASE_COLORS.values()],
+                6 * len(frame_times),
+                axis=0,
+            )
+
+            task = self._colored_vertices_task(GL_TRIANGLES, z_layer)
+            task.append_separate(
+                colors, vertices, self.modelview_matrix_stack.apply_many
+            )
+
+        # total frame time, with the 60 FPS budget as reference
+        budget_y = bottom - ms_height * 1000 / 60
+        self.line(
+            Color(255, 255, 255, 80),
+            Vector2(left, budget_y),
+            Vector2(left + width, budget_y),
+            1,
+            z_layer=z_layer,
+        )
+        if len(frame_times) > 1:
+            self.polyline(
+                Color(255, 255, 255),
+                [
+                    (left + frame_width * (i + 0.5), max(top, bottom - ms_height * ms))
+                    for i, ms in enumerate(frame_times)
+                ],
+                1,
+                z_layer=z_layer,
+            )
+
+        y = bottom
+        for i, line in enumerate(text):
+            # the phase lines are drawn in the color of their bars
+            if 1 <= i <= len(profiler.PHASES):
+                color = Color(profiler.PHASE_COLORS[profiler.PHASES[i - 1]])
+            else:
+                color = Color(200, 200, 200)
+            self.text(line, color, Vector2(left, y), z_layer=z_layer)
+            y += line_height
+
+
+class IClickReceiver:
+    __slots__ = ()
+
+    def clicked(self):
+        # Return true to prevent propagation of event
+        return False
+
+
+class IMouseReceiver:
+    __slots__ = ()
+
+    def mousedown(self, position: Vector2):
+        ...
+
+    def mousemove(self, position: Vector2):
+        ...
+
+    def mouseup(self, position: Vector2):
+        ...
+
+    def mousewheel(self, x: float, y: float, flipped: bool):
+        ...
+
+
+class IUpdateReceiver:
+    __slots__ = ()
+
+    def update(self):
+        raise NotImplementedError("Update not implemented")
+
+
+class IDrawable:
+    __slots__ = ()
+
+    def draw(self, ctx: RenderContext):
+        raise NotImplementedError("Draw not implemented")
+
+
+class GrowingBranch:
+    """
+    A branch while its plant is growing. Once grown, the tree is flattened
+    into a BranchTree and these objects are dropped.
+    """
+
+    def __init__(self, phase, length, leftright, depth, fertility, artwork):
+        self.fertility = fertility
+        self.artwork = artwork
+        self.phase = phase
+        self.depth = depth
+        self.angle = (
+            leftright * random.uniform(50, 70) * (0 if (depth == 0) else depth / 2.0)
+        )
+        self.length = length
+        if depth == 0:
+            self.length += 40
+        self.thickness = max(
+            8, int((self.fertility / 5) / (1 if not depth else depth))
+        )
+        self.children = []
+        self.color_mod = random.uniform(0.4, 1.0)
+        self.color_mod2 = random.uniform(0.4, 1.0)
+        self.has_fruit = random.uniform(0, 300) < (self.fertility + 10)
+        self.leaf = artwork.get_random_leaf()
+        self.random_leaf_appearance_value = random.uniform(20, 70)
+        self.random_fruit_appearance_value = random.uniform(40, 70)
+
+    def grow(self):
+        phase = random.uniform(0.1, 0.9)
+        if self.depth == 0:
+            phase = max(phase, 1.0 - max(0.4, min(0.6, self.fertility)))
+        flength = random.uniform(0.2, 0.3) * 2
+        self.children.append(
+            GrowingBranch(
+                phase,
+                self.length * flength,
+                1 - 2 * (len(self.children) % 2),
+                self.depth + 1,
+                self.fertility,
+                self.artwork,
+            )
+        )
+
+    def moregrow(self, recurse=True):
+        if not self.children:
+            if random.choice([False, False, False, True]):
+                self.grow()
+            return
+
+        candidates = list(self.children) * int(max(1, self.fertility / 20))
+
+        for i in range(int(self.fertility / 5)):
+            if not candidates:
+                break
+
+            candidate = random.choice(candidates)
+            candidates.remove(candidate)
+
+            if (
+                random.choice(
+                    [True, False] if self.fertility > 30 else [False, False, True]
+                )
+                or not recurse
+            ):
+                candidate.grow()
+            else:
+                candidate.moregrow(recurse=False)
+
+
+class Branch(IClickReceiver):
+    """
+    Handle to a branch in the BranchTree of a plant, for clicking and
+    harvesting its fruit. See BranchTree.branch().
+    """
+
+    __slots__ = ("plant", "index")
+
+    CURSOR = "harvest"
+
+    def __init__(self, plant: Plant, index: int):
+        self.plant = plant
+        self.index = index
+
+    @property
+    def has_fruit(self):
+        return self.plant.branches.has_flag(self.index, BranchTree.HAS_FRUIT)
+
+    @has_fruit.setter
+    def has_fruit(self, has_fruit: bool):
+        self.plant.branches.set_flag(self.index, BranchTree.HAS_FRUIT, has_fruit)
+        if not has_fruit:
+            self.plant.sector.game.fruits.remove(self)
+
+    def get_world_position(self):
+        return Vector2(*self.plant.branches.fruit_positions[self.index])
+
+    def clicked(self):
+        if self.has_fruit:
+            self.has_fruit = False
+            self.plant.shake()
+            self.plant.artwork.get_random_pick_sound().play()
+            return True
+
+        return False
+
+
+class BranchTree:
+    """
+    All branches of a plant, one entry per branch in depth-first order
+    (parents come before their children): the immutable parameters share one
+    float array, the per-branch state is packed into a bitfield.
+    """
+
+    # columns of params
+    (
+        PHASE,
+        LENGTH,
+        ANGLE,
+        THICKNESS,
+        COLOR_MOD,
+        COLOR_MOD2,
+        LEAF_APPEARANCE,
+        FRUIT_APPEARANCE,
+    ) = range(8)
+
+    # bits of flags
+    HAS_FRUIT = 1
+    HAS_LEAF = 2
+    FRUIT_ROTTEN = 4
+    WAS_RIPE = 8
+    IS_TERMINAL = 16
+
+    def __init__(self, root: GrowingBranch, leaves):
+        branches = []
+        parents = []
+        post_order = []
+
+        # (branch, index, parent index, children pushed)
+        stack = [(root, 0, -1, False)]
+        while stack:
+            branch, index, parent, children_pushed = stack.pop()
+            if children_pushed:
+                post_order.append(index)
+                continue
+
+            index = len(branches)
+            branches.append(branch)
+            parents.append(parent)
+
+            stack.append((branch, index, parent, True))
+            stack.extend(
+                (child, None, index, False) for child in reversed(branch.children)
+            )
+
+        self.parent = np.array(parents, dtype=np.int32)
+        self.depth = np.array([branch.depth for branch in branches], dtype=np.int8)
+        self.params = np.array(
+            [
+                (
+                    branch.phase,
+                    branch.length,
+                    branch.angle,
+                    branch.thickness,
+                    branch.color_mod,
+                    branch.color_mod2,
+                    branch.random_leaf_appearance_value,
+                    branch.random_fruit_appearance_value,
+                )
+                for branch in branches
+            ]
+        )
+        self.leaf_index = np.array(
+            [leaves.index(branch.leaf) for branch in branches], dtype=np.uint8
+        )
+
+        # farthest a branch end gets from the root when fully grown, children
+        # start somewhere along their parent
+        reach = self.params[:, self.LENGTH].tolist()
+        for index, parent in enumerate(parents):
+            if parent >= 0:
+                reach[index] += reach[parent]
+        self.reach = max(reach)
+
+        self.flags = np.array(
+            [
+                (self.HAS_FRUIT if branch.has_fruit else self.HAS_LEAF)
+                | (0 if branch.children else self.IS_TERMINAL)
+                for branch in branches
+            ],
+            dtype=np.uint8,
+        )
+
+        # where flies can find the fruit, set when it is drawn ripe
+        self.fruit_positions = np.zeros((len(branches), 2))
+
+        # branches that can show a leaf or fruit, children first (the order of
+        # the former recursive drawing), fruit only grows at the tips
+        self.sprite_order = [
+            index
+            for index in post_order
+            if self.flags[index] & self.HAS_LEAF
+            or self.flags[index] & self.IS_TERMINAL
+            and self.flags[index] & self.HAS_FRUIT
+        ]
+
+        # Branch handles, only created for branches that need one
+        self.handles = {}
+
+    def __len__(self):
+        return len(self.parent)
+
+    def has_flag(self, index: int, flag: int):
+        """
+        True if all bits of flag are set for the branch at index.
+        """
+        return bool(self.flags[index] & flag == flag)
+
+    def set_flag(self, index: int, flag: int, value: bool = True):
+        if value:
+            self.flags[index] |= flag
+        else:
+            self.flags[index] &= ~flag & 0xFF
+
+    def get_growth_for_factor(self, index: int, factor: float):
+        """
+        Plant growth at which the branch at index reaches the given growth
+        factor, the inverse of BranchForest.evaluate() for that branch.
+        """
+        while index > 0:
+            phase = self.params[index, self.PHASE]
+            factor = phase + factor * (1 - phase)
+            index = self.parent[index]
+
+        return 100 * factor
+
+    def evaluate_branch(self, plant: Plant, index: int, now: float):
+        """
+        Returns (to_point, factor) of the branch at index, like
+        BranchForest.evaluate() but only along the branch's ancestors.
+        """
+        path = []
+        while index >= 0:
+            path.append(index)
+            index = self.parent[index]
+
+        growth = plant.growth
+        wind = 10 * np.sin(plant.wind_phase + plant.wind_speed * now)
+        gust = plant.wind_amplitude / 10 * math.sin(now * 5)
+
+        point = np.zeros(2)
+        direction = np.zeros(2)
+        factor = angle = 0
+        for index in reversed(path):
+            phase, length, base_angle = self.params[
+                index, [self.PHASE, self.LENGTH, self.ANGLE]
+            ]
+            if self.parent[index] < 0:
+                branch_factor = growth / 100
+            else:
+                point = point + direction * (phase * factor)
+                branch_factor = max(0, (factor - phase) / (1 - phase))
+
+            angle = BranchForest.droop(
+                angle * branch_factor + base_angle * growth / 100, plant.health
+            )
+            factor = branch_factor
+
+            wind_divisor = max(1, 5 - int(self.depth[index]))
+            radians = np.radians(angle + (wind / wind_divisor + gust))
+            direction = length * np.array([np.sin(radians), -np.cos(radians)])
+
+        return point + direction * factor, factor
+
+    def branch(self, plant: Plant, index: int):
+        handle = self.handles.get(index)
+        if handle is None:
+            handle = self.handles[index] = Branch(plant, index)
+        return handle
+
+
+class BranchForest:
+    """
+    The BranchTrees of several plants, evaluated together with a few
+    vectorized operations per depth level.
+    """
+
+    # branches with a smaller growth factor are not drawn (nor their children)
+    MIN_FACTOR = 0.01
+
+    def __init__(self, plants):
+        self.plants = plants
+        trees = [plant.branches for plant in plants]
+
+        sizes = [len(tree) for tree in trees]
+        self.offsets = np.cumsum([0] + sizes)
+        self.plant_index = np.repeat(np.arange(len(plants)), sizes)
+
+        self.parent = np.concatenate(
+            [
+                np.where(tree.parent < 0, -1, tree.parent + offset)
+                for tree, offset in zip(trees, self.offsets)
+            ]
+        )
+        self.depth = depth = np.concatenate([tree.depth for tree in trees])
+        params = np.concatenate([tree.params for tree in trees])
+        self.length = params[:, BranchTree.LENGTH]
+        self.thickness = params[:, BranchTree.THICKNESS]
+        self.color_mods = params[:, BranchTree.COLOR_MOD : BranchTree.COLOR_MOD2 + 1]
+
+        # the wind moves thin branches more
+        self.wind_divisor = np.maximum(1, 5 - depth)
+
+        # (branch indices, their parents, phases, angles) per depth level,
+        # level 0 holds the roots of all plants
+        self.levels = []
+        phase = params[:, BranchTree.PHASE]
+        angle = params[:, BranchTree.ANGLE]
+        for level_depth in range(depth.max() + 1 if len(depth) else 0):
+            level = np.flatnonzero(depth == level_depth)
+            self.levels.append((level, self.parent[level], phase[level], angle[level]))
+
+        # {max depth: index of each branch's ancestor at max depth}, see merged()
+        self.anchors = {}
+
+        # farthest a branch end of each plant gets from its root, see extents()
+        self.reach = np.array([tree.reach for tree in trees])
+
+    def plant_slice(self, index: int):
+        return slice(self.offsets[index], self.offsets[index + 1])
+
+    def evaluate(self, now: float):
+        """
+        Returns (visible, from_points, to_points, factors) of all branches,
+        with points in the coordinate system of their plant.
+        """
+        count = len(self.parent)
+        plants = self.plants
+
+        growth = np.array([plant.growth for plant in plants])[self.plant_index]
+        health = np.array([plant.health for plant in plants])[self.plant_index]
+
+        wind_angles = (
+            10
+            * np.sin(
+                np.array([plant.wind_phase for plant in plants])
+                + np.array([plant.wind_speed for plant in plants]) * now
+            )[self.plant_index]
+            / self.wind_divisor
+        )
+        wind_angles += (
+            np.array([plant.wind_amplitude for plant in plants])[self.plant_index]
+            / 10
+            * math.sin(now * 5)
+        )
+
+        factors = np.empty(count)
+        angles = np.empty(count)
+        from_points = np.empty((count, 2))
+        directions = np.empty((count, 2))
+        visible = np.empty(count, dtype=bool)
+
+        for depth, (level, parent, phase, base_angle) in enumerate(self.levels):
+            if depth == 0:
+                factor = growth[level] / 100
+                parent_angle = 0
+                from_points[level] = 0
+                visible[level] = True
+            else:
+                parent_factor = factors[parent]
+                factor = np.maximum(0, (parent_factor - phase) / (1 - phase))
+                parent_angle = angles[parent]
+                offsets = directions[parent] * (phase * parent_factor)[:, np.newaxis]
+                from_points[level] = from_points[parent] + offsets
+                visible[level] = visible[parent]
+
+            visible[level] &= factor >= self.MIN_FACTOR
+
+            angle = self.droop(
+                parent_angle * factor + base_angle * growth[level] / 100,
+                health[level],
+            )
+
+            factors[level] = factor
+            angles[level] = angle
+
+            radians = np.radians(angle + wind_angles[level])
+            length = self.length[level]
+            directions[level, 0] = length * np.sin(radians)
+            directions[level, 1] = -length * np.cos(radians)
+
+        to_points = from_points + directions * factors[:, np.newaxis]
+
+        return visible, from_points, to_points, factors
+
+    @staticmethod
+    def droop(angle, health):
+        """
+        Branch angles (arrays or scalars) moved towards +/-180 for plants in
+        bad health.
+        """
+        angle = angle * (1.0 + 0.01 * (100 - health))
 
-        glBindTexture(GL_TEXTURE_2D, texture.id)
+        # normalize angle to 0..1, keep the sign, avoid over-rotating
+        angle = angle / 180
+        angle = np.sign(angle) * np.minimum(
+            1, np.abs(angle) ** (np.clip(health, 10, 100) / 100)
+        )
+        return angle * 180
 
-        glEnable(GL_TEXTURE_2D)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+    def colors(self):
+        """
+        Branch colors as normalized RGBA, greener for healthy plants.
+        """
+        health = np.array([plant.health for plant in self.plants])[self.plant_index]
 
-        glBegin(GL_TRIANGLE_FAN)
-        glColor4f(1, 1, 1, 1)
-        glTexCoord2f(0.5, 0.5)
-        glVertex2f(*self.modelview_matrix_stack.apply(center))
+        color_mods = 1.0 - (1.0 - self.color_mods) * (health / 100)[:, np.newaxis]
+        colors = np.zeros((len(health), 4))
+        colors[:, 0] = color_mods[:, 0] * (100 - health)
+        colors[:, 1] = color_mods[:, 1] * (244 - 150 + health * 1.5)
+        colors[:, 3] = 255
 
-        # Small circles can affort 20 steps, for bigger circles,
-        # add enough steps that the largest line segment is 30 world units
-        steps = min(100, max(20, (radius * 2 * math.pi) / 30))
+        # same rounding as pygame.Color
+        return np.floor(colors) / 255
 
-        for angle in range(0, 361, int(360 / steps)):
-            direction = Vector2(radius, 0).rotate(angle)
-            glTexCoord2f(
-                0.5 + 0.5 * direction.x / radius, 0.5 + 0.5 * direction.y / radius
+    def local_bounds(self, visible, from_points, to_points):
+        """
+        Top left and bottom right corners (as (P, 2) arrays) of the visible
+        branches of each plant in the plant's coordinate system. Plants
+        without visible branches get infinite bounds.
+        """
+        starts = self.offsets[:-1]
+        visible = visible[:, np.newaxis]
+
+        top_left = np.full((len(self.plants), 2), np.inf)
+        bottom_right = np.full((len(self.plants), 2), -np.inf)
+        for points in (from_points, to_points):
+            top_left = np.minimum(
+                top_left,
+                np.minimum.reduceat(np.where(visible, points, np.inf), starts),
+            )
+            bottom_right = np.maximum(
+                bottom_right,
+                np.maximum.reduceat(np.where(visible, points, -np.inf), starts),
             )
-            glVertex2f(*self.modelview_matrix_stack.apply(center + direction))
-        glEnd()
-        glDisable(GL_BLEND)
-        glDisable(GL_TEXTURE_2D)
 
-        glBindTexture(GL_TEXTURE_2D, 0)
+        return top_left, bottom_right
 
-    def line(
-        self,
-        color: Color,
-        from_point: Vector2,
-        to_point: Vector2,
-        width: float,
-        *,
-        z_layer: int = 0,
-    ):
-        width = max(1, width)
+    def widths(self, zoom_adj: float):
+        growth = np.array([plant.growth for plant in self.plants])[self.plant_index]
+        return self.thickness * growth / 100 + 15 * zoom_adj
 
-        side = (to_point - from_point).normalize().rotate(90) * (width / 2)
-        a = from_point + side
-        b = from_point - side
-        c = to_point + side
-        d = to_point - side
+    def extents(self):
+        """
+        Size of each plant when full-grown, independent of its growth so that
+        its level of detail only changes with the camera zoom.
+        """
+        return self.reach
 
-        self._colored_vertices(GL_TRIANGLES, color, [a, b, c, b, c, d], z_layer=z_layer)
+    def merged(self, max_depth: int, visible, from_points, to_points):
+        """
+        Returns (visible, to_points) with the branches deeper than max_depth
+        hidden and merged into their ancestor at max_depth, which then reaches
+        to the farthest visible end in its subtree.
+        """
+        anchors = self.anchors.get(max_depth)
+        if anchors is None:
+            anchors = np.arange(len(self.parent))
+            for level, parent, _, _ in self.levels[max_depth + 1 :]:
+                anchors[level] = anchors[parent]
+            self.anchors[max_depth] = anchors
 
-    def _colored_vertices(
-        self, mode: int, color: Color, vertices: [Vector2], *, z_layer: int = 0
-    ):
-        key = (z_layer, mode)
-        if key not in self.queue:
-            self.queue[key] = DrawColoredVerticesTask(mode)
+        candidates = np.flatnonzero(visible & (self.depth >= max_depth))
+        anchor = anchors[candidates]
+        distances = np.sum((to_points[candidates] - from_points[anchor]) ** 2, axis=1)
 
-        self.queue[key].append(color, vertices, self.modelview_matrix_stack.apply)
+        farthest = np.full(len(self.parent), -1.0)
+        np.maximum.at(farthest, anchor, distances)
+        is_farthest = distances == farthest[anchor]
 
-    def _separately_colored_vertices(
-        self, mode: int, colors: [Color], vertices: [Vector2], *, z_layer: int = 0
-    ):
-        key = (z_layer, mode)
-        if key not in self.queue:
-            self.queue[key] = DrawColoredVerticesTask(mode)
+        to_points = to_points.copy()
+        to_points[anchor[is_farthest]] = to_points[candidates[is_farthest]]
 
-        self.queue[key].append_separate(
-            colors, vertices, self.modelview_matrix_stack.apply
-        )
+        return visible & (self.depth <= max_depth), to_points
 
-    def flush(self):
-        for (z_layer, *key_args), task in sorted(
-            self.queue.items(), key=lambda kv: kv[0][0]
-        ):
-            task.draw()
+    def silhouettes(self):
+        """
+        (colors, from_points, to_points, widths) of one thick line along the
+        stem of each plant, to draw plants too small for their branches.
+        """
+        roots = self.offsets[:-1]
+        growth = np.array([plant.growth for plant in self.plants])
 
-        self.queue = {}
+        heights = self.length[roots] * growth / 100
+        to_points = np.zeros((len(roots), 2))
+        to_points[:, 1] = -heights
 
+        return self.colors()[roots], np.zeros_like(to_points), to_points, heights / 3
 
-class IClickReceiver:
-    def clicked(self):
-        # Return true to prevent propagation of event
-        return False
 
+class PlantLevelOfDetail:
+    """
+    How much of each plant is drawn, chosen from its full-grown size in
+    pixels on screen: everything, a reduced tree (no leaves, branches deeper than
+    max_depth merged into their ancestors) or just a silhouette. The minimap
+    only ever shows silhouettes.
+    """
 
-class IMouseReceiver:
-    def mousedown(self, position: Vector2):
-        ...
+    FULL, REDUCED, SILHOUETTE = range(3)
+    NAMES = ("full", "reduced", "silhouette")
 
-    def mousemove(self, position: Vector2):
-        ...
+    def __init__(self, full_size: float, silhouette_size: float, max_depth: int):
+        self.full_size = full_size
+        self.silhouette_size = silhouette_size
+        self.max_depth = max_depth
 
-    def mouseup(self, position: Vector2):
-        ...
+        # plants drawn at each level in the main view, see end_frame()
+        self.counts = [0] * len(self.NAMES)
+        self.counts_last_frame = list(self.counts)
 
-    def mousewheel(self, x: float, y: float, flipped: bool):
-        ...
+    def levels(self, sizes):
+        levels = np.where(sizes >= self.silhouette_size, self.REDUCED, self.SILHOUETTE)
+        levels[sizes >= self.full_size] = self.FULL
 
+        for level, count in enumerate(np.bincount(levels, minlength=3).tolist()):
+            self.counts[level] += count
 
-class IUpdateReceiver:
-    def update(self):
-        raise NotImplementedError("Update not implemented")
+        return levels
 
+    def end_frame(self):
+        self.counts_last_frame = self.counts
+        self.counts = [0] * len(self.NAMES)
 
-class IDrawable:
-    def draw(self, ctx: RenderContext):
-        raise NotImplementedError("Draw not implemented")
+    def describe(self):
+        return [
+            f"plant LOD: full >= {self.full_size:.0f} px, reduced (depth <= "
+            f"{self.max_depth}, no leaves) >= {self.silhouette_size:.0f} px",
+            "plants: "
+            + ", ".join(
+                f"{count} {name}"
+                for name, count in zip(self.NAMES, self.counts_last_frame)
+            )
+            + ", minimap: silhouettes",
+        ]
 
 
-class Branch(IClickReceiver):
-    CURSOR = "harvest"
+class PlantTemplatePool:
+    """
+    Pre-grown branch trees for new plants, a few per fertility, so that
+    replanting does not have to grow a tree while handling a click. The
+    pool is refilled with a small time budget every simulation tick.
+    """
 
-    def __init__(self, phase, length, leftright, depth, plant):
-        self.plant = plant
-        self.phase = phase
-        self.depth = depth
-        self.angle = (
-            leftright * random.uniform(50, 70) * (0 if (depth == 0) else depth / 2.0)
-        )
-        self.length = length
-        if depth == 0:
-            self.length += 40
-        self.thickness = max(
-            8, int((self.plant.fertility / 5) / (1 if not depth else depth))
-        )
-        self.children = []
-        self.color_mod = random.uniform(0.4, 1.0)
-        self.color_mod2 = random.uniform(0.4, 1.0)
-        self.has_fruit = random.uniform(0, 300) < (self.plant.fertility + 10)
-        self.has_leaf = not self.has_fruit
-        self.fruit_rotten = False
-        self.leaf = plant.artwork.get_random_leaf()
-        self.random_leaf_appearance_value = random.uniform(20, 70)
-        self.random_fruit_appearance_value = random.uniform(40, 70)
-        self.fruit_world_position = Vector2(0, 0)
-        self.was_ripe = False
+    # seconds per tick spent in refill()
+    REFILL_BUDGET = 0.001
 
-    def get_world_position(self):
-        return self.fruit_world_position
+    LATENCY_HISTORY = 60
 
-    def clicked(self):
-        if self.has_fruit:
-            self.has_fruit = False
-            self.plant.shake()
-            self.plant.artwork.get_random_pick_sound().play()
-            return True
+    def __init__(self, artwork: Artwork, size: int):
+        self.artwork = artwork
+        self.size = size
 
-        return False
+        # {fertility: [BranchTree, ...]}, buckets are added by take()
+        self.buckets = {}
 
-    def grow(self):
-        phase = random.uniform(0.1, 0.9)
-        if self.depth == 0:
-            phase = max(phase, 1.0 - max(0.4, min(0.6, self.plant.fertility)))
-        flength = random.uniform(0.2, 0.3) * 2
-        self.children.append(
-            Branch(
-                phase,
-                self.length * flength,
-                1 - 2 * (len(self.children) % 2),
-                self.depth + 1,
-                plant=self.plant,
-            )
-        )
+        # {fertility: deque of perf_counter() times of hits not refilled yet}
+        self.taken = {}
 
-    def moregrow(self, recurse=True):
-        if not self.children:
-            if random.choice([False, False, False, True]):
-                self.grow()
-            return
+        self.hits = 0
+        self.misses = 0
+        self.refill_latencies = collections.deque(maxlen=self.LATENCY_HISTORY)
 
-        candidates = list(self.children) * int(max(1, self.plant.fertility / 20))
+    def take(self, fertility: int):
+        """
+        Returns a ready BranchTree for a plant with the given fertility, or
+        None if there is none and the plant has to grow its own.
+        """
+        bucket = self.buckets.setdefault(fertility, [])
+        taken = self.taken.setdefault(fertility, collections.deque())
+
+        if not bucket:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        taken.append(time.perf_counter())
+        return bucket.pop()
+
+    def refill(self, budget: float = REFILL_BUDGET):
+        deadline = time.perf_counter() + budget
+
+        for fertility, bucket in self.buckets.items():
+            taken = self.taken[fertility]
+            while len(bucket) < self.size:
+                if time.perf_counter() >= deadline:
+                    return
+
+                bucket.append(Plant.grow_branches(fertility, self.artwork))
+                if taken:
+                    self.refill_latencies.append(time.perf_counter() - taken.popleft())
+
+            taken.clear()
+
+    def describe(self):
+        latencies = self.refill_latencies
+        average = sum(latencies) / max(1, len(latencies))
+
+        return [
+            f"plant pool: {sum(len(bucket) for bucket in self.buckets.values())} "
+            f"ready in {len(self.buckets)} buckets, {self.hits} hits, "
+            f"{self.misses} misses",
+            f"plant pool refill: {1000 * average:.1f} ms avg, "
+            f"{1000 * max(latencies, default=0):.1f} ms max",
+        ]
 
-        for i in range(int(self.plant.fertility / 5)):
-            if not candidates:
-                break
 
-            candidate = random.choice(candidates)
-            candidates.remove(candidate)
+class TickScheduler:
+    """
+    Calls functions at given game ticks, so that objects do not have to poll
+    every tick for things that happen at a time known in advance. Pending
+    events are kept in a heap ordered by tick.
+    """
 
-            if (
-                random.choice(
-                    [True, False] if self.plant.fertility > 30 else [False, False, True]
-                )
-                or not recurse
-            ):
-                candidate.grow()
-            else:
-                candidate.moregrow(recurse=False)
+    def __init__(self):
+        self.now = 0
 
-    def update(self):
-        if self.plant.health < 25:
-            self.fruit_rotten = True
+        # heap of [tick, sequence number, callback], see at()
+        self.events = []
+        self.sequence = itertools.count()
 
-        for child in self.children:
-            child.update()
+        self.calls_last_tick = 0
 
-    def draw(self, ctx, pos, factor, angle, health):
-        if factor < 0.01:
-            return
+    def at(self, tick: int, callback):
+        """
+        Call callback at the given tick (or the next one, if it is not in the
+        future). Returns the event, for cancel().
+        """
+        # the sequence number keeps events of the same tick in order
+        event = [max(tick, self.now + 1), next(self.sequence), callback]
+        heapq.heappush(self.events, event)
+        return event
+
+    def after(self, ticks: int, callback):
+        return self.at(self.now + ticks, callback)
+
+    def every(self, ticks: int, callback):
+        def repeat():
+            self.after(ticks, repeat)
+            callback()
+
+        return self.after(ticks, repeat)
+
+    @staticmethod
+    def cancel(event):
+        # dropped from the heap when due
+        event[2] = None
+
+    def advance(self):
+        self.now += 1
+
+        calls = 0
+        events = self.events
+        while events and events[0][0] <= self.now:
+            callback = heapq.heappop(events)[2]
+            if callback is not None:
+                callback()
+                calls += 1
+
+        self.calls_last_tick = calls
+
+    def describe(self):
+        return [
+            f"scheduler: tick {self.now}, {len(self.events)} pending, "
+            f"{self.calls_last_tick} called last tick"
+        ]
 
-        angle *= factor
-        angle += self.angle * self.plant.growth / 100
-        angle *= 1.0 + 0.01 * (100 - health)
 
-        # normalize angle to 0..1, store sign
-        angle /= 180
-        if angle < 0:
-            f = -1
-            angle = -angle
-        else:
-            f = 1
+class FixedTimestep:
+    """
+    Turns monotonic wall-clock time into a whole number of simulation ticks
+    of fixed length. When frames are too slow to catch up, the ticks beyond
+    max_catch_up per frame are dropped (the game slows down instead of
+    stalling). alpha is how far time has advanced towards the next tick, for
+    drawing between the previous and the current simulation state.
+    """
 
-        # move angle towards 1.0 for bad health
-        angle = angle ** (max(10, min(100, health)) / 100)
-        # avoid over-rotating (limit to -180..+180 range)
-        angle = min(+1, angle)
+    def __init__(self, ticks_per_second: int, max_catch_up: int):
+        self.seconds_per_tick = 1 / ticks_per_second
+        self.max_catch_up = max_catch_up
+        self.last_time = None
+        self.accumulator = 0
+        self.alpha = 0
+        self.dropped_ticks = 0
 
-        # restore angle direction and amplitude
-        angle *= 180 * f
+    def reset(self):
+        """
+        Forget the time since the last advance(), e.g. while paused.
+        """
+        self.last_time = None
+        self.accumulator = 0
 
-        # angle added due to wind
-        wind_angle = (
-            10
-            * math.sin(self.plant.wind_phase + self.plant.wind_speed * ctx.now)
-            / max(1, 5 - self.depth)
-        )
-        wind_angle += (self.plant.wind_amplitude / 10) * math.sin(ctx.now * 5)
+    def advance(self):
+        """
+        The number of ticks to simulate for the time since the last call.
+        """
+        now = time.perf_counter()
+        if self.last_time is not None:
+            self.accumulator += now - self.last_time
+        self.last_time = now
+
+        ticks = int(self.accumulator / self.seconds_per_tick)
+        if ticks > self.max_catch_up:
+            self.dropped_ticks += ticks - self.max_catch_up
+            ticks = self.max_catch_up
+            self.accumulator %= self.seconds_per_tick
+        else:
+            self.accumulator -= ticks * self.seconds_per_tick
 
-        direction = Vector2(0, -self.length).rotate(angle + wind_angle)
+        self.alpha = self.accumulator / self.seconds_per_tick
+        return ticks
 
-        to_point = pos + direction * factor
-        cm1 = 1.0 - ((1.0 - self.color_mod) * health / 100)
-        cm2 = 1.0 - ((1.0 - self.color_mod2) * health / 100)
-        color = Color((cm1 * (100 - health), cm2 * (244 - 150 + health * 1.5), 0))
+    def describe(self):
+        return [
+            f"timestep: {1 / self.seconds_per_tick:.0f} ticks/s, "
+            f"{self.dropped_ticks} dropped, alpha {self.alpha:.2f}"
+        ]
 
-        if self.plant.need_aabb:
-            self.plant.aabb_points.extend(
-                (
-                    ctx.transform_to_screenspace(pos),
-                    ctx.transform_to_screenspace(to_point),
-                )
-            )
 
-        zoom_adj = self.plant.sector.game.get_zoom_adjustment()
+class FruitRegistry:
+    """
+    The ripe fruit of each sector and the fly that is after each of them,
+    kept up to date by the simulation (see Plant.ripen() and
+    FruitFly.set_roaming_target()), so that flies find fruit without
+    searching and without anything being drawn.
+    """
 
-        ctx.line(
-            color,
-            pos,
-            to_point,
-            self.thickness * self.plant.growth / 100 + 15 * zoom_adj,
-            z_layer=ctx.LAYER_BRANCHES,
-        )
+    def __init__(self):
+        # {sector: {Branch: None}}, dicts keep the fruit in order of ripening
+        self.ripe = {}
+        self.available = {}
+
+        # {Branch: FruitFly}
+        self.reservations = {}
+
+        # {ripe count: {sector: None}} of the sectors with ripe fruit, and the
+        # highest count, counts only ever change by one
+        self.sectors_by_ripe_count = {}
+        self.most_ripe = 0
+
+    def add(self, fruit: Branch):
+        sector = fruit.plant.sector
+        ripe = self.ripe.setdefault(sector, {})
+        count = len(ripe)
+        ripe[fruit] = None
+        if fruit not in self.reservations:
+            self.available.setdefault(sector, {})[fruit] = None
+        self.recount(sector, count, len(ripe))
+
+    def remove(self, fruit: Branch):
+        """
+        Forget fruit that was picked, stolen, has gone bad or was cut down.
+        """
+        sector = fruit.plant.sector
+        ripe = self.ripe.get(sector, {})
+        count = len(ripe)
+        ripe.pop(fruit, None)
+        self.available.get(sector, {}).pop(fruit, None)
+        self.recount(sector, count, len(ripe))
+
+    def recount(self, sector: Sector, count: int, new_count: int):
+        """
+        Move sector from the bucket of count to the one of new_count.
+        """
+        if count == new_count:
+            return
 
-        for child in self.children:
-            child_factor = max(0, (factor - child.phase) / (1 - child.phase))
-            child.draw(
-                ctx, pos + direction * child.phase * factor, child_factor, angle, health
-            )
+        buckets = self.sectors_by_ripe_count
+        if count:
+            bucket = buckets[count]
+            del bucket[sector]
+            if not bucket:
+                del buckets[count]
+        if new_count:
+            buckets.setdefault(new_count, {})[sector] = None
+
+        if new_count > self.most_ripe:
+            self.most_ripe = new_count
+        elif count == self.most_ripe and count not in buckets:
+            self.most_ripe = new_count
+
+    def get_ripest_sectors(self):
+        """
+        The sectors with the most ripe fruit (none if no fruit is ripe).
+        """
+        return self.sectors_by_ripe_count.get(self.most_ripe, {})
 
-        if not self.children and self.has_fruit:
-            if self.plant.growth > self.random_fruit_appearance_value:
-                ff = factor + zoom_adj
-                tomato = self.plant.artwork.get_tomato_sprite(factor, self.fruit_rotten)
-                topleft = to_point + Vector2(-(tomato.width * ff) / 2, 0)
-                ctx.sprite(
-                    tomato, topleft, scale=Vector2(ff, ff), z_layer=ctx.LAYER_FRUIT
-                )
+    def reserve(self, fruit: Branch, fly: FruitFly):
+        self.reservations[fruit] = fly
+        self.available.get(fruit.plant.sector, {}).pop(fruit, None)
 
-                # You can only click on ripe tomatoes
-                if self.plant.artwork.is_tomato_ripe(tomato):
-                    if not self.was_ripe:
-                        self.plant.artwork.get_ripe_sound().play()
-                        self.was_ripe = True
-
-                    aabb = aabb_from_points(
-                        [
-                            ctx.transform_to_screenspace(topleft),
-                            ctx.transform_to_screenspace(
-                                topleft + Vector2(0, ff * tomato.height)
-                            ),
-                            ctx.transform_to_screenspace(
-                                topleft + Vector2(ff * tomato.width, 0)
-                            ),
-                            ctx.transform_to_screenspace(
-                                topleft + Vector2(ff * tomato.width, ff * tomato.height)
-                            ),
-                        ]
-                    )
+    def release(self, fruit: Branch):
+        self.reservations.pop(fruit, None)
+        if fruit in self.ripe.get(fruit.plant.sector, ()):
+            self.available[fruit.plant.sector][fruit] = None
 
-                    # insert front, so that the layer ordering/event handling works correctly
-                    game = self.plant.sector.game
-                    game.debug_aabb.insert(
-                        0,
-                        (
-                            LABEL_FRUIT,
-                            Color(255, 255, 255),
-                            aabb,
-                            self,
-                            CLICK_PRIORITY_FRUIT,
-                        ),
-                    )
+    def get_ripe_count(self, sector: Sector):
+        return len(self.ripe.get(sector, ()))
 
-                    ctx.modelview_matrix_stack.push()
-                    ctx.modelview_matrix_stack.identity()
-                    game.planet.apply_planet_surface_transform(self.plant.position)
-                    self.fruit_world_position = ctx.modelview_matrix_stack.apply(
-                        topleft + tomato.size / 2
-                    )
-                    ctx.modelview_matrix_stack.pop()
+    def get_available_fruit(self, sector: Sector):
+        return next(iter(self.available.get(sector, ())), None)
 
-                    self.plant.sector.ripe_fruits.append(self)
-        elif self.has_leaf:
-            if self.plant.growth > self.random_leaf_appearance_value:
-                ff = (self.plant.growth - self.random_leaf_appearance_value) / (
-                    100 - self.random_leaf_appearance_value
-                )
-                ctx.sprite(
-                    self.leaf,
-                    to_point + Vector2(-(self.leaf.width * ff) / 2, 0),
-                    scale=Vector2(ff, ff),
-                    z_layer=ctx.LAYER_LEAVES,
-                )
+    def describe(self):
+        return [
+            f"fruit: {sum(len(ripe) for ripe in self.ripe.values())} ripe in "
+            f"{sum(map(len, self.sectors_by_ripe_count.values()))} sectors, "
+            f"{len(self.reservations)} targeted by flies"
+        ]
 
 
 class PlanetSurfaceCoordinates:
@@ -1225,6 +4032,21 @@ class PlanetSurfaceCoordinates:
         self.angle_degrees = angle_degrees
         self.elevation = elevation
 
+        # (angle, sine, cosine) of the last get_sin_cos()
+        self.sin_cos = None
+
+    def get_sin_cos(self):
+        """
+        Sine and cosine of the angle, computed again only when it changed,
+        since plants and rocks are transformed by the same angle every frame.
+        """
+        angle = self.angle_degrees
+        if self.sin_cos is None or self.sin_cos[0] != angle:
+            radians = math.radians(angle)
+            self.sin_cos = (angle, math.sin(radians), math.cos(radians))
+
+        return self.sin_cos[1:]
+
     def lerp(self, *, target, alpha: float):
         return PlanetSurfaceCoordinates(
             (1 - alpha) * self.angle_degrees + alpha * target.angle_degrees,
@@ -1253,12 +4075,27 @@ class Planet(IDrawable):
 
     def apply_planet_surface_transform(self, position: PlanetSurfaceCoordinates):
         self.renderer.modelview_matrix_stack.translate(*self.at(position))
-        self.renderer.modelview_matrix_stack.rotate(
-            position.angle_degrees * math.pi / 180
-        )
+        self.renderer.modelview_matrix_stack.rotate_sin_cos(*position.get_sin_cos())
 
 
 class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
+    __slots__ = (
+        "game",
+        "spaceship",
+        "artwork",
+        "phase",
+        "sprite_animation",
+        "roaming_target",
+        "roaming_offset",
+        "previous_position",
+        "x_direction",
+        "returning_to_spaceship",
+        "carrying_fruit",
+        "aabb",
+        "trash_rotation_direction",
+        "trash_time",
+    )
+
     AABB_PADDING_PX = 40
     CURSOR = "hunt"
     FLYING_SPEED_CARRYING = 2
@@ -1272,6 +4109,7 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
         self.sprite_animation = artwork.get_fly()
         self.roaming_target = self.spaceship
         self.roaming_offset = Vector2(0, 0)
+        self.previous_position = None
         self.x_direction = 1
         self.returning_to_spaceship = False
         self.carrying_fruit = False
@@ -1283,9 +4121,39 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
     def get_world_position(self):
         return self.roaming_target.get_world_position() + self.roaming_offset
 
+    def remember_position(self):
+        """
+        Keep the position of the last tick, see get_drawn_position().
+        """
+        self.previous_position = self.get_world_position()
+
+    def get_drawn_position(self):
+        """
+        The world position between the last and the current tick.
+        """
+        position = self.get_world_position()
+        if self.previous_position is None:
+            return position
+
+        return self.previous_position.lerp(position, self.game.timestep.alpha)
+
     def reparent_to(self, new_target):
         here = self.get_world_position()
         self.roaming_offset = here - new_target.get_world_position()
+        self.set_roaming_target(new_target)
+
+    def set_roaming_target(self, new_target):
+        """
+        Fly around new_target, the spaceship or a fruit that no other fly
+        goes for then.
+        """
+        fruits = self.game.fruits
+        if self.roaming_target is not new_target:
+            if self.roaming_target is not self.spaceship:
+                fruits.release(self.roaming_target)
+            if new_target is not self.spaceship:
+                fruits.reserve(new_target, self)
+
         self.roaming_target = new_target
 
     def fly_towards_target(self, step):
@@ -1303,11 +4171,13 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
             self.artwork.get_random_slap_sound().play()
             self.spaceship.flies.remove(self)
             self.spaceship.dead_flies.append(self)
+            if self.roaming_target is not self.spaceship:
+                self.game.fruits.release(self.roaming_target)
             return True
         return False
 
     def update(self):
-        now = self.game.renderer.now
+        now = self.game.get_simulation_time()
         angle = now * 1.1 + self.phase * 2 * math.pi
 
         if self.returning_to_spaceship:
@@ -1346,7 +4216,7 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
                     fruit.has_fruit = False
                     self.returning_to_spaceship = True
             else:
-                self.roaming_target = self.spaceship
+                self.set_roaming_target(self.spaceship)
                 new_roaming_offset = Vector2(
                     self.spaceship.sprite.width / 2 * math.sin(angle),
                     self.spaceship.sprite.height / 2 * math.cos(angle),
@@ -1355,6 +4225,20 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
         self.x_direction = -1 if new_roaming_offset.x < self.roaming_offset.x else +1
         self.roaming_offset = new_roaming_offset
 
+    def cull(self, view: ViewCulling):
+        position = self.get_drawn_position()
+        if self.trash_time > 0:
+            # see draw_fly_at()
+            position += position.normalize() * (10 * self.trash_time)
+
+        # the sprite is centered on the position, a carried tomato below it
+        scale_up = 1 + self.game.get_zoom_adjustment()
+        radius = (
+            self.sprite_animation.frames[0].size.length()
+            + self.artwork.get_ripe_tomato().size.length()
+        ) * scale_up
+        return view.cull_disc("flies", self, position, radius)
+
     def draw_fly_at(self, ctx, pos, direction, scale_up):
         self.aabb = None
 
@@ -1365,18 +4249,20 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
         ctx.modelview_matrix_stack.push()
 
         position = pos + fly_offset * scale_up
-        rotation = self.spaceship.coordinates.angle_degrees / 180 * math.pi
+        rotation = (
+            self.spaceship.get_drawn_coordinates().angle_degrees / 180 * math.pi
+        )
 
         if self.trash_time > 0:
             # Fly escapes into space
             ctx.modelview_matrix_stack.translate(
-                *(self.get_world_position().normalize() * (10 * self.trash_time))
+                *(pos.normalize() * (10 * self.trash_time))
             )
             rotation += self.trash_time * 0.1 * self.trash_rotation_direction
 
-        ctx.modelview_matrix_stack.translate(*self.get_world_position())
+        ctx.modelview_matrix_stack.translate(*pos)
         ctx.modelview_matrix_stack.rotate(rotation)
-        ctx.modelview_matrix_stack.translate(*-self.get_world_position())
+        ctx.modelview_matrix_stack.translate(*-pos)
 
         corners = ctx.sprite(
             fly_sprite,
@@ -1387,30 +4273,32 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
 
         if self.carrying_fruit:
             fly_offset += Vector2(0, fly_sprite.height / 2)
-            corners.extend(
-                ctx.sprite(
-                    self.artwork.get_ripe_tomato(),
-                    position,
-                    scale=Vector2(direction, 1) * scale_up,
-                    z_layer=ctx.LAYER_FRUIT,
+            corners = np.concatenate(
+                (
+                    corners,
+                    ctx.sprite(
+                        self.artwork.get_ripe_tomato(),
+                        position,
+                        scale=Vector2(direction, 1) * scale_up,
+                        z_layer=ctx.LAYER_FRUIT,
+                    ),
                 )
             )
 
         planet = self.game.planet
 
-        if not self.game.drawing_minimap and self.get_world_position().length() < (
+        if not self.game.drawing_minimap and pos.length() < (
             planet.radius + planet.atmosphere_height
         ):
-            self.aabb = aabb_from_points(
-                [ctx.transform_to_screenspace(p) for p in corners]
-            )
+            self.aabb = aabb_from_points(ctx.transform_many_to_screenspace(corners))
             self.aabb = self.aabb.inflate(
                 self.AABB_PADDING_PX * 2, self.AABB_PADDING_PX * 2
             )
 
         if self.aabb is not None:
-            self.game.debug_aabb.insert(
-                0, (LABEL_FLY, Color(255, 0, 0), self.aabb, self, CLICK_PRIORITY_FLY)
+            self.game.pick_index.add(
+                (LABEL_FLY, Color(255, 0, 0), self.aabb, self, CLICK_PRIORITY_FLY),
+                front=True,
             )
 
         ctx.modelview_matrix_stack.pop()
@@ -1418,7 +4306,7 @@ class FruitFly(IUpdateReceiver, IDrawable, IClickReceiver):
     def draw(self, ctx):
         scale_up = 1 + self.game.get_zoom_adjustment()
 
-        self.draw_fly_at(ctx, self.get_world_position(), self.x_direction, scale_up)
+        self.draw_fly_at(ctx, self.get_drawn_position(), self.x_direction, scale_up)
 
 
 class Spaceship(IUpdateReceiver, IDrawable):
@@ -1436,10 +4324,10 @@ class Spaceship(IUpdateReceiver, IDrawable):
         self.coordinates = PlanetSurfaceCoordinates(
             self.target_sector.get_center_angle(), elevation=self.ELEVATION_BEGIN
         )
+        self.previous_coordinates = self.coordinates
         self.target_coordinates = PlanetSurfaceCoordinates(
             self.target_sector.get_center_angle(), elevation=self.ELEVATION_DOWN
         )
-        self.ticks = 0
         self.flies = []
         self.dead_flies = []
 
@@ -1448,6 +4336,15 @@ class Spaceship(IUpdateReceiver, IDrawable):
 
         self.breed_flies_if_needed()
 
+        game.scheduler.every(
+            ImportantParameterAffectingGameplay.BREEDING_EVERY_N_TICKS,
+            self.breed_flies_if_needed,
+        )
+        game.scheduler.every(
+            ImportantParameterAffectingGameplay.MOVING_TO_OTHER_SECTOR_EVERY_N_TICKS,
+            self.move_to_other_sector_if_cleared,
+        )
+
     def add_tomato(self):
         self.total_collected_tomatoes += 1
         self.tomato_to_fly_counter += 1
@@ -1474,11 +4371,7 @@ class Spaceship(IUpdateReceiver, IDrawable):
             self.add_fly()
 
     def get_available_fruit(self):
-        for fruit in self.target_sector.ripe_fruits:
-            if not any(fly.roaming_target == fruit for fly in self.flies):
-                return fruit
-
-        return None
+        return self.game.fruits.get_available_fruit(self.target_sector)
 
     def current_sector_cleared(self):
         return self.near_target_sector and all(
@@ -1489,23 +4382,30 @@ class Spaceship(IUpdateReceiver, IDrawable):
     def pick_target_sector(self):
         if CLIARGS.debug:
             return self.game.sectors[0]
-        sectors_with_ripe_fruits = [sector for sector in self.game.sectors if len(sector.ripe_fruits) > 0]
-        sectors_to_choose = sectors_with_ripe_fruits or self.game.sectors
-        return random.choice(sectors_to_choose)
+        ripest_sectors = self.game.fruits.get_ripest_sectors()
+        return random.choice(list(ripest_sectors) or self.game.sectors)
 
     def get_world_position(self):
         return self.planet.at(self.coordinates)
 
-    def update(self):
-        self.ticks += 1
-
-        if self.is_time_to_breed_flies():
-            self.breed_flies_if_needed()
+    def get_drawn_coordinates(self):
+        """
+        The coordinates between the last and the current tick.
+        """
+        return self.previous_coordinates.lerp(
+            target=self.coordinates, alpha=self.game.timestep.alpha
+        )
 
-        if self.is_time_to_move_to_other_sector() and self.current_sector_cleared():
+    def move_to_other_sector_if_cleared(self):
+        if self.current_sector_cleared():
             self.target_sector = self.pick_target_sector()
 
-        now = self.game.renderer.now
+    def update(self):
+        self.previous_coordinates = self.coordinates
+        for fly in self.flies + self.dead_flies:
+            fly.remember_position()
+
+        now = self.game.get_simulation_time()
         self.target_coordinates.angle_degrees = (
             self.target_sector.get_center_angle() + 10 * math.sin(now / 10)
         )
@@ -1531,36 +4431,30 @@ class Spaceship(IUpdateReceiver, IDrawable):
             dead_fly for dead_fly in self.dead_flies if dead_fly.trash_time < 3 * 60
         ]
 
-    def is_time_to_breed_flies(self):
-        return (
-            self.ticks % ImportantParameterAffectingGameplay.BREEDING_EVERY_N_TICKS == 0
-        )
-
-    def is_time_to_move_to_other_sector(self):
-        return (
-            self.ticks
-            % ImportantParameterAffectingGameplay.MOVING_TO_OTHER_SECTOR_EVERY_N_TICKS
-            == 0
-        )
-
     def draw(self, ctx):
         scale_up = 1 + self.game.get_zoom_adjustment()
+        view = self.game.get_view()
+        coordinates = self.get_drawn_coordinates()
+
+        if not view.cull_disc(
+            "spaceship",
+            self,
+            self.planet.at(coordinates),
+            self.sprite.size.length() / 2 * scale_up,
+        ):
+            ctx.modelview_matrix_stack.push()
+            self.planet.apply_planet_surface_transform(coordinates)
+            ctx.sprite(
+                self.sprite,
+                -self.sprite.size / 2 * scale_up,
+                Vector2(scale_up, scale_up),
+            )
 
-        ctx.modelview_matrix_stack.push()
-        self.planet.apply_planet_surface_transform(self.coordinates)
-        ctx.sprite(
-            self.sprite,
-            -self.sprite.size / 2 * scale_up,
-            Vector2(scale_up, scale_up),
-        )
-
-        ctx.modelview_matrix_stack.pop()
-
-        for fly in self.flies:
-            fly.draw(ctx)
+            ctx.modelview_matrix_stack.pop()
 
-        for dead_fly in self.dead_flies:
-            dead_fly.draw(ctx)
+        for fly in self.flies + self.dead_flies:
+            if not fly.cull(view):
+                fly.draw(ctx)
 
 
 class Sector(IUpdateReceiver, IDrawable, IClickReceiver):
@@ -1580,11 +4474,15 @@ class Sector(IUpdateReceiver, IDrawable, IClickReceiver):
             * ImportantParameterAffectingGameplay.GROWTH_SPEED
         )
         self.rotting_speed = random.uniform(0.01, 0.02)
+
+        # bumped whenever plants are replaced, see Minimap.get_content_signature()
+        self.generation = 0
+
         self.plants = []
         self.make_new_plants()
         self.aabb = None  # axis-aligned bounding box
-        self.ripe_fruits = []
         self.plant_trash_heap = []
+        self.branch_forest = None
 
     def get_center_angle(self):
         return self.base_angle + self.sector_width_degrees / 2
@@ -1595,8 +4493,9 @@ class Sector(IUpdateReceiver, IDrawable, IClickReceiver):
 
     def make_new_plants(self):
         for plant in self.plants:
-            plant.was_deleted = True
+            plant.discard()
             self.plant_trash_heap.append(plant)
+        self.generation += 1
 
         self.plants = []
         for j in range(self.number_of_plants):
@@ -1611,27 +4510,26 @@ class Sector(IUpdateReceiver, IDrawable, IClickReceiver):
                     coordinate,
                     self.fertility,
                     self.game.artwork,
+                    self.game.plant_templates.take(self.fertility),
                 )
             )
 
     def replant(self, plant):
-        plant.was_deleted = True
+        plant.discard()
         plant.artwork.get_random_mowing_sound().play()
         self.plant_trash_heap.append(plant)
+        self.generation += 1
         index = self.plants.index(plant)
         self.plants[index] = Plant(
-            self, self.game.planet, plant.position, self.fertility, self.game.artwork
+            self,
+            self.game.planet,
+            plant.position,
+            self.fertility,
+            self.game.artwork,
+            self.game.plant_templates.take(self.fertility),
         )
 
-    def invalidate_aabb(self):
-        self.aabb = None
-        for plant in self.plants:
-            plant.need_aabb = True
-
     def update(self):
-        for plant in self.plants:
-            plant.update()
-
         for plant in self.plant_trash_heap:
             plant.trash_time += 1
 
@@ -1639,17 +4537,173 @@ class Sector(IUpdateReceiver, IDrawable, IClickReceiver):
             plant for plant in self.plant_trash_heap if plant.trash_time < 3 * 60
         ]
 
+    def get_branch_forest(self):
+        plants = self.plant_trash_heap + self.plants
+        if self.branch_forest is None or self.branch_forest.plants != plants:
+            self.branch_forest = BranchForest(plants)
+
+        return self.branch_forest
+
+    def cull(self, view: ViewCulling):
+        """
+        True if none of the plants (including the ones cut down recently) are
+        visible in view. Plants that grew since they were last drawn have
+        their local bounds measured first.
+        """
+        forest = self.get_branch_forest()
+        if any(plant.needs_local_bounds() for plant in forest.plants):
+            visible, from_points, to_points, _ = forest.evaluate(
+                self.game.renderer.now
+            )
+            self.update_local_bounds(forest, visible, from_points, to_points)
+
+        angles_from, angles_to, inners, outers = zip(
+            *(plant.get_polar_span() for plant in forest.plants)
+        )
+        return view.cull(
+            "sectors",
+            self,
+            min(angles_from),
+            max(angles_to),
+            min(inners),
+            max(outers),
+        )
+
+    def update_local_bounds(self, forest, visible, from_points, to_points):
+        """
+        Measure the local bounds of the plants that need it, from the arrays
+        of BranchForest.evaluate().
+        """
+        if any(plant.needs_local_bounds() for plant in forest.plants):
+            top_left, bottom_right = forest.local_bounds(
+                visible, from_points, to_points
+            )
+            for index, plant in enumerate(forest.plants):
+                if plant.needs_local_bounds() and np.isfinite(top_left[index, 0]):
+                    plant.set_local_bounds(top_left[index], bottom_right[index])
+
+    def draw_silhouettes(self, ctx):
+        """
+        Draw all plants as silhouettes, without evaluating their branches.
+        """
+        forest = self.get_branch_forest()
+
+        matrices = np.empty((len(forest.plants), 6))
+        for index, plant in enumerate(forest.plants):
+            ctx.modelview_matrix_stack.push()
+            plant.apply_transform(ctx)
+            matrices[index] = ctx.modelview_matrix_stack.top.m
+            ctx.modelview_matrix_stack.pop()
+
+        ctx.lines(*forest.silhouettes(), matrices=matrices, z_layer=ctx.LAYER_BRANCHES)
+
+    def update_screen_bounds(self, plants, screen_matrices):
+        """
+        Screen space bounds of the plants, from the corners of their cached
+        local bounds and the screen space matrix of each plant.
+        """
+        indices = [
+            index for index, plant in enumerate(plants) if plant.local_bounds
+        ]
+        if not indices:
+            return
+
+        left, top, right, bottom = np.array(
+            [plants[index].local_bounds for index in indices]
+        ).T
+        corners_x = np.stack((left, right, right, left), axis=1)
+        corners_y = np.stack((top, top, bottom, bottom), axis=1)
+
+        a, b, c, d, e, f = screen_matrices[indices].T[..., np.newaxis]
+        screen_x = a * corners_x + b * corners_y + c
+        screen_y = d * corners_x + e * corners_y + f
+
+        # the root starts at the origin of the plant
+        for index, x, y, right, bottom, root_x, root_y in zip(
+            indices,
+            screen_x.min(axis=1).tolist(),
+            screen_y.min(axis=1).tolist(),
+            screen_x.max(axis=1).tolist(),
+            screen_y.max(axis=1).tolist(),
+            c[:, 0].tolist(),
+            f[:, 0].tolist(),
+        ):
+            plants[index].set_screen_bounds(x, y, right, bottom, root_x, root_y)
+
     def draw(self, ctx):
         self.aabb = None
-        self.ripe_fruits = []
 
-        for plant in self.plant_trash_heap:
-            plant.draw(ctx)
+        forest = self.get_branch_forest()
+        plants = forest.plants
+        visible, from_points, to_points, factors = forest.evaluate(ctx.now)
+
+        lod = self.game.plant_lod
+        levels = lod.levels(forest.extents() * ctx.get_pixels_per_unit())
+
+        # plain lists are faster for the per-branch work in Plant.draw()
+        visible_list = visible.tolist()
+        to_points_list = to_points.tolist()
+        factors_list = factors.tolist()
+
+        # modelview and screen space matrix of each plant
+        matrices = np.empty((len(plants), 6))
+        screen_matrices = np.empty((len(plants), 6))
+        for index, (plant, level) in enumerate(zip(plants, levels.tolist())):
+            ctx.modelview_matrix_stack.push()
+            plant.apply_transform(ctx)
+            matrices[index] = ctx.modelview_matrix_stack.top.m
+            screen_matrices[index] = ctx.get_screenspace_matrix().m
+
+            if level != lod.SILHOUETTE:
+                branches = forest.plant_slice(index)
+                plant.draw(
+                    ctx,
+                    visible_list[branches],
+                    to_points_list[branches],
+                    factors_list[branches],
+                    leaves=level == lod.FULL,
+                )
+            ctx.modelview_matrix_stack.pop()
+
+        self.update_local_bounds(forest, visible, from_points, to_points)
+        self.update_screen_bounds(plants, screen_matrices)
+
+        lines_visible, lines_to_points = visible, to_points
+        if (levels != lod.FULL).any():
+            branch_levels = levels[forest.plant_index]
+            merged_visible, merged_to_points = forest.merged(
+                lod.max_depth, visible, from_points, to_points
+            )
+            reduced = branch_levels == lod.REDUCED
+            lines_visible = np.where(reduced, merged_visible, visible)
+            lines_visible &= branch_levels != lod.SILHOUETTE
+            lines_to_points = np.where(
+                reduced[:, np.newaxis], merged_to_points, to_points
+            )
+
+            silhouette = levels == lod.SILHOUETTE
+            colors, from_points_s, to_points_s, widths = forest.silhouettes()
+            ctx.lines(
+                colors[silhouette],
+                from_points_s[silhouette],
+                to_points_s[silhouette],
+                widths[silhouette],
+                matrices=matrices[silhouette],
+                z_layer=ctx.LAYER_BRANCHES,
+            )
+
+        ctx.lines(
+            forest.colors()[lines_visible],
+            from_points[lines_visible],
+            lines_to_points[lines_visible],
+            forest.widths(self.game.get_zoom_adjustment())[lines_visible],
+            matrices=matrices[forest.plant_index[lines_visible]],
+            z_layer=ctx.LAYER_BRANCHES,
+        )
 
         for plant in self.plants:
-            plant.draw(ctx)
             if plant.root_aabb is not None:
-                self.game.debug_aabb.append(
+                self.game.pick_index.add(
                     (
                         f"{LABEL_PLANT} ({plant.health:.0f}%)",
                         Color(0, 128, 128),
@@ -1664,7 +4718,7 @@ class Sector(IUpdateReceiver, IDrawable, IClickReceiver):
                     self.aabb = self.aabb.union(plant.aabb)
 
         if self.aabb is not None:
-            self.game.debug_aabb.append(
+            self.game.pick_index.add(
                 (
                     f"{LABEL_SECTOR} {self.index}",
                     Color(128, 255, 128),
@@ -1676,9 +4730,37 @@ class Sector(IUpdateReceiver, IDrawable, IClickReceiver):
 
 
 class Plant(IUpdateReceiver, IClickReceiver):
+    __slots__ = (
+        "sector",
+        "planet",
+        "position",
+        "artwork",
+        "local_bounds",
+        "local_bounds_state",
+        "aabb",
+        "root_aabb",
+        "scheduler",
+        "planted_tick",
+        "stopped_tick",
+        "growth_ticks",
+        "timers",
+        "fertility",
+        "wind_phase",
+        "wind_speed",
+        "shake_amplitude",
+        "shaken_tick",
+        "branches",
+        "was_deleted",
+        "trash_rotation_direction",
+        "trash_time",
+    )
+
     AABB_PADDING_PX = 40
     CURSOR = "cut"
 
+    # percent of growth or health after which the local bounds are measured again
+    LOCAL_BOUNDS_TOLERANCE = 1
+
     def __init__(
         self,
         sector: Sector,
@@ -1686,6 +4768,7 @@ class Plant(IUpdateReceiver, IClickReceiver):
         position: PlanetSurfaceCoordinates,
         fertility,
         artwork: Artwork,
+        branches: BranchTree = None,
     ):
         super().__init__()
 
@@ -1694,32 +4777,61 @@ class Plant(IUpdateReceiver, IClickReceiver):
         self.position = position
         self.artwork = artwork
 
-        self.need_aabb = True
-        self.aabb_points = []
+        # (left, top, right, bottom) of the branches in plant space, with the
+        # (growth, health) they were measured at
+        self.local_bounds = None
+        self.local_bounds_state = None
         self.aabb = None
         self.root_aabb = None
 
-        self.growth = 0
-        self.health = 100
+        # growth and health follow from the ticks since planting
+        self.scheduler = sector.game.scheduler
+        self.planted_tick = self.scheduler.now
+        self.stopped_tick = None
+        self.growth_ticks = math.ceil(100 / sector.growth_speed)
         self.fertility = fertility
 
         self.wind_phase = random.uniform(0, 2 * math.pi)
         self.wind_speed = random.uniform(0.9, 1.3)
-        self.wind_amplitude = 0
-
-        length = random.uniform(100, 500) * (0.5 + 0.5 * self.fertility / 100) / 2
-
-        self.root = Branch(phase=0, length=length, leftright=+1, depth=0, plant=self)
-        self.root.grow()
-        self.root.grow()
-        self.root.grow()
-        self.root.moregrow()
+        self.shake_amplitude = 0
+        self.shaken_tick = self.planted_tick
+
+        if branches is None:
+            branches = self.grow_branches(fertility, artwork)
+        self.branches = branches
+
+        self.timers = [self.scheduler.after(self.growth_ticks, self.grown)]
+        ripe_factor = artwork.get_ripe_factor()
+        for index in branches.sprite_order:
+            if branches.has_flag(index, BranchTree.IS_TERMINAL | BranchTree.HAS_FRUIT):
+                ripe_growth = max(
+                    branches.get_growth_for_factor(index, ripe_factor),
+                    branches.params[index, BranchTree.FRUIT_APPEARANCE],
+                )
+                if ripe_growth < 100:
+                    self.timers.append(
+                        self.scheduler.after(
+                            int(ripe_growth / sector.growth_speed) + 1,
+                            functools.partial(self.ripen, index),
+                        )
+                    )
 
         self.was_deleted = False
 
         self.trash_rotation_direction = random.choice([-1, +1])
         self.trash_time = 0
 
+    @staticmethod
+    def grow_branches(fertility, artwork: Artwork):
+        length = random.uniform(100, 500) * (0.5 + 0.5 * fertility / 100) / 2
+
+        root = GrowingBranch(0, length, +1, 0, fertility, artwork)
+        root.grow()
+        root.grow()
+        root.grow()
+        root.moregrow()
+        return BranchTree(root, artwork.leaves)
+
     def clicked(self):
         logging.debug("in class Plant.clicked")
         self.sector.replant(self)
@@ -1728,39 +4840,139 @@ class Plant(IUpdateReceiver, IClickReceiver):
     def shake(self):
         # shake the plant
         if self.wind_amplitude <= 0:
-            self.wind_amplitude = 90
+            self.shake_amplitude = 90
         else:
             # if we have already been shaking,
             # shake in the other direction
-            self.wind_amplitude = -90
+            self.shake_amplitude = -90
+        self.shaken_tick = self.scheduler.now
 
-    def update(self):
-        if self.growth < 100:
-            self.growth += self.sector.growth_speed
-            self.growth = min(100, self.growth)
-            self.need_aabb = True
-        else:
-            self.health -= self.sector.rotting_speed
-            self.health = max(0, self.health)
-            self.need_aabb = True
+    @property
+    def wind_amplitude(self):
+        """
+        The amplitude of the last shake, dying down by one per tick since.
+        """
+        decay = self.scheduler.now - self.shaken_tick
+        if self.shake_amplitude > 0:
+            return max(0, self.shake_amplitude - decay)
+        return min(0, self.shake_amplitude + decay)
 
-        if self.wind_amplitude > 0:
-            self.wind_amplitude -= 1
-        elif self.wind_amplitude < 0:
-            self.wind_amplitude += 1
+    def get_age(self):
+        """
+        Ticks since the plant was planted, until it was discarded.
+        """
+        if self.stopped_tick is not None:
+            return self.stopped_tick - self.planted_tick
 
-        self.root.update()
+        return self.scheduler.now - self.planted_tick
 
-    def draw(self, ctx):
-        factor = self.growth / 100
+    @property
+    def growth(self):
+        return min(100, self.get_age() * self.sector.growth_speed)
 
-        ctx.modelview_matrix_stack.push()
+    @property
+    def health(self):
+        rotting_ticks = max(0, self.get_age() - self.growth_ticks)
+        return max(0, 100 - rotting_ticks * self.sector.rotting_speed)
+
+    def grown(self):
+        # rotting starts now, the fruit goes bad below 25% health
+        self.timers.append(
+            self.scheduler.after(int(75 / self.sector.rotting_speed) + 1, self.rot)
+        )
+
+    def rot(self):
+        self.branches.flags |= BranchTree.FRUIT_ROTTEN
+        self.forget_fruit()
+
+    def ripen(self, index: int):
+        tree = self.branches
+        if not tree.has_flag(index, tree.HAS_FRUIT):
+            return
+
+        self.artwork.get_ripe_sound().play()
+        tree.set_flag(index, tree.WAS_RIPE)
+
+        # drawing keeps the position up to date, also when it is not drawn
+        now = self.sector.game.get_simulation_time()
+        to_point, factor = tree.evaluate_branch(self, index, now)
+        tomato = self.artwork.get_ripe_tomato()
+        self.set_fruit_position(
+            index,
+            Vector2(to_point.tolist())
+            + Vector2(-(tomato.width * factor) / 2, 0)
+            + tomato.size / 2,
+        )
+
+        self.sector.game.fruits.add(tree.branch(self, index))
+
+    def forget_fruit(self):
+        # only ripe fruit has a handle in the registry
+        for branch in self.branches.handles.values():
+            self.sector.game.fruits.remove(branch)
+
+    def discard(self):
+        """
+        Stop growing and rotting and cancel the scheduled events, once the
+        plant is cut down.
+        """
+        self.was_deleted = True
+        self.stopped_tick = self.scheduler.now
+        for timer in self.timers:
+            self.scheduler.cancel(timer)
+
+        self.forget_fruit()
+
+    def get_polar_span(self):
+        """
+        (angle from, angle to, inner, outer) of the planet surface angles and
+        distances from the planet center covered by the plant, including its
+        leaves and fruit, from its local bounds where they can be trusted.
+        """
+        radius = self.planet.radius
+
+        # fruit is scaled up like the branches are thickened, see draw_fruit()
+        scale = 1 + self.sector.game.get_zoom_adjustment()
+        margin = self.artwork.get_plant_sprite_reach() * scale
+
+        if self.local_bounds is None or self.trash_time > 0:
+            # a circle around the root, also while the plant escapes into
+            # space (see apply_transform())
+            reach = self.branches.reach * self.growth / 100
+            if self.trash_time > 0:
+                reach = 2 * reach + self.trash_time * 10
+            reach += margin
+            spread = math.degrees(math.asin(min(1, reach / radius)))
+            if spread >= 90:
+                return (0, 360, 0, radius + reach)
+
+            angle = self.position.angle_degrees
+            return (angle - spread, angle + spread, radius - reach, radius + reach)
+
+        left, top, right, bottom = self.local_bounds
+        corners = [
+            (x, radius - y)
+            for x in (left - margin, right + margin)
+            for y in (top - margin, bottom + margin)
+        ]
+        if any(height <= 0 for x, height in corners):
+            return (0, 360, 0, radius + math.hypot(*max(corners)))
+
+        angles = [math.degrees(math.atan2(x, height)) for x, height in corners]
+        return (
+            self.position.angle_degrees + min(angles),
+            self.position.angle_degrees + max(angles),
+            radius - bottom - margin,
+            max(math.hypot(x, height) for x, height in corners),
+        )
 
+    def apply_transform(self, ctx):
         self.planet.apply_planet_surface_transform(self.position)
 
         if self.trash_time > 0:
             # Plant escapes into space
-            approx_height = self.root.length * self.growth / 100
+            root_length = self.branches.params[0, BranchTree.LENGTH]
+            approx_height = root_length * self.growth / 100
             ctx.modelview_matrix_stack.translate(0, -self.trash_time * 10)
             ctx.modelview_matrix_stack.translate(0, -approx_height / 2)
             ctx.modelview_matrix_stack.rotate(
@@ -1768,21 +4980,107 @@ class Plant(IUpdateReceiver, IClickReceiver):
             )
             ctx.modelview_matrix_stack.translate(0, +approx_height / 2)
 
-        self.root.draw(ctx, Vector2(0, 0), factor, 0.0, self.health)
+    def draw(self, ctx, visible, to_points, factors, leaves=True):
+        """
+        Draw fruit and (unless leaves is False) leaves, from lists with this
+        plant's part of the arrays of BranchForest.evaluate() and with
+        apply_transform() applied. The branches themselves are drawn by the
+        sector, all at once.
+        """
+        tree = self.branches
+        flags = tree.flags.tolist()
 
-        if self.need_aabb and self.aabb_points:
-            self.aabb = aabb_from_points(self.aabb_points)
-            self.aabb = self.aabb.inflate(
-                self.AABB_PADDING_PX * 2, self.AABB_PADDING_PX * 2
+        for index in tree.sprite_order:
+            if not visible[index]:
+                continue
+
+            if flags[index] & tree.IS_TERMINAL and flags[index] & tree.HAS_FRUIT:
+                if self.growth > tree.params[index, tree.FRUIT_APPEARANCE]:
+                    self.draw_fruit(
+                        ctx, index, Vector2(to_points[index]), factors[index]
+                    )
+            elif leaves and flags[index] & tree.HAS_LEAF:
+                if self.growth > tree.params[index, tree.LEAF_APPEARANCE]:
+                    self.draw_leaf(ctx, index, Vector2(to_points[index]))
+
+    def draw_fruit(self, ctx, index: int, to_point: Vector2, factor: float):
+        tree = self.branches
+        zoom_adj = self.sector.game.get_zoom_adjustment()
+
+        ff = factor + zoom_adj
+        rotten = tree.has_flag(index, tree.FRUIT_ROTTEN)
+        tomato = self.artwork.get_tomato_sprite(factor, rotten)
+        topleft = to_point + Vector2(-(tomato.width * ff) / 2, 0)
+        corners_in_modelview_space = ctx.sprite(
+            tomato, topleft, scale=Vector2(ff, ff), z_layer=ctx.LAYER_FRUIT
+        )
+
+        # You can only click on ripe tomatoes, see ripen()
+        if tree.has_flag(index, tree.WAS_RIPE) and not rotten:
+            aabb = aabb_from_points(
+                ctx.transform_many_to_screenspace(corners_in_modelview_space)
             )
-            self.root_aabb = aabb_from_points(self.aabb_points[:1])
-            self.root_aabb = self.root_aabb.inflate(
-                self.AABB_PADDING_PX * 2, self.AABB_PADDING_PX * 2
+
+            # add to the front, so that the layer ordering/event handling works
+            self.sector.game.pick_index.add(
+                (
+                    LABEL_FRUIT,
+                    Color(255, 255, 255),
+                    aabb,
+                    tree.branch(self, index),
+                    CLICK_PRIORITY_FRUIT,
+                ),
+                front=True,
             )
-            self.aabb_points = []
-            self.need_aabb = False
 
-        ctx.modelview_matrix_stack.pop()
+            self.set_fruit_position(index, topleft + tomato.size / 2)
+
+    def set_fruit_position(self, index: int, point: Vector2):
+        """
+        Where flies find the fruit at index, from its center in plant space.
+        """
+        self.branches.fruit_positions[index] = self.planet.at(
+            self.position
+        ) + Vector2(point).rotate(self.position.angle_degrees)
+
+    def draw_leaf(self, ctx, index: int, to_point: Vector2):
+        tree = self.branches
+        leaf = self.artwork.leaves[tree.leaf_index[index]]
+        leaf_appearance = tree.params[index, tree.LEAF_APPEARANCE]
+
+        ff = (self.growth - leaf_appearance) / (100 - leaf_appearance)
+        ctx.sprite(
+            leaf,
+            to_point + Vector2(-(leaf.width * ff) / 2, 0),
+            scale=Vector2(ff, ff),
+            z_layer=ctx.LAYER_LEAVES,
+        )
+
+    def needs_local_bounds(self):
+        """
+        True if growth, health or shaking may have moved the branches away
+        from the cached local bounds.
+        """
+        if self.local_bounds is None or self.wind_amplitude:
+            return True
+
+        growth, health = self.local_bounds_state
+        return (
+            abs(self.growth - growth) >= self.LOCAL_BOUNDS_TOLERANCE
+            or abs(self.health - health) >= self.LOCAL_BOUNDS_TOLERANCE
+        )
+
+    def set_local_bounds(self, top_left, bottom_right):
+        self.local_bounds = (*top_left.tolist(), *bottom_right.tolist())
+        self.local_bounds_state = (self.growth, self.health)
+
+    def set_screen_bounds(self, x, y, right, bottom, root_x, root_y):
+        self.aabb = Rect(x, y, right - x, bottom - y).inflate(
+            self.AABB_PADDING_PX * 2, self.AABB_PADDING_PX * 2
+        )
+        self.root_aabb = Rect(root_x, root_y, 0, 0).inflate(
+            self.AABB_PADDING_PX * 2, self.AABB_PADDING_PX * 2
+        )
 
 
 class Rock(IDrawable):
@@ -1795,6 +5093,11 @@ class Rock(IDrawable):
 
         self.rock = artwork.get_random_rock()
 
+    def cull(self, view: ViewCulling):
+        # the sprite hangs down from 10 units below the surface, see draw()
+        radius = math.hypot(self.rock.width / 2, self.rock.height)
+        return view.cull_disc("rocks", self, self.planet.at(self.position), radius)
+
     def draw(self, ctx):
         ctx.modelview_matrix_stack.push()
 
@@ -1873,7 +5176,8 @@ class DebugGUI(Container):
 
 
 class Window:
-    EVENT_TYPE_UPDATE = pygame.USEREVENT + 42
+    # ticks simulated at most per frame, the rest is dropped
+    MAX_CATCH_UP_TICKS = 5
 
     def __init__(
         self,
@@ -1891,10 +5195,12 @@ class Window:
             pygame.display.gl_set_attribute(GL_MULTISAMPLEBUFFERS, 1)
             pygame.display.gl_set_attribute(GL_MULTISAMPLESAMPLES, 4)
 
-        self.screen = pygame.display.set_mode((width, height), DOUBLEBUF | OPENGL)
+        # the other backends do not need an OpenGL context
+        flags = DOUBLEBUF | OPENGL if get_render_backend_name() == "gl" else 0
+        self.screen = pygame.display.set_mode((width, height), flags)
         pygame.display.set_caption(title)
         pygame.font.init()
-        pygame.time.set_timer(self.EVENT_TYPE_UPDATE, int(1000 / updates_per_second))
+        self.timestep = FixedTimestep(updates_per_second, self.MAX_CATCH_UP_TICKS)
 
     def set_subtitle(self, subtitle):
         pygame.display.set_caption(f"{self.title}: {subtitle}")
@@ -1913,9 +5219,7 @@ class Window:
             self.renderer.paused_started = time.time()
             self.buttons[0] = ('Resume Game', 'play')
 
-    def process_events(
-        self, *, mouse: IMouseReceiver, update: IUpdateReceiver, gamestate: Game
-    ):
+    def process_events(self, *, mouse: IMouseReceiver, gamestate: Game):
         for event in pygame.event.get():
             if event.type == QUIT:
                 self.quit()
@@ -1923,6 +5227,9 @@ class Window:
             if self._is_spacebar_down(event):
                 gamestate.start_game_or_toggle_pause()
 
+            if event.type == pygame.KEYDOWN and event.key == K_F3:
+                gamestate.renderer.profiler.toggle()
+
             if event.type == pygame.KEYDOWN and self.want_tutorial and event.key == K_s:
                 self.tutorial_pos = len(self.tutorial)
                 self.want_tutorial = False
@@ -1947,8 +5254,17 @@ class Window:
                     mouse.mouseup(event.pos)
                 elif event.type == MOUSEWHEEL:
                     mouse.mousewheel(event.x, event.y, event.flipped)
-                elif event.type == self.EVENT_TYPE_UPDATE:
-                    update.update()
+
+    def run_simulation(self, update: IUpdateReceiver):
+        """
+        Run the ticks that are due by now, in fixed steps.
+        """
+        if not self.is_running:
+            self.timestep.reset()
+            return
+
+        for _ in range(self.timestep.advance()):
+            update.update()
 
     def _is_spacebar_down(self, event):
         return event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE
@@ -1958,6 +5274,9 @@ class Window:
 
 
 class Minimap(IClickReceiver):
+    # ticks between refreshes for growing or rotting plants
+    SILHOUETTE_TICKS = 30
+
     def __init__(self, game):
         self.game = game
 
@@ -1968,10 +5287,340 @@ class Minimap(IClickReceiver):
 
         self.rect = Rect(self.game.width - border - size.x, border, size.x, size.y)
 
+        self.refresh_frames = max(1, CLIARGS.minimap_refresh)
+        self.refresh_on_change = CLIARGS.minimap_on_change
+
+        # offscreen copy of the minimap, None = draw directly every frame
+        self.target = None
+        try:
+            self.target = self.game.renderer.backend.create_render_target(
+                self.rect.width,
+                self.rect.height,
+                samples=0 if CLIARGS.no_multisample else 4,
+            )
+        except Exception as e:
+            logging.warning(f"Drawing minimap without render target: {e}")
+
+        self.frames_since_refresh = None
+        self.content_signature = None
+        self.refresh_count = 0
+
+    def get_content_signature(self, ctx):
+        """
+        Positions (in minimap pixels) of everything that moves on the minimap
+        and simulation counters that change with the plant silhouettes (see
+        Sector.draw_silhouettes()), with the minimap camera already set up.
+        Equal signatures look the same.
+        """
+        game = self.game
+
+        points = [
+            game.planet.at(PlanetSurfaceCoordinates(0)),
+            game.planet.at(game.spaceship.coordinates),
+        ]
+        points.extend(fly.get_world_position() for fly in game.spaceship.flies)
+        points.extend(fly.get_world_position() for fly in game.spaceship.dead_flies)
+
+        scale = self.rect.width / game.width
+        screen_points = ctx.transform_many_to_screenspace(points)
+
+        # silhouettes change when plants are replaced, every tick while cut
+        # plants fly off, and slowly with growth and health, which follow the
+        # tick
+        now = game.scheduler.now
+        flying = any(sector.plant_trash_heap for sector in game.sectors)
+        plants = (
+            tuple(sector.generation for sector in game.sectors),
+            now if flying else now // self.SILHOUETTE_TICKS,
+        )
+
+        return tuple(np.rint(screen_points * scale).astype(int).flatten()), plants
+
+    def needs_refresh(self, ctx):
+        first = self.frames_since_refresh is None
+
+        if not first and self.frames_since_refresh + 1 < self.refresh_frames:
+            return False
+
+        if self.refresh_on_change:
+            signature = self.get_content_signature(ctx)
+            if not first and signature == self.content_signature:
+                return False
+            self.content_signature = signature
+
+        return True
+
+    def draw(self, ctx):
+        """
+        Draw the zoomed-out world into the minimap area, re-rendering it only
+        when needed if there is a render target to keep it in.
+        """
+        game = self.game
+
+        ctx.camera_mode_world(
+            game.planet, zoom=0, rotate=game.rotation_angle_degrees / 360
+        )
+
+        if self.target is None:
+            # GL coordinate system origin = bottom left
+            minimap_gl_rect = (
+                int(self.rect.x),
+                int(game.height - self.rect.height - self.rect.y),
+                int(self.rect.width),
+                int(self.rect.height),
+            )
+
+            with ctx.clipped_to(minimap_gl_rect):
+                self.draw_scene(ctx)
+            return
+
+        if self.needs_refresh(ctx):
+            with ctx.rendering_to(self.target):
+                self.draw_scene(ctx)
+
+            self.frames_since_refresh = 0
+            self.refresh_count += 1
+        else:
+            self.frames_since_refresh += 1
+
+        ctx.camera_mode_overlay()
+        ctx.render_target(self.target, self.rect)
+        ctx.flush()
+
+    def draw_scene(self, ctx):
+        game = self.game
+
+        game.drawing_minimap = True
+        game.draw_scene(
+            ctx,
+            bg_color=Color(10, 10, 10),
+            details=False,
+            visible_rect=Rect(0, 0, game.width, game.height),
+        )
+        game.drawing_minimap = False
+
     def clicked(self):
         # TBD: Could do something with the minimap
         return False
 
+
+class PickIndex:
+    """
+    Screen space rects of what can be clicked, collected while drawing, as
+    (label, color, rect, object, click priority) tuples. Each priority has
+    its own uniform grid of the entries by the cells their rect covers.
+    """
+
+    CELL_SIZE = 128
+
+    def __init__(self):
+        # entries added to the front (in reverse order) and to the back
+        self.front = []
+        self.back = []
+
+        # {priority: {(column, row): [(order, entry), ...]}}
+        self.grids = {}
+
+    def add(self, entry, *, front: bool = False):
+        """
+        Add entry before all previous entries of its priority if front is
+        True (for things drawn on top of them), else after them.
+        """
+        if front:
+            self.front.append(entry)
+            order = -len(self.front)
+        else:
+            self.back.append(entry)
+            order = len(self.back)
+
+        rect = entry[2]
+        grid = self.grids.setdefault(entry[-1], {})
+        size = self.CELL_SIZE
+        right = max(rect.left, rect.right - 1)
+        bottom = max(rect.top, rect.bottom - 1)
+        for column in range(rect.left // size, right // size + 1):
+            for row in range(rect.top // size, bottom // size + 1):
+                grid.setdefault((column, row), []).append((order, entry))
+
+    def __iter__(self):
+        yield from reversed(self.front)
+        yield from self.back
+
+    def at(self, position):
+        """
+        The entries whose rect contains position, by priority and then in the
+        order of iteration.
+        """
+        x, y = position
+        cell = (int(x) // self.CELL_SIZE, int(y) // self.CELL_SIZE)
+        for priority in sorted(self.grids):
+            hits = [
+                (order, entry)
+                for order, entry in self.grids[priority].get(cell, ())
+                if entry[2].collidepoint(position)
+            ]
+            hits.sort(key=lambda hit: hit[0])
+            for _, entry in hits:
+                yield entry
+
+
+class ViewCulling:
+    """
+    What a camera can see of the world around the planet: for a range of
+    distances from the planet center, the arc of planet surface angles (see
+    PlanetSurfaceCoordinates) that shows up in the viewport. Objects that are
+    off the arc are not drawn. Remembers the objects drawn since begin() and
+    counts the drawn and culled ones per kind.
+    """
+
+    KINDS = ("sectors", "rocks", "spaceship", "flies")
+
+    def __init__(self, name: str, enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self.center = Vector2(0, 0)
+        self.corners = []
+        self.contains_center = True
+        self.visible = set()
+        self.counts = {kind: [0, 0] for kind in self.KINDS}
+
+    def begin(self, ctx, planet: Planet, viewport: Rect):
+        """
+        Start a frame with the current world camera of ctx, viewport being in
+        screen space.
+        """
+        a, b, c, d, e, f = ctx.get_screenspace_matrix().m
+        determinant = a * e - b * d
+
+        # viewport corners in world space, relative to the planet center
+        self.center = Vector2(planet.position)
+        self.corners = []
+        for x, y in (
+            viewport.topleft,
+            viewport.topright,
+            viewport.bottomright,
+            viewport.bottomleft,
+        ):
+            x, y = x - c, y - f
+            self.corners.append(
+                Vector2(e * x - b * y, a * y - d * x) / determinant - self.center
+            )
+
+        # the corners go around the center in the same direction if it is inside
+        sides = [
+            corner.cross(self.corners[(index + 1) % 4])
+            for index, corner in enumerate(self.corners)
+        ]
+        self.contains_center = all(side >= 0 for side in sides) or all(
+            side <= 0 for side in sides
+        )
+
+        self.visible = set()
+        self.counts = {kind: [0, 0] for kind in self.KINDS}
+
+    @staticmethod
+    def get_angle(offset: Vector2):
+        """
+        Planet surface angle in degrees of an offset from the planet center,
+        the inverse of Planet.at().
+        """
+        return math.degrees(math.atan2(offset.x, -offset.y))
+
+    def get_arc(self, inner: float, outer: float):
+        """
+        (start, width) in degrees of the visible arc of the ring between the
+        inner and outer distance from the planet center, None if none of it
+        is visible.
+        """
+        if self.contains_center:
+            return (0, 360)
+
+        # The viewport is convex and the center is outside of it, so the
+        # visible part of the ring spans less than 180 degrees and its extreme
+        # angles are at corners within the ring or where edges cross a circle.
+        inner = max(0, inner)
+        points = [
+            corner for corner in self.corners if inner <= corner.length() <= outer
+        ]
+        for index, start in enumerate(self.corners):
+            direction = self.corners[(index + 1) % 4] - start
+            qa = direction.dot(direction)
+            qb = 2 * start.dot(direction)
+            for radius in (inner, outer):
+                discriminant = qb * qb - 4 * qa * (start.dot(start) - radius**2)
+                if radius <= 0 or discriminant < 0:
+                    continue
+                for sign in (-1, 1):
+                    t = (-qb + sign * math.sqrt(discriminant)) / (2 * qa)
+                    if 0 <= t <= 1:
+                        points.append(start + direction * t)
+
+        if not points:
+            return None
+
+        reference = self.get_angle(sum(self.corners, Vector2()))
+        relative = [
+            (self.get_angle(point) - reference + 180) % 360 - 180 for point in points
+        ]
+        return (reference + min(relative), max(relative) - min(relative))
+
+    def cull(self, kind: str, obj, angle_from, angle_to, inner, outer):
+        """
+        True if obj, covering the planet surface angles from angle_from to
+        angle_to between the inner and outer distance from the planet center,
+        is not visible (and should not be drawn).
+        """
+        visible = True
+        if self.enabled and angle_to - angle_from < 360:
+            arc = self.get_arc(inner, outer)
+            if arc is None:
+                visible = False
+            else:
+                start, width = arc
+                visible = (
+                    (angle_from - start) % 360 <= width
+                    or (start - angle_from) % 360 <= angle_to - angle_from
+                )
+
+        self.counts[kind][not visible] += 1
+        if visible:
+            self.visible.add(obj)
+
+        return not visible
+
+    def cull_disc(self, kind: str, obj, position: Vector2, radius: float):
+        """
+        Like cull() for an object within radius around position (in world
+        space).
+        """
+        offset = position - self.center
+        distance = offset.length()
+        if radius >= distance:
+            return self.cull(kind, obj, 0, 360, 0, distance + radius)
+
+        angle = self.get_angle(offset)
+        spread = math.degrees(math.asin(radius / distance))
+        return self.cull(
+            kind,
+            obj,
+            angle - spread,
+            angle + spread,
+            distance - radius,
+            distance + radius,
+        )
+
+    def describe(self):
+        return [
+            f"culling {self.name}: "
+            + ", ".join(
+                f"{drawn}/{drawn + culled} {kind}"
+                for kind, (drawn, culled) in self.counts.items()
+            )
+            + " drawn"
+            + ("" if self.enabled else " (disabled)")
+        ]
+
+
 class HarvestedTomato(IUpdateReceiver, IDrawable):
     def __init__(self, game, screenspace_position, target_position, duration):
         self.game = game
@@ -1997,17 +5646,28 @@ class HarvestedTomato(IUpdateReceiver, IDrawable):
 
 class Game(Window, IUpdateReceiver, IMouseReceiver):
     def __init__(self, data_path: str = os.path.join(HERE, "data")):
+        started = time.perf_counter()
         super().__init__("Red Planted -- PyWeek#34 -- https://pyweek.org/e/RedPlanted/")
         pygame.mixer.init()
 
         self.resources = ResourceManager(data_path)
         self.artwork = Artwork(self.resources)
-        self.renderer = RenderContext(self.width, self.height, self.resources)
+        self.renderer = RenderContext(
+            self.width,
+            self.height,
+            self.resources,
+            create_render_backend(get_render_backend_name()),
+        )
+        if CLIARGS.perf_hud:
+            self.renderer.profiler.toggle()
 
         self.planet = Planet(self.artwork, self.renderer)
 
+        self.scheduler = TickScheduler()
+        self.fruits = FruitRegistry()
         self.sectors = []
         self.rocks = []
+        self.plant_templates = PlantTemplatePool(self.artwork, CLIARGS.plant_pool_size)
 
         self.rotation_angle_degrees = 0
 
@@ -2027,22 +5687,26 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
 
         self.spaceship = Spaceship(self, self.planet, self.artwork)
 
-        self.debug_aabb = []
+        self.pick_index = PickIndex()
         self.draw_debug_aabb = CLIARGS.debug
-        self.cull_via_aabb = False
+        self.main_view = ViewCulling("main", enabled=not CLIARGS.no_culling)
+        self.minimap_view = ViewCulling("minimap", enabled=not CLIARGS.no_culling)
 
         self.drawing_minimap = False
+        self.plant_lod = PlantLevelOfDetail(
+            CLIARGS.lod_full_size, CLIARGS.lod_silhouette_size, CLIARGS.lod_max_depth
+        )
 
         self.tomato_score = 0
 
         stars_range = self.planet.radius * 2
-        self.stars = [
-            Vector2(
+        self.stars = tuple(
+            (
                 random.uniform(-stars_range, +stars_range),
                 random.uniform(-stars_range, +stars_range),
             )
             for i in range(100)
-        ]
+        )
 
         self.is_running = False
         self.cursor_mode = None
@@ -2089,6 +5753,9 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
         self.want_tutorial = False
         self.game_has_started = False
 
+        self.init_seconds = time.perf_counter() - started
+        self.startup_reported = False
+
     @property
     def is_startup(self):
         return not self.game_has_started
@@ -2113,31 +5780,70 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
 
         return 0
 
+    def get_simulation_time(self):
+        """
+        Seconds of simulated game time, advancing with the ticks only.
+        """
+        return self.scheduler.now * self.timestep.seconds_per_tick
+
+    def get_view(self):
+        if self.drawing_minimap:
+            return self.minimap_view
+
+        return self.main_view
+
     def tick(self):
-        super().process_events(mouse=self.gui, update=self, gamestate=self)
+        with self.renderer.profiler.phase("events"):
+            super().process_events(mouse=self.gui, gamestate=self)
+        self.run_simulation(self)
         if self.is_startup:
             self.render_scene(startup=True)
+            if not self.startup_reported:
+                # textures are uploaded lazily during the first frame
+                self.report_startup()
         elif self.is_gameover_flies_win:
             self.render_gameover_flies_win()
         elif self.is_gameover_player_wins:
             self.render_gameover_player_wins()
         elif self.is_running:
             dy = (self.gui.wheel_sum.y - self.gui.wheel_sum.x)
-            if dy != 0:
-                self.invalidate_aabb()
             self.rotation_angle_degrees += dy * (30000 / self.planet.get_circumfence())
             self.rotation_angle_degrees %= 360
             self.gui.wheel_sum.x = 0
             self.gui.wheel_sum.y = 0
 
-            self.set_subtitle(f"{self.renderer.fps:.0f} FPS")
+            if CLIARGS.debug:
+                renderer = self.renderer
+                vertex_buffer = renderer.vertex_buffer
+                streamed_kib = (
+                    vertex_buffer.bytes_streamed_last_frame / 1024
+                    if vertex_buffer is not None
+                    else 0
+                )
+                self.set_subtitle(
+                    f"{renderer.fps:.0f} FPS, {streamed_kib:.0f} KiB/frame streamed, "
+                    f"{renderer.passes_last_frame} passes "
+                    f"({renderer.merged_passes_last_frame} merged), "
+                    f"{renderer.draw_calls_last_frame} draw calls, "
+                    f"{GL_STATE.skipped_last_frame}/"
+                    f"{GL_STATE.calls_last_frame + GL_STATE.skipped_last_frame}"
+                    " GL state calls skipped"
+                )
+            else:
+                self.set_subtitle(f"{self.renderer.fps:.0f} FPS")
             self.render_scene(paused=False)
         else:
             self.render_scene(paused=True)
 
-    def invalidate_aabb(self):
-        for sector in self.sectors:
-            sector.invalidate_aabb()
+    def report_startup(self):
+        self.startup_reported = True
+        print(
+            f"Startup: {self.init_seconds * 1000:.0f} ms to initialize, "
+            f"{ImageSprite.load_seconds * 1000:.0f} ms loading images, "
+            f"{Texture.count} textures uploaded in "
+            f"{Texture.upload_seconds * 1000:.0f} ms "
+            f"(texture cache {'enabled' if MIPMAP_CACHE is not None else 'disabled'})"
+        )
 
     def mousedown(self, position: Vector2):
         if self.want_instructions:
@@ -2168,19 +5874,16 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
             elif action == 'quit':
                 self.quit()
 
-        for label, color, rect, obj, priority in sorted(
-            self.debug_aabb, key=lambda t: t[-1]
-        ):
-            if rect.collidepoint(position):
-                logging.debug(f"Clicked on: {label}")
-                if isinstance(obj, IClickReceiver):
-                    if obj.clicked():
-                        logging.debug("click was handled -> breaking out")
-                        if (
-                            label == LABEL_FRUIT
-                        ):
-                            self.harvest_on_mouseup = True
-                        break
+        for label, color, rect, obj, priority in self.pick_index.at(position):
+            logging.debug(f"Clicked on: {label}")
+            if isinstance(obj, IClickReceiver):
+                if obj.clicked():
+                    logging.debug("click was handled -> breaking out")
+                    if (
+                        label == LABEL_FRUIT
+                    ):
+                        self.harvest_on_mouseup = True
+                    break
 
     def mousemove(self, position: Vector2):
         ...
@@ -2203,21 +5906,59 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
             sector.make_new_plants()
 
     def update(self):
-        for sector in self.sectors:
-            sector.update()
+        with self.renderer.profiler.phase("update"):
+            self.scheduler.advance()
+
+            for sector in self.sectors:
+                sector.update()
 
-        for harvested in self.harvested_tomatoes:
-            harvested.update()
-        self.harvested_tomatoes = [harvested for harvested in self.harvested_tomatoes if not harvested.done]
+            for harvested in self.harvested_tomatoes:
+                harvested.update()
+            self.harvested_tomatoes = [harvested for harvested in self.harvested_tomatoes if not harvested.done]
+
+            self.spaceship.update()
+
+            # grow plants for replanting, also when running headless
+            self.plant_templates.refill()
+
+    def get_entity_counts(self):
+        return {
+            "plants": sum(len(sector.plants) for sector in self.sectors),
+            "branches": sum(
+                len(plant.branches)
+                for sector in self.sectors
+                for plant in sector.plants
+            ),
+            "flies": len(self.spaceship.flies),
+            "trash": sum(len(sector.plant_trash_heap) for sector in self.sectors)
+            + len(self.spaceship.dead_flies),
+        }
+
+    def build_stars_mesh(self):
+        vertices = []
+        for idx, (x, y) in enumerate(self.stars):
+            size = 1 + (idx % 3)
+            rect = Rect(x, y, size, size)
+            vertices.extend(
+                (
+                    rect.topleft,
+                    rect.topright,
+                    rect.bottomright,
+                    rect.topleft,
+                    rect.bottomright,
+                    rect.bottomleft,
+                )
+            )
 
-        self.spaceship.update()
+        return StaticMesh(GL_TRIANGLES, vertices, Color(255, 255, 255, 128).normalize())
 
     def draw_scene(self, ctx, *, bg_color: Color, details: bool, visible_rect: Rect):
+        view = self.get_view()
+        view.begin(ctx, self.planet, visible_rect)
+
         ctx.clear(bg_color)
 
-        for idx, star in enumerate(self.stars):
-            size = 1 + (idx % 3)
-            ctx.rect(Color(255, 255, 255, 128), Rect(star.x, star.y, size, size))
+        ctx.mesh(ctx.cached_mesh(("stars", self.stars), self.build_stars_mesh))
 
         ctx.flush()
 
@@ -2229,22 +5970,22 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
             atmosphere_color_ground,
             atmosphere_color_sky,
             self.planet.position,
-            self.planet.radius,
-            self.planet.radius + self.planet.atmosphere_height,
+            radius_outer=self.planet.radius + self.planet.atmosphere_height,
+            radius_inner=self.planet.radius,
         )
         ctx.flush()
 
-        if details:
-            for sector in self.sectors:
-                if (
-                    not self.cull_via_aabb
-                    or not sector.aabb
-                    or visible_rect.colliderect(sector.aabb)
-                ):
-                    sector.draw(ctx)
+        for sector in self.sectors:
+            if sector.cull(view):
+                continue
+            if details:
+                sector.draw(ctx)
+            else:
+                sector.draw_silhouettes(ctx)
 
         for rock in self.rocks:
-            rock.draw(ctx)
+            if not rock.cull(view):
+                rock.draw(ctx)
 
         self.spaceship.draw(ctx)
 
@@ -2280,19 +6021,22 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
         offset = 30
         initial_position = ypos + sprite.height + offset / 2
 
-        font_lines = [ctx.font_cache_big.lookup(line or ' ', Color(255, 255, 255)) for line in lines]
-
-        max_line_width = max(line.width for line in font_lines)
+        max_line_width = max(ctx.text_size(line, big=True).x for line in lines)
         xpos = (self.width - max_line_width) / 2
         ypos = initial_position
 
-        for line in font_lines:
-            ctx.sprite(line, Vector2(xpos, ypos))
+        for line in lines:
+            ctx.text(line, Color(255, 255, 255), Vector2(xpos, ypos), big=True)
             ypos += offset
 
-        tutline = ctx.font_cache.lookup('(click to continue, "s" to skip tutorial)', Color(128, 128, 128))
+        tutline = '(click to continue, "s" to skip tutorial)'
+        tutline_width = ctx.text_size(tutline).x
 
-        ctx.sprite(tutline, Vector2(max(xpos, xpos + max_line_width - tutline.width), ypos + 20))
+        ctx.text(
+            tutline,
+            Color(128, 128, 128),
+            Vector2(max(xpos, xpos + max_line_width - tutline_width), ypos + 20),
+        )
         ctx.flush()
 
         tuta = self.get_tutorial_alpha()
@@ -2365,29 +6109,21 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
         with self.renderer as ctx:
             visible_rect = Rect(0, 0, self.width, self.height)
 
-            self.debug_aabb = []
+            self.pick_index = PickIndex()
 
             # Draw screen content
             ctx.camera_mode_world(
                 self.planet, zoom=1.0, rotate=self.rotation_angle_degrees / 360
             )
-            self.draw_scene(
-                ctx, bg_color=Color(10, 10, 20), details=True, visible_rect=visible_rect
-            )
-
-            # GL coordinate system origin = bottom left
-            minimap_gl_rect = (
-                int(self.minimap.rect.x),
-                int(self.height - self.minimap.rect.height - self.minimap.rect.y),
-                int(self.minimap.rect.width),
-                int(self.minimap.rect.height),
-            )
-
-            glViewport(*minimap_gl_rect)
-            glScissor(*minimap_gl_rect)
-            glEnable(GL_SCISSOR_TEST)
+            with ctx.profiler.phase("scene"):
+                self.draw_scene(
+                    ctx,
+                    bg_color=Color(10, 10, 20),
+                    details=True,
+                    visible_rect=visible_rect,
+                )
 
-            self.debug_aabb.append(
+            self.pick_index.add(
                 (
                     LABEL_MINIMAP,
                     Color(0, 255, 255),
@@ -2397,22 +6133,8 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
                 )
             )
 
-            self.drawing_minimap = True
-
-            ctx.camera_mode_world(
-                self.planet, zoom=0, rotate=self.rotation_angle_degrees / 360
-            )
-            self.draw_scene(
-                ctx,
-                bg_color=Color(10, 10, 10),
-                details=False,
-                visible_rect=visible_rect,
-            )
-            self.drawing_minimap = False
-
-            glDisable(GL_SCISSOR_TEST)
-            glViewport(0, 0, self.width, self.height)
-            glScissor(0, 0, self.width, self.height)
+            with ctx.profiler.phase("minimap"):
+                self.minimap.draw(ctx)
 
             # Draw GUI overlay
             ctx.camera_mode_overlay()
@@ -2422,11 +6144,9 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
             ctx.flush()
 
             if self.draw_debug_aabb:
-                for label, color, rect, obj, priority in self.debug_aabb:
-                    # only draw if it's visible
-                    if not self.cull_via_aabb or visible_rect.colliderect(rect):
-                        ctx.aabb(color, rect)
-                        ctx.text(label, color, Vector2(rect.topleft))
+                for label, color, rect, obj, priority in self.pick_index:
+                    ctx.aabb(color, rect)
+                    ctx.text(label, color, Vector2(rect.topleft))
 
             ctx.flush()
 
@@ -2438,16 +6158,11 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
                 self.cursor_mode = None
                 self.cursor_planet_coordinate = None
 
-                for label, color, rect, obj, priority in sorted(
-                    self.debug_aabb, key=lambda t: t[-1]
-                ):
-                    if rect.collidepoint(mouse_pos):
-                        self.cursor_mode = getattr(obj, "CURSOR", None)
-                        if isinstance(obj, Plant):
-                            self.cursor_planet_coordinate = getattr(
-                                obj, "position", None
-                            )
-                        break
+                for label, color, rect, obj, priority in self.pick_index.at(mouse_pos):
+                    self.cursor_mode = getattr(obj, "CURSOR", None)
+                    if isinstance(obj, Plant):
+                        self.cursor_planet_coordinate = getattr(obj, "position", None)
+                    break
 
             if not self.is_running:
                 self.cursor_mode = None
@@ -2574,10 +6289,171 @@ class Game(Window, IUpdateReceiver, IMouseReceiver):
                     self.render_tutorial(ctx)
                     ctx.flush()
 
+            if ctx.profiler.enabled:
+                ctx.camera_mode_overlay()
+                ctx.perf_hud(
+                    [
+                        ", ".join(
+                            f"{count} {name}"
+                            for name, count in self.get_entity_counts().items()
+                        ),
+                        *self.plant_lod.describe(),
+                        *self.plant_templates.describe(),
+                        *self.scheduler.describe(),
+                        *self.timestep.describe(),
+                        *self.fruits.describe(),
+                        *self.main_view.describe(),
+                        *self.minimap_view.describe(),
+                    ]
+                )
+                ctx.flush()
+
+            self.plant_lod.end_frame()
+
+
+def benchmark_plant_memory(sector_counts=(5, 50, 500)):
+    """
+    Compare the memory per plant of Plant + BranchTree against an estimate
+    of the former layout, emulated with one attribute namespace per plant and
+    per branch holding the same values.
+    """
+    # plants only need the leaves and their game for growing
+    artwork = types.SimpleNamespace(leaves=[object() for _ in range(4)])
+    artwork.get_random_leaf = lambda: random.choice(artwork.leaves)
+    artwork.get_ripe_factor = lambda: 0.87
+    game = types.SimpleNamespace(
+        planet=None,
+        artwork=artwork,
+        plant_templates=PlantTemplatePool(artwork, 0),
+        scheduler=TickScheduler(),
+    )
+
+    def legacy_branch(plant, tree, index, children):
+        phase, length, angle, thickness, cm1, cm2, leaf_value, fruit_value = (
+            tree.params[index].tolist()
+        )
+        return types.SimpleNamespace(
+            plant=plant,
+            phase=phase,
+            depth=int(tree.depth[index]),
+            angle=angle,
+            length=length,
+            thickness=int(thickness),
+            children=children,
+            color_mod=cm1,
+            color_mod2=cm2,
+            has_fruit=tree.has_flag(index, tree.HAS_FRUIT),
+            has_leaf=tree.has_flag(index, tree.HAS_LEAF),
+            fruit_rotten=False,
+            leaf=artwork.leaves[tree.leaf_index[index]],
+            random_leaf_appearance_value=leaf_value,
+            random_fruit_appearance_value=fruit_value,
+            fruit_world_position=Vector2(0, 0),
+            was_ripe=False,
+        )
+
+    def legacy_plant(plant):
+        legacy = types.SimpleNamespace(
+            **{name: getattr(plant, name) for name in Plant.__slots__},
+            growth=plant.growth,
+            health=plant.health,
+            aabb_points=[],
+        )
+        tree = plant.branches
+
+        # children come after their parent, build bottom-up
+        children = [[] for _ in range(len(tree))]
+        branches = [None] * len(tree)
+        for index in reversed(range(len(tree))):
+            branches[index] = legacy_branch(legacy, tree, index, children[index])
+            if tree.parent[index] >= 0:
+                children[tree.parent[index]].insert(0, branches[index])
+
+        legacy.root = branches[0]
+        del legacy.branches
+        return legacy
+
+    print("Memory per plant (tracemalloc, 'before' estimated from an emulation)")
+    for sector_count in sector_counts:
+        tracemalloc.start()
+        sectors = [
+            Sector(game, i, i * 340 / sector_count) for i in range(sector_count)
+        ]
+        compact_bytes, _ = tracemalloc.get_traced_memory()
+
+        plants = [plant for sector in sectors for plant in sector.plants]
+        branch_count = sum(len(plant.branches) for plant in plants)
+
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        legacy_plants = [legacy_plant(plant) for plant in plants]
+        legacy_bytes = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+
+        del legacy_plants
+
+        print(
+            f"  {sector_count:3} sectors, {len(plants):4} plants, "
+            f"{branch_count:5} branches: "
+            f"{legacy_bytes / len(plants):8.0f} bytes before (est.), "
+            f"{compact_bytes / len(plants):8.0f} bytes after"
+        )
+
+
+def run_headless(ticks: int):
+    """
+    Run the simulation for the given number of ticks without drawing, for
+    measuring its cost apart from rendering and for soak tests.
+    """
+    game = Game()
+    game.game_has_started = True
+    game.is_running = True
+
+    started = time.perf_counter()
+    for _ in range(ticks):
+        game.update()
+    seconds = time.perf_counter() - started
+
+    print(
+        f"Simulated {ticks} ticks in {seconds:.2f} s: "
+        f"{ticks / max(seconds, 1e-9):.0f} ticks/s "
+        f"({game.get_simulation_time():.0f} s of game time)"
+    )
+    print(
+        f"  tomatoes: {game.tomato_score} harvested, "
+        f"{game.spaceship.total_collected_tomatoes} stolen"
+        + (", flies win" if game.is_gameover_flies_win else "")
+        + (", player wins" if game.is_gameover_player_wins else "")
+    )
+    print(
+        "  entities: "
+        + ", ".join(
+            f"{count} {name}" for name, count in game.get_entity_counts().items()
+        )
+    )
+    for line in (
+        *game.scheduler.describe(),
+        *game.fruits.describe(),
+        *game.plant_templates.describe(),
+    ):
+        print(f"  {line}")
+
 
 def main():
     # test_matrix3x3()
 
+    if CLIARGS.benchmark:
+        benchmark_affine_matrix()
+        benchmark_plant_memory()
+        return
+
+    if CLIARGS.headless is not None:
+        # no window and no sound, SDL only provides surfaces for the images
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
+        run_headless(CLIARGS.headless)
+        return
+
     # https://github.com/pygame/pygame/issues/3110
     os.environ["SDL_VIDEO_X11_FORCE_EGL"] = "1"
 
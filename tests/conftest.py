@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+
+import pytest
+
+# no window and no sound, and nothing drawn with OpenGL (see the game fixture)
+os.environ["SDL_VIDEODRIVER"] = "dummy"
+os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+# run_game parses the command line when imported
+sys.argv = ["run_game.py", "--render-backend", "record"]
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import run_game  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    The time seen by the game, only moved by the tick fixture.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(run_game.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def new_game(clock):
+    """
+    Start a running game with a fixed seed and clock, drawing through the
+    RecordingRenderBackend. The simulation only advances in tick().
+    """
+
+    def new_game():
+        clock[0] = 1000.0
+        random.seed(1)
+        game = run_game.Game()
+        game.timestep.max_catch_up = 0
+        game.game_has_started = True
+        game.is_running = True
+        return game
+
+    return new_game
+
+
+@pytest.fixture
+def game(new_game):
+    return new_game()
+
+
+@pytest.fixture
+def tick(game, clock):
+    """
+    Simulate and draw the given number of frames of game, one tick each.
+    """
+
+    def tick(frames: int = 1, game=game):
+        for _ in range(frames):
+            clock[0] += 1 / 60
+            game.update()
+            game.tick()
+
+    return tick
@@ -0,0 +1,74 @@
+import array
+import math
+
+import pytest
+
+import run_game
+
+
+def to_3x3(matrix):
+    return array.array("f", (*matrix.m, 0.0, 0.0, 1.0))
+
+
+def test_operations_match_3x3_matrix_products():
+    s, c = math.sin(0.7), math.cos(0.7)
+    ops = [
+        ("translate", (30, 40), (1.0, 0.0, 30, 0.0, 1.0, 40, 0.0, 0.0, 1.0)),
+        ("scale", (0.5, 2.0), (0.5, 0.0, 0.0, 0.0, 2.0, 0.0, 0.0, 0.0, 1.0)),
+        ("rotate", (0.7,), (c, -s, 0.0, s, c, 0.0, 0.0, 0.0, 1.0)),
+        (
+            "ortho",
+            (0, 1000, 800, 0),
+            (0.002, 0.0, -1.0, 0.0, -0.0025, 1.0, 0.0, 0.0, 1.0),
+        ),
+    ]
+
+    matrix = run_game.AffineMatrix()
+    expected = array.array("f", (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0))
+    for method, args, op in ops:
+        getattr(matrix, method)(*args)
+        expected = run_game.multiply_3x3(expected, array.array("f", op))
+        assert list(to_3x3(matrix)) == pytest.approx(list(expected), abs=1e-5)
+
+
+def test_rotate_sin_cos_matches_rotate():
+    for angle in (-2.5, 0.0, 0.3, math.pi / 2, 4.0):
+        rotated = run_game.AffineMatrix()
+        rotated.translate(5, 7)
+        rotated.rotate(angle)
+
+        with_sin_cos = run_game.AffineMatrix()
+        with_sin_cos.translate(5, 7)
+        with_sin_cos.rotate_sin_cos(math.sin(angle), math.cos(angle))
+
+        assert with_sin_cos.m == rotated.m
+
+
+def test_multiplied_composes_without_changing_the_operands():
+    first = run_game.AffineMatrix()
+    first.translate(10, 20)
+    second = run_game.AffineMatrix()
+    second.scale(2, 3)
+
+    product = first.multiplied(second)
+
+    assert product.apply((1, 1)) == first.apply(second.apply((1, 1)))
+    assert first.m == [1.0, 0.0, 10, 0.0, 1.0, 20]
+    assert second.m == [2.0, 0.0, 0.0, 0.0, 3.0, 0.0]
+
+
+def test_ortho_maps_the_view_to_normalized_device_coordinates():
+    matrix = run_game.AffineMatrix()
+    matrix.ortho(0, 800, 600, 0)
+
+    assert matrix.apply((0, 0)) == pytest.approx((-1, 1))
+    assert matrix.apply((800, 600)) == pytest.approx((1, -1))
+
+
+def test_gl_matrix_is_column_major():
+    matrix = run_game.AffineMatrix()
+    matrix.m[:] = (1, 2, 3, 4, 5, 6)
+
+    assert matrix.gl_matrix() == (
+        (1, 4, 0.0, 0.0, 2, 5, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 3, 6, 0.0, 1.0)
+    )
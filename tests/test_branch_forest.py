@@ -0,0 +1,147 @@
+import math
+import random
+import types
+
+import numpy as np
+import pytest
+from pygame import Vector2
+
+import run_game
+
+
+@pytest.fixture
+def artwork():
+    artwork = types.SimpleNamespace(leaves=[object() for _ in range(3)])
+    artwork.get_random_leaf = lambda: random.choice(artwork.leaves)
+    return artwork
+
+
+def grow_plant(artwork, fertility, growth, health):
+    """
+    A plant as far as BranchForest is concerned, with the GrowingBranch tree
+    it was flattened from.
+    """
+    root = run_game.GrowingBranch(0, random.uniform(50, 250), +1, 0, fertility, artwork)
+    for _ in range(3):
+        root.grow()
+    root.moregrow()
+
+    plant = types.SimpleNamespace(
+        growth=growth,
+        health=health,
+        wind_phase=random.uniform(0, 2 * math.pi),
+        wind_speed=random.uniform(0.9, 1.3),
+        wind_amplitude=random.choice((0, 45, -80)),
+        branches=run_game.BranchTree(root, artwork.leaves),
+    )
+    return plant, root
+
+
+def legacy_draw(plant, branch, now, pos, factor, angle, health, drawn):
+    """
+    The recursive Branch.draw() that BranchForest replaced, collecting
+    (from point, to point, factor) per drawn branch instead of drawing.
+    """
+    if factor < 0.01:
+        return
+
+    angle *= factor
+    angle += branch.angle * plant.growth / 100
+    angle *= 1.0 + 0.01 * (100 - health)
+
+    # normalize angle to 0..1, store sign
+    angle /= 180
+    if angle < 0:
+        f = -1
+        angle = -angle
+    else:
+        f = 1
+
+    # move angle towards 1.0 for bad health
+    angle = angle ** (max(10, min(100, health)) / 100)
+    # avoid over-rotating (limit to -180..+180 range)
+    angle = min(+1, angle)
+
+    # restore angle direction and amplitude
+    angle *= 180 * f
+
+    # angle added due to wind
+    wind_angle = (
+        10
+        * math.sin(plant.wind_phase + plant.wind_speed * now)
+        / max(1, 5 - branch.depth)
+    )
+    wind_angle += (plant.wind_amplitude / 10) * math.sin(now * 5)
+
+    direction = Vector2(0, -branch.length).rotate(angle + wind_angle)
+    to_point = pos + direction * factor
+    drawn[branch] = (pos, to_point, factor)
+
+    for child in branch.children:
+        child_factor = max(0, (factor - child.phase) / (1 - child.phase))
+        legacy_draw(
+            plant,
+            child,
+            now,
+            pos + direction * child.phase * factor,
+            child_factor,
+            angle,
+            health,
+            drawn,
+        )
+
+
+def pre_order(branch):
+    yield branch
+    for child in branch.children:
+        yield from pre_order(child)
+
+
+@pytest.mark.parametrize(
+    "growth, health", [(100, 100), (60, 100), (8, 100), (100, 40), (100, 0)]
+)
+def test_evaluate_matches_the_recursive_branches(artwork, growth, health):
+    random.seed(growth * 1000 + health)
+    plants, roots = zip(
+        *(grow_plant(artwork, random.randint(20, 50), growth, health) for _ in range(4))
+    )
+    forest = run_game.BranchForest(list(plants))
+    now = 12.5
+
+    visible, from_points, to_points, factors = forest.evaluate(now)
+
+    for index, (plant, root) in enumerate(zip(plants, roots)):
+        drawn = {}
+        legacy_draw(plant, root, now, Vector2(0, 0), growth / 100, 0.0, health, drawn)
+
+        offset = forest.plant_slice(index).start
+        for branch_index, branch in enumerate(pre_order(root), offset):
+            assert visible[branch_index] == (branch in drawn)
+            if branch in drawn:
+                from_point, to_point, factor = drawn[branch]
+                assert tuple(from_points[branch_index]) == pytest.approx(
+                    tuple(from_point)
+                )
+                assert tuple(to_points[branch_index]) == pytest.approx(tuple(to_point))
+                assert factors[branch_index] == pytest.approx(factor)
+
+
+def test_tree_keeps_the_branch_parameters(artwork):
+    random.seed(3)
+    plant, root = grow_plant(artwork, 40, 100, 100)
+    tree = plant.branches
+
+    branches = list(pre_order(root))
+    assert len(tree) == len(branches)
+    for index, branch in enumerate(branches):
+        parent = tree.parent[index]
+        assert parent < index
+        if parent >= 0:
+            assert branch in branches[parent].children
+        assert tree.params[index, tree.LENGTH] == branch.length
+        assert tree.params[index, tree.PHASE] == branch.phase
+        assert tree.has_flag(index, tree.HAS_FRUIT) == branch.has_fruit
+        assert tree.has_flag(index, tree.IS_TERMINAL) == (not branch.children)
+        assert artwork.leaves[tree.leaf_index[index]] is branch.leaf
+
+    assert np.all(tree.depth == [branch.depth for branch in branches])
@@ -0,0 +1,106 @@
+import random
+import types
+
+import numpy as np
+import pytest
+
+import run_game
+
+
+class Fruit:
+    def __init__(self, sector):
+        self.plant = types.SimpleNamespace(sector=sector)
+
+
+@pytest.fixture
+def registry():
+    return run_game.FruitRegistry()
+
+
+def test_ripe_fruit_is_available_until_reserved(registry):
+    sector = object()
+    first, second = Fruit(sector), Fruit(sector)
+    registry.add(first)
+    registry.add(second)
+
+    assert registry.get_ripe_count(sector) == 2
+    assert registry.get_available_fruit(sector) is first
+
+    fly = object()
+    registry.reserve(first, fly)
+    assert registry.reservations[first] is fly
+    assert registry.get_available_fruit(sector) is second
+
+    registry.release(first)
+    assert first not in registry.reservations
+    assert set(registry.available[sector]) == {first, second}
+
+
+def test_removed_fruit_is_forgotten(registry):
+    sector = object()
+    fruit = Fruit(sector)
+    registry.add(fruit)
+    registry.reserve(fruit, object())
+
+    registry.remove(fruit)
+    registry.release(fruit)
+
+    assert registry.get_ripe_count(sector) == 0
+    assert registry.get_available_fruit(sector) is None
+    assert not registry.get_ripest_sectors()
+
+
+def test_ripest_sectors_follow_the_ripe_counts(registry):
+    random.seed(4)
+    sectors = [object() for _ in range(5)]
+    fruits = [Fruit(random.choice(sectors)) for _ in range(40)]
+
+    for _ in range(2000):
+        fruit = random.choice(fruits)
+        if random.random() < 0.5:
+            registry.add(fruit)
+        else:
+            registry.remove(fruit)
+
+        counts = {sector: registry.get_ripe_count(sector) for sector in sectors}
+        most = max(counts.values())
+        assert registry.most_ripe == most
+        assert set(registry.get_ripest_sectors()) == (
+            {sector for sector, count in counts.items() if count == most}
+            if most
+            else set()
+        )
+
+
+def test_spaceship_targets_the_ripest_sector(game):
+    fruits = game.fruits
+    sector = game.sectors[2]
+    for _ in range(fruits.most_ripe + 1):
+        fruits.add(Fruit(sector))
+
+    assert game.spaceship.pick_target_sector() is sector
+
+
+def test_spaceship_picks_any_sector_without_ripe_fruit(game):
+    # nothing is ripe before the plants have grown
+    assert not game.fruits.get_ripest_sectors()
+
+    assert game.spaceship.pick_target_sector() in game.sectors
+
+
+@pytest.mark.parametrize("tick", [100, 600, 5000])
+def test_evaluate_branch_matches_the_forest(game, tick):
+    # growing, grown and rotting plants
+    game.scheduler.now = tick
+
+    for sector in game.sectors:
+        for plant in sector.plants:
+            tree = plant.branches
+            now = random.uniform(0, 100)
+            plant.shake()
+
+            _, _, to_points, factors = run_game.BranchForest([plant]).evaluate(now)
+            for index in range(len(tree)):
+                to_point, factor = tree.evaluate_branch(plant, index, now)
+                assert np.allclose(to_point, to_points[index])
+                assert factor == pytest.approx(factors[index])
@@ -0,0 +1,76 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+import run_game
+
+
+@pytest.fixture
+def stack():
+    stack = run_game.MatrixStack()
+    stack.translate(30, 40)
+    stack.rotate(math.radians(30))
+    stack.scale(0.5, 2.0)
+    return stack
+
+
+def test_apply_many_matches_apply(stack):
+    points = [(random.uniform(-500, 500), random.uniform(-500, 500)) for _ in range(50)]
+
+    transformed = stack.apply_many(points)
+
+    assert transformed.shape == (50, 2)
+    for point, result in zip(points, transformed):
+        assert tuple(stack.apply(point)) == pytest.approx(tuple(result))
+
+
+def test_apply_many_accepts_flat_vertex_arrays(stack):
+    vertices = np.arange(12, dtype=np.float32)
+
+    transformed = stack.apply_many(vertices)
+
+    assert transformed.shape == (6, 2)
+    assert tuple(transformed[1]) == pytest.approx(tuple(stack.apply((2, 3))))
+
+
+def test_pop_restores_the_pushed_matrix(stack):
+    before = list(stack.top.m)
+
+    stack.push()
+    stack.translate(100, -100)
+    stack.rotate(1.0)
+    assert stack.top.m != before
+
+    stack.pop()
+    assert stack.top.m == before
+
+
+def test_nested_levels_are_reused(stack):
+    for _ in range(2):
+        stack.push()
+        stack.push()
+        stack.pop()
+        stack.pop()
+
+    assert len(stack.levels) == 3
+    assert stack.depth == 0
+
+
+def test_generation_changes_with_the_top_matrix(stack):
+    generation = stack.generation
+    stack.push()
+    # a copy of the same matrix
+    assert stack.generation == generation
+
+    for change in (
+        lambda: stack.translate(1, 2),
+        lambda: stack.rotate_sin_cos(0.0, 1.0),
+        lambda: stack.scale(2, 2),
+        stack.pop,
+        stack.identity,
+    ):
+        change()
+        assert stack.generation > generation
+        generation = stack.generation
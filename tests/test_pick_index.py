@@ -0,0 +1,75 @@
+import random
+
+from pygame import Color, Rect
+
+import run_game
+
+
+def entry(label, rect, priority=0):
+    return (label, Color(255, 255, 255), Rect(rect), None, priority)
+
+
+def labels(entries):
+    return [entry[0] for entry in entries]
+
+
+def test_front_entries_come_first_latest_first():
+    index = run_game.PickIndex()
+    index.add(entry("back 1", (0, 0, 10, 10)))
+    index.add(entry("front 1", (0, 0, 10, 10)), front=True)
+    index.add(entry("back 2", (0, 0, 10, 10)))
+    index.add(entry("front 2", (0, 0, 10, 10)), front=True)
+
+    expected = ["front 2", "front 1", "back 1", "back 2"]
+    assert labels(index) == expected
+    assert labels(index.at((5, 5))) == expected
+
+
+def test_lower_priorities_come_first():
+    index = run_game.PickIndex()
+    index.add(entry("fly", (0, 0, 10, 10), priority=2))
+    index.add(entry("fruit", (0, 0, 10, 10), priority=1), front=True)
+    index.add(entry("sector", (0, 0, 10, 10), priority=3))
+    index.add(entry("button", (0, 0, 10, 10), priority=0))
+
+    assert labels(index.at((5, 5))) == ["button", "fruit", "fly", "sector"]
+
+
+def test_rects_are_found_in_every_cell_they_cover():
+    index = run_game.PickIndex()
+    size = index.CELL_SIZE
+    index.add(entry("wide", (size - 10, size - 10, 2 * size, 20)))
+
+    assert labels(index.at((size - 5, size - 5))) == ["wide"]
+    assert labels(index.at((3 * size - 11, size + 9))) == ["wide"]
+
+    # right and bottom edges are outside, like Rect.collidepoint()
+    assert labels(index.at((3 * size - 10, size))) == []
+    assert labels(index.at((size, size + 10))) == []
+
+
+def test_at_matches_a_linear_scan():
+    random.seed(5)
+    index = run_game.PickIndex()
+    for number in range(200):
+        index.add(
+            entry(
+                number,
+                (
+                    random.randint(-50, 1000),
+                    random.randint(-50, 700),
+                    random.randint(0, 300),
+                    random.randint(0, 300),
+                ),
+                priority=random.randint(0, 3),
+            ),
+            front=random.random() < 0.3,
+        )
+
+    for _ in range(200):
+        position = (random.uniform(-50, 1100), random.uniform(-50, 800))
+        expected = sorted(
+            (entry for entry in index if entry[2].collidepoint(position)),
+            key=lambda entry: entry[-1],
+        )
+        assert labels(index.at(position)) == labels(expected)
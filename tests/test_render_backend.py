@@ -0,0 +1,88 @@
+import itertools
+
+import run_game
+
+
+def task_commands(frame):
+    return [command for command in frame["commands"] if "task" in command]
+
+
+def branch_vertices(frame):
+    return sum(
+        command["vertices"]
+        for command in task_commands(frame)
+        if command["layer"] == run_game.RenderContext.LAYER_BRANCHES
+    )
+
+
+def test_each_frame_is_recorded(game, tick):
+    backend = game.renderer.backend
+    assert isinstance(backend, run_game.RecordingRenderBackend)
+
+    frame_count = backend.frame_count
+    tick(3)
+
+    assert backend.frame_count == frame_count + 3
+    assert [frame["frame"] for frame in list(backend.frames)[-3:]] == [
+        frame_count,
+        frame_count + 1,
+        frame_count + 2,
+    ]
+
+
+def test_commands_match_the_renderer_counters(game, tick):
+    renderer = game.renderer
+    for _ in range(5):
+        tick()
+        frame = game.renderer.backend.frames[-1]
+        commands = frame["commands"]
+
+        # the frame starts by clearing the screen
+        assert commands[0] == {"pass": 0, "clear": [10, 10, 20, 255]}
+
+        # one command per draw call, passes in order and layers in order
+        # within each pass
+        assert len(task_commands(frame)) == renderer.draw_calls_last_frame
+        passes = [command["pass"] for command in commands]
+        assert passes == sorted(passes)
+        assert max(passes) < renderer.passes_last_frame
+        for _, pass_commands in itertools.groupby(
+            task_commands(frame), key=lambda command: command["pass"]
+        ):
+            layers = [command["layer"] for command in pass_commands]
+            assert layers == sorted(layers)
+
+
+def test_quads_have_six_vertices_each(game, tick):
+    tick(5)
+    quads = [
+        command
+        for frame in game.renderer.backend.frames
+        for command in task_commands(frame)
+        if command["task"] in ("DrawSpriteTask", "DrawTextTask")
+    ]
+
+    assert quads
+    for command in quads:
+        assert command["vertices"] > 0
+        assert command["vertices"] % 6 == 0
+        assert command["texture"] is not None
+
+
+def test_recording_is_deterministic(game, new_game, tick):
+    tick(10)
+    other = new_game()
+    tick(10, game=other)
+
+    assert list(other.renderer.backend.frames) == list(game.renderer.backend.frames)
+
+
+def test_culling_draws_fewer_branches(game, tick):
+    tick(60)
+    culled = branch_vertices(game.renderer.backend.frames[-1])
+
+    game.main_view.enabled = False
+    tick()
+    unculled = branch_vertices(game.renderer.backend.frames[-1])
+
+    assert 0 < culled < unculled
@@ -0,0 +1,77 @@
+import run_game
+
+
+def advance(scheduler, ticks):
+    for _ in range(ticks):
+        scheduler.advance()
+
+
+def test_events_are_called_at_their_tick_in_order():
+    scheduler = run_game.TickScheduler()
+    calls = []
+    scheduler.at(3, lambda: calls.append(("a", scheduler.now)))
+    scheduler.after(1, lambda: calls.append(("b", scheduler.now)))
+    scheduler.at(3, lambda: calls.append(("c", scheduler.now)))
+
+    advance(scheduler, 5)
+
+    assert calls == [("b", 1), ("a", 3), ("c", 3)]
+    assert scheduler.events == []
+
+
+def test_events_in_the_past_are_called_next_tick():
+    scheduler = run_game.TickScheduler()
+    advance(scheduler, 10)
+    calls = []
+    scheduler.at(2, lambda: calls.append(scheduler.now))
+
+    advance(scheduler, 1)
+
+    assert calls == [11]
+    assert scheduler.calls_last_tick == 1
+
+
+def test_cancelled_events_are_not_called():
+    scheduler = run_game.TickScheduler()
+    calls = []
+    event = scheduler.after(2, lambda: calls.append("cancelled"))
+    scheduler.after(2, lambda: calls.append("kept"))
+    scheduler.cancel(event)
+
+    advance(scheduler, 2)
+
+    assert calls == ["kept"]
+    assert scheduler.calls_last_tick == 1
+
+
+def test_every_repeats_until_cancelled():
+    scheduler = run_game.TickScheduler()
+    calls = []
+    scheduler.every(3, lambda: calls.append(scheduler.now))
+
+    advance(scheduler, 10)
+    assert calls == [3, 6, 9]
+
+    # the pending repetition is the event to cancel after the first call
+    scheduler.cancel(scheduler.events[0])
+    advance(scheduler, 10)
+    assert calls == [3, 6, 9]
+
+
+def test_shaking_dies_down_with_the_ticks(game):
+    plant = game.sectors[0].plants[0]
+    assert plant.wind_amplitude == 0
+
+    plant.shake()
+    amplitudes = []
+    for _ in range(3):
+        amplitudes.append(plant.wind_amplitude)
+        game.scheduler.advance()
+    assert amplitudes == [90, 89, 88]
+
+    # shaking again while still shaking goes the other way
+    plant.shake()
+    assert plant.wind_amplitude == -90
+
+    advance(game.scheduler, 200)
+    assert plant.wind_amplitude == 0
@@ -0,0 +1,85 @@
+import pytest
+
+import run_game
+
+
+@pytest.fixture
+def perf_counter(monkeypatch):
+    now = [50.0]
+    monkeypatch.setattr(run_game.time, "perf_counter", lambda: now[0])
+    return now
+
+
+def test_first_advance_only_starts_the_clock(perf_counter):
+    timestep = run_game.FixedTimestep(60, max_catch_up=5)
+
+    assert timestep.advance() == 0
+    assert timestep.alpha == 0
+
+
+def test_whole_ticks_are_simulated_and_the_rest_carried(perf_counter):
+    timestep = run_game.FixedTimestep(10, max_catch_up=5)
+    timestep.advance()
+
+    perf_counter[0] += 0.25
+    assert timestep.advance() == 2
+    assert timestep.alpha == pytest.approx(0.5)
+
+    perf_counter[0] += 0.06
+    assert timestep.advance() == 1
+    assert timestep.alpha == pytest.approx(0.1)
+
+
+def test_ticks_add_up_to_the_elapsed_time(perf_counter):
+    timestep = run_game.FixedTimestep(60, max_catch_up=5)
+    timestep.advance()
+
+    ticks = 0
+    for frame in range(600):
+        # uneven frame times around 60 fps
+        perf_counter[0] += (1 / 45, 1 / 90, 1 / 60)[frame % 3]
+        ticks += timestep.advance()
+
+    # 10 seconds, give or take rounding
+    assert ticks in (599, 600)
+    assert timestep.dropped_ticks == 0
+
+
+def test_ticks_beyond_the_catch_up_limit_are_dropped(perf_counter):
+    timestep = run_game.FixedTimestep(10, max_catch_up=3)
+    timestep.advance()
+
+    perf_counter[0] += 1.05
+    assert timestep.advance() == 3
+    assert timestep.dropped_ticks == 7
+    assert timestep.alpha == pytest.approx(0.5)
+
+
+def test_reset_forgets_the_time_in_between(perf_counter):
+    timestep = run_game.FixedTimestep(10, max_catch_up=5)
+    timestep.advance()
+    perf_counter[0] += 0.05
+    timestep.advance()
+
+    timestep.reset()
+    perf_counter[0] += 100
+    assert timestep.advance() == 0
+
+    perf_counter[0] += 0.15
+    assert timestep.advance() == 1
+
+
+def test_moving_things_are_drawn_between_ticks(game):
+    for _ in range(20):
+        game.update()
+    spaceship = game.spaceship
+    previous = spaceship.coordinates.angle_degrees
+    game.update()
+    current = spaceship.coordinates.angle_degrees
+    assert previous != current
+
+    for alpha in (0, 0.25, 1):
+        game.timestep.alpha = alpha
+        assert spaceship.get_drawn_coordinates().angle_degrees == pytest.approx(
+            previous + alpha * (current - previous)
+        )